@@ -1,8 +1,29 @@
-"""Small python 3 library to access the serial interface of brymen BM257s multimeters"""
-from .bm257s import BM257sSerialInterface  # noqa: F401
+"""Small python 3 library to access the serial interface of brymen BM257s multimeters
+
+The serial interface is imported on first access, so decoding recorded data does not
+need to import pyserial.
+"""
 from .measurement import (  # noqa: F401
     Measurement,
     ResistanceMeasurement,
     TemperatureMeasurement,
     VoltageMeasurement,
 )
+from .subscription import Event, EventType  # noqa: F401
+
+# Attributes imported on first access
+_LAZY_ATTRIBUTES = ("BM257sSerialInterface",)
+
+
+def __getattr__(name):
+    if name == "BM257sSerialInterface":
+        from .bm257s import BM257sSerialInterface  # pylint: disable=C0415
+
+        globals()[name] = BM257sSerialInterface
+        return BM257sSerialInterface
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
@@ -0,0 +1,322 @@
+"""Time alignment of measurements from multiple multimeters onto a common clock"""
+import array
+import bisect
+import math
+import statistics
+import threading
+
+from .subscription import EventType
+
+NAN = float("nan")
+
+
+def estimate_period(timestamps, max_samples=10000):
+    """Estimate the effective sample period of a jittery stream
+
+    Uses the median distance between consecutive samples, so single late or dropped
+    packages do not distort the estimate.
+
+    :param timestamps: Sorted sample timestamps
+    :type timestamps: array.array
+    :param max_samples: Maximum number of most recent samples to consider
+    :type max_samples: int
+
+    :return: Estimated sample period in seconds or None if there are too few samples
+    :rtype: float
+    """
+    recent = timestamps[-max_samples:]
+    if len(recent) < 2:
+        return None
+
+    return statistics.median(b - a for (a, b) in zip(recent, recent[1:]))
+
+
+def resample_hold(timestamps, values, start, period, count):
+    """Resample a stream onto a regular grid by holding the last sample
+
+    Each sample gets written into the whole range of grid points it covers at once,
+    so the cost mostly depends on the number of samples.
+
+    :param timestamps: Sorted sample timestamps
+    :type timestamps: array.array
+    :param values: Sample values
+    :type values: array.array
+    :param start: First grid timestamp
+    :type start: float
+    :param period: Grid period in seconds
+    :type period: float
+    :param count: Number of grid points
+    :type count: int
+
+    :return: Resampled values, NaN before the first sample
+    :rtype: array.array
+    """
+    result = array.array("d", [NAN]) * count
+    sample_count = len(timestamps)
+    if sample_count == 0:
+        return result
+
+    # Start with the sample covering the first grid point, if there is one
+    i = max(0, bisect.bisect_right(timestamps, start) - 1)
+    index = max(0, math.ceil((timestamps[i] - start) / period))
+
+    while index < count and i < sample_count:
+        if i + 1 == sample_count:
+            next_index = count
+        else:
+            next_index = min(count, math.ceil((timestamps[i + 1] - start) / period))
+
+        if next_index > index:
+            result[index:next_index] = array.array("d", [values[i]]) * (
+                next_index - index
+            )
+            index = next_index
+
+        i += 1
+
+    return result
+
+
+def resample_linear(timestamps, values, start, period, count):
+    """Resample a stream onto a regular grid by linear interpolation
+
+    :param timestamps: Sorted sample timestamps
+    :type timestamps: array.array
+    :param values: Sample values
+    :type values: array.array
+    :param start: First grid timestamp
+    :type start: float
+    :param period: Grid period in seconds
+    :type period: float
+    :param count: Number of grid points
+    :type count: int
+
+    :return: Resampled values, NaN outside of the sampled range
+    :rtype: array.array
+    """
+    result = array.array("d", [NAN]) * count
+    if len(timestamps) < 2:
+        return result
+
+    # Only grid points between the first and last sample can get interpolated
+    index = max(0, math.ceil((timestamps[0] - start) / period))
+    i = max(0, bisect.bisect_right(timestamps, start + index * period) - 1)
+    last = len(timestamps) - 1
+
+    while index < count and i < last:
+        t_a, t_b = timestamps[i], timestamps[i + 1]
+        # Grid points in [t_a, t_b), or up to t_b for the last segment
+        if i + 1 == last:
+            next_index = min(count, math.floor((t_b - start) / period) + 1)
+        else:
+            next_index = min(count, max(index, math.ceil((t_b - start) / period)))
+
+        if next_index > index:
+            v_a = values[i]
+            slope = (values[i + 1] - v_a) / (t_b - t_a) if t_b > t_a else 0.0
+            offset = start - t_a
+            result[index:next_index] = array.array(
+                "d",
+                [v_a + slope * (offset + k * period) for k in range(index, next_index)],
+            )
+            index = next_index
+
+        i += 1
+
+    return result
+
+
+class AlignedTable:
+    """Measurements of multiple multimeters on a common timeline
+
+    :param timestamps: Common grid timestamps
+    :type timestamps: array.array
+    :param columns: Resampled values by stream name
+    :type columns: dict
+    """
+
+    def __init__(self, timestamps, columns):
+        self.timestamps = timestamps
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def names(self):
+        """Get names of all columns
+
+        :return: List of stream names
+        :rtype: list
+        """
+        return list(self.columns)
+
+    def rows(self):
+        """Iterate over the table row by row
+
+        :return: Iterator of (timestamp, value, ...) tuples in order of names()
+        :rtype: iterator
+        """
+        return zip(self.timestamps, *self.columns.values())
+
+
+class TimeAligner:
+    """Collects timestamped samples of multiple multimeters and aligns them
+
+    :param method: Default resampling method, HOLD or LINEAR
+    :type method: str
+    """
+
+    HOLD = "hold"
+    LINEAR = "linear"
+
+    RESAMPLERS = {HOLD: resample_hold, LINEAR: resample_linear}
+
+    def __init__(self, method=HOLD):
+        if method not in self.RESAMPLERS:
+            raise RuntimeError(f"Unknown resampling method {method}")
+
+        self._method = method
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, timestamp, value):
+        """Add a single sample to a stream
+
+        :param name: Name of stream (e.g. the multimeter)
+        :type name: str
+        :param timestamp: Time of measurement
+        :type timestamp: float
+        :param value: Measured value, None if there is no value
+        :type value: float
+        """
+        with self._lock:
+            stream = self._streams.get(name)
+            if stream is None:
+                stream = (array.array("d"), array.array("d"))
+                self._streams[name] = stream
+
+            timestamps, values = stream
+            if len(timestamps) > 0 and timestamp < timestamps[-1]:
+                # Late sample, keep stream sorted
+                i = bisect.bisect_right(timestamps, timestamp)
+                timestamps.insert(i, timestamp)
+                values.insert(i, NAN if value is None else value)
+            else:
+                timestamps.append(timestamp)
+                values.append(NAN if value is None else value)
+
+    def add_series(self, name, timestamps, values):
+        """Add many samples to a stream at once (e.g. from a storage query)
+
+        :param name: Name of stream
+        :type name: str
+        :param timestamps: Sample timestamps
+        :type timestamps: iterable
+        :param values: Sample values, NaN if there is no value
+        :type values: iterable
+        """
+        samples = sorted(zip(timestamps, values))
+        if len(samples) == 0:
+            return
+
+        with self._lock:
+            old_timestamps, old_values = self._streams.get(
+                name, (array.array("d"), array.array("d"))
+            )
+            if len(old_timestamps) > 0 and samples[0][0] < old_timestamps[-1]:
+                samples = sorted(list(zip(old_timestamps, old_values)) + samples)
+                old_timestamps, old_values = array.array("d"), array.array("d")
+
+            old_timestamps.extend(t for (t, _) in samples)
+            old_values.extend(v for (_, v) in samples)
+            self._streams[name] = (old_timestamps, old_values)
+
+    def attach(self, source, name, **kwargs):
+        """Add all measurements of a multimeter as stream
+
+        :param source: Serial interface or other source of measurement events
+        :type source: bm257s.BM257sSerialInterface
+        :param name: Name of stream
+        :type name: str
+        :param kwargs: Further arguments of the subscription
+
+        :return: Subscription used, unsubscribe it from the source to stop adding
+        :rtype: bm257s.subscription.Subscription
+        """
+
+        def add_measurement(event):
+            self.add(name, event.timestamp, event.payload[1].si_value())
+
+        kwargs.setdefault("max_queue", 1024)
+        return source.subscribe(
+            add_measurement, events={EventType.MEASUREMENT}, **kwargs
+        )
+
+    def names(self):
+        """Get names of all streams
+
+        :return: List of stream names
+        :rtype: list
+        """
+        with self._lock:
+            return list(self._streams)
+
+    def sample_period(self, name):
+        """Estimate effective sample period of a stream
+
+        :param name: Name of stream
+        :type name: str
+
+        :return: Sample period in seconds or None if there are too few samples
+        :rtype: float
+        """
+        with self._lock:
+            return estimate_period(self._streams[name][0])
+
+    def align(self, period=None, start=None, end=None, method=None):
+        """Resample all streams onto a common timeline
+
+        :param period: Period of timeline, defaults to the shortest sample period
+        :type period: float
+        :param start: First timestamp, defaults to when all streams have data
+        :type start: float
+        :param end: Last timestamp, defaults to when the first stream ends
+        :type end: float
+        :param method: Resampling method, defaults to method given on construction
+        :type method: str
+
+        :return: Aligned measurements, with NaN where a stream has no data
+        :rtype: bm257s.alignment.AlignedTable
+        :raise RuntimeError: If there is not enough data to align
+        """
+        resampler = self.RESAMPLERS[self._method if method is None else method]
+
+        with self._lock:
+            streams = {
+                name: (timestamps[:], values[:])
+                for (name, (timestamps, values)) in self._streams.items()
+                if len(timestamps) > 0
+            }
+
+        if len(streams) == 0:
+            raise RuntimeError("No samples to align")
+
+        if period is None:
+            periods = [estimate_period(ts) for (ts, _) in streams.values()]
+            periods = [p for p in periods if p]
+            if len(periods) == 0:
+                raise RuntimeError("Cannot estimate sample period from samples")
+            period = min(periods)
+
+        if start is None:
+            start = max(ts[0] for (ts, _) in streams.values())
+        if end is None:
+            end = min(ts[-1] for (ts, _) in streams.values())
+        count = max(0, math.floor((end - start) / period) + 1)
+
+        timestamps = array.array("d", (start + k * period for k in range(count)))
+        columns = {
+            name: resampler(ts, values, start, period, count)
+            for (name, (ts, values)) in streams.items()
+        }
+        return AlignedTable(timestamps, columns)
@@ -0,0 +1,461 @@
+"""Compressed and seekable long-term archive of raw multimeter frames
+
+An archive file starts with a header, followed by independently compressed blocks and
+an index of all blocks at the end. Each block holds the delta encoded timestamps of its
+frames, followed by the frames XOR encoded against their predecessor, so repeated
+frames become runs of zero bytes that compress very well. The index allows seeking to
+any time by only decompressing the blocks needed. If the index is missing (e.g. because
+the writer did not get closed), it is rebuilt from the block headers.
+"""
+import bisect
+import logging
+import lzma
+import queue
+import struct
+import threading
+import zlib
+
+from .package_encoder import encode_package
+from .package_reader import DEFAULT_SPEC, compile_package_decoder, parse_package
+
+_LOGGER = logging.getLogger(__name__)
+
+MAGIC = b"BM257ARC"
+INDEX_MAGIC = b"BM257IDX"
+VERSION = 1
+
+# Magic, version, compression, frame length and timestamp resolution in seconds
+HEADER = struct.Struct("<8sBBBd")
+# First and last timestamp in ticks, frame count and compressed length
+BLOCK_HEADER = struct.Struct("<qqII")
+# Block offset, first and last timestamp in ticks and frame count
+INDEX_ENTRY = struct.Struct("<QqqI")
+# Index offset, entry count and index magic
+FOOTER = struct.Struct("<QI8s")
+
+COMPRESSIONS = {
+    "zlib": (0, zlib.compress, zlib.decompress),
+    "lzma": (1, lambda data, level: lzma.compress(data, preset=level), lzma.decompress),
+}
+_DECOMPRESSORS = {code: decompress for (code, _, decompress) in COMPRESSIONS.values()}
+_NAMES = {code: name for (name, (code, _, _)) in COMPRESSIONS.items()}
+
+
+def _encode_varint(value, out):
+    # Zigzag encoding keeps small negative deltas (clock adjustments) small
+    value = (value << 1) ^ (value >> 63)
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _decode_varints(data, count):
+    values = []
+    value = 0
+    shift = 0
+    pos = 0
+    while len(values) < count:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append((value >> 1) ^ -(value & 1))
+            value = 0
+            shift = 0
+
+    return (values, pos)
+
+
+def encode_block(ticks, frames, frame_length):
+    """Encode the timestamps and frames of a block before compression
+
+    :param ticks: Timestamps in ticks of the archive resolution
+    :type ticks: list
+    :param frames: Raw frames of equal length
+    :type frames: list
+    :param frame_length: Length of each frame
+    :type frame_length: int
+
+    :return: Encoded block
+    :rtype: bytearray
+    """
+    out = bytearray()
+    for previous, tick in zip(ticks, ticks[1:]):
+        _encode_varint(tick - previous, out)
+
+    previous = 0
+    for frame in frames:
+        current = int.from_bytes(frame, "big")
+        out += (current ^ previous).to_bytes(frame_length, "big")
+        previous = current
+
+    return out
+
+
+def decode_block(data, first_tick, count, frame_length):
+    """Decode the timestamps and frames of a decompressed block
+
+    :param data: Decompressed block
+    :type data: bytes
+    :param first_tick: Timestamp of first frame in ticks
+    :type first_tick: int
+    :param count: Number of frames
+    :type count: int
+    :param frame_length: Length of each frame
+    :type frame_length: int
+
+    :return: Timestamps in ticks and raw frames
+    :rtype: tuple
+    """
+    deltas, pos = _decode_varints(data, count - 1)
+    ticks = [first_tick]
+    for delta in deltas:
+        ticks.append(ticks[-1] + delta)
+
+    frames = []
+    previous = 0
+    for start in range(pos, pos + count * frame_length, frame_length):
+        frame = data[start : start + frame_length]  # noqa: E203
+        previous ^= int.from_bytes(frame, "big")
+        frames.append(previous.to_bytes(frame_length, "big"))
+
+    return (ticks, frames)
+
+
+class ArchiveWriter:
+    """Writes raw frames into a compressed archive file, block by block
+
+    Adding frames only appends them to the current block. Full blocks get compressed
+    and written by a background thread, so slow compression (e.g. lzma) never delays
+    the reading thread. A block that cannot be written gets logged and dropped.
+
+    :param path: Path of archive file, gets overwritten
+    :type path: str
+    :param compression: Compression of blocks, "zlib" or "lzma"
+    :type compression: str
+    :param level: Compression level
+    :type level: int
+    :param block_frames: Number of frames per block, smaller blocks allow faster
+        seeking while larger blocks compress better
+    :type block_frames: int
+    :param resolution: Resolution of stored timestamps in seconds
+    :type resolution: float
+    :param frame_length: Length of frames, defaults to the BM257s frame length
+    :type frame_length: int
+    :raise RuntimeError: If the compression is unknown
+    """
+
+    # pylint: disable=R0902,R0913
+
+    def __init__(
+        self,
+        path,
+        *,
+        compression="zlib",
+        level=9,
+        block_frames=4096,
+        resolution=1e-3,
+        frame_length=DEFAULT_SPEC.length,
+    ):
+        if compression not in COMPRESSIONS:
+            raise RuntimeError(f"Unknown compression {compression}")
+
+        code, self._compress, _ = COMPRESSIONS[compression]
+        self._level = level
+        self._block_frames = block_frames
+        self._resolution = resolution
+        self._frame_length = frame_length
+
+        self._file = open(path, "wb")  # pylint: disable=R1732
+        self._file.write(HEADER.pack(MAGIC, VERSION, code, frame_length, resolution))
+
+        self._ticks = []
+        self._frames = []
+        self._index = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+        # Full blocks, flush markers and None to stop the write thread
+        self._queue = queue.SimpleQueue()
+        self._write_thread = threading.Thread(target=self._run, daemon=True)
+        self._write_thread.start()
+
+    def add(self, timestamp, frame):
+        """Add a raw frame
+
+        :param timestamp: Time the frame was received
+        :type timestamp: float
+        :param frame: Raw frame
+        :type frame: bytes
+        :raise RuntimeError: If the frame has the wrong length or the writer is closed
+        """
+        if len(frame) != self._frame_length:
+            raise RuntimeError(f"Frame has invalid length {len(frame)}")
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Archive is closed")
+
+            self._ticks.append(round(timestamp / self._resolution))
+            self._frames.append(bytes(frame))
+            if len(self._frames) >= self._block_frames:
+                self._queue_block()
+
+    def add_package(self, timestamp, pkg, spec=DEFAULT_SPEC):
+        """Add a decoded package as raw frame, e.g. when converting other recordings
+
+        Packages get encoded again, so bits not covered by the layout are lost.
+
+        :param timestamp: Time the package was received
+        :type timestamp: float
+        :param pkg: Received package
+        :type pkg: bm257s.package_reader.Package
+        :param spec: Protocol specification of the multimeter model
+        :type spec: bm257s.protocol.ProtocolSpec
+        """
+        self.add(timestamp, encode_package(pkg, spec))
+
+    def attach(self, source):
+        """Archive all raw frames received by a multimeter
+
+        Frames are archived as received, including frames that could not be decoded.
+        They are added on the reading thread, so nothing gets lost to slow subscribers.
+
+        :param source: Serial interface or package reader
+        :type source: bm257s.BM257sSerialInterface
+
+        :return: Frame handler, remove it from the source to stop archiving
+        :rtype: callable
+        """
+        source.add_frame_handler(self.add)
+        return self.add
+
+    def flush(self):
+        """Write all added frames as block, even if it is not full
+
+        Waits until the block is written.
+
+        :raise RuntimeError: If the writer is closed
+        """
+        done = threading.Event()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Archive is closed")
+
+            self._queue_block()
+            self._queue.put(done)
+        done.wait()
+
+    def _queue_block(self):
+        if len(self._frames) == 0:
+            return
+
+        self._queue.put((self._ticks, self._frames))
+        self._ticks = []
+        self._frames = []
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if isinstance(item, threading.Event):
+                self._file.flush()
+                item.set()
+                continue
+
+            try:
+                self._write_block(*item)
+            except (OSError, lzma.LZMAError, zlib.error):
+                _LOGGER.exception("Could not write block of %d frames", len(item[1]))
+
+    def _write_block(self, ticks, frames):
+        data = self._compress(
+            bytes(encode_block(ticks, frames, self._frame_length)), self._level
+        )
+        offset = self._file.tell()
+        entry = (ticks[0], ticks[-1], len(frames))
+        self._file.write(BLOCK_HEADER.pack(*entry, len(data)))
+        self._file.write(data)
+        self._index.append((offset,) + entry)
+
+    def close(self):
+        """Write remaining frames and the index and close the file"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+
+            self._queue_block()
+            self._queue.put(None)
+
+        self._write_thread.join()
+
+        index_offset = self._file.tell()
+        for entry in self._index:
+            self._file.write(INDEX_ENTRY.pack(*entry))
+        self._file.write(FOOTER.pack(index_offset, len(self._index), INDEX_MAGIC))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+
+class ArchiveReader:
+    """Reads raw frames from an archive file, block by block
+
+    :param path: Path of archive file
+    :type path: str
+    :raise RuntimeError: If the file is no valid archive
+    """
+
+    def __init__(self, path):
+        self._file = open(path, "rb")  # pylint: disable=R1732
+
+        header = self._file.read(HEADER.size)
+        if len(header) < HEADER.size:
+            self._file.close()
+            raise RuntimeError("File is too short for an archive")
+        magic, version, code, self.frame_length, self.resolution = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION or code not in _DECOMPRESSORS:
+            self._file.close()
+            raise RuntimeError("File is no supported archive")
+
+        self.compression = _NAMES[code]
+        self._decompress = _DECOMPRESSORS[code]
+
+        self._index = self._read_index() or self._scan_blocks()
+        self._last_ticks = [entry[2] for entry in self._index]
+
+    def _read_index(self):
+        file_size = self._file.seek(0, 2)
+        if file_size < HEADER.size + FOOTER.size:
+            return None
+
+        self._file.seek(file_size - FOOTER.size)
+        index_offset, count, magic = FOOTER.unpack(self._file.read(FOOTER.size))
+        if magic != INDEX_MAGIC:
+            return None
+
+        self._file.seek(index_offset)
+        data = self._file.read(count * INDEX_ENTRY.size)
+        return list(INDEX_ENTRY.iter_unpack(data))
+
+    def _scan_blocks(self):
+        index = []
+        offset = HEADER.size
+        while True:
+            self._file.seek(offset)
+            header = self._file.read(BLOCK_HEADER.size)
+            if len(header) < BLOCK_HEADER.size:
+                break
+
+            first, last, count, length = BLOCK_HEADER.unpack(header)
+            if len(self._file.read(length)) < length:
+                # Block got truncated while writing
+                break
+
+            index.append((offset, first, last, count))
+            offset += BLOCK_HEADER.size + length
+
+        return index
+
+    def __len__(self):
+        return sum(entry[3] for entry in self._index)
+
+    def time_range(self):
+        """Get time of the first and last frame
+
+        :return: First and last timestamp or None if the archive is empty
+        :rtype: tuple
+        """
+        if len(self._index) == 0:
+            return None
+
+        return (
+            self._index[0][1] * self.resolution,
+            self._index[-1][2] * self.resolution,
+        )
+
+    def block_count(self):
+        """Get number of blocks
+
+        :return: Number of blocks
+        :rtype: int
+        """
+        return len(self._index)
+
+    def _read_block(self, entry):
+        offset, first, _, count = entry
+        self._file.seek(offset)
+        length = BLOCK_HEADER.unpack(self._file.read(BLOCK_HEADER.size))[3]
+        data = self._decompress(self._file.read(length))
+        return decode_block(data, first, count, self.frame_length)
+
+    def frames(self, start=None, end=None):
+        """Iterate over frames in a time range, decompressing only the blocks needed
+
+        Blocks are searched by the index and get decompressed one at a time while
+        iterating. Frames are expected to be added in order of time.
+
+        :param start: First time to include, defaults to the beginning
+        :type start: float
+        :param end: Last time to include, defaults to the end
+        :type end: float
+
+        :return: Iterator of (timestamp, frame) tuples
+        :rtype: iterator
+        """
+        start_tick = None if start is None else start / self.resolution
+        end_tick = None if end is None else end / self.resolution
+
+        i = (
+            0
+            if start_tick is None
+            else bisect.bisect_left(self._last_ticks, start_tick)
+        )
+        for entry in self._index[i:]:
+            if end_tick is not None and entry[1] > end_tick:
+                return
+
+            ticks, frames = self._read_block(entry)
+            for tick, frame in zip(ticks, frames):
+                if start_tick is not None and tick < start_tick:
+                    continue
+                if end_tick is not None and tick > end_tick:
+                    return
+                yield (tick * self.resolution, frame)
+
+    def packages(self, start=None, end=None, spec=None):
+        """Iterate over decoded packages in a time range
+
+        :param start: First time to include, defaults to the beginning
+        :type start: float
+        :param end: Last time to include, defaults to the end
+        :type end: float
+        :param spec: Protocol specification of the multimeter model, defaults to BM257s
+        :type spec: bm257s.protocol.ProtocolSpec
+
+        :return: Iterator of (timestamp, package) tuples
+        :rtype: iterator
+        :raise RuntimeError: If a frame cannot be decoded
+        """
+        decode = parse_package if spec is None else compile_package_decoder(spec)
+        for timestamp, frame in self.frames(start, end):
+            yield (timestamp, decode(frame))
+
+    def close(self):
+        """Close the archive file"""
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
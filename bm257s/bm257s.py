@@ -1,8 +1,11 @@
 """Serial interface library for brymen bm257s multimeters"""
 import serial
 
+from .connection import SupervisedSerial, open_serial
 from .package_parser import parse_package
 from .package_reader import PackageReader
+from .stream import AsyncStream, Stream
+from .subscription import Event, EventType
 
 # def parse_lcd(lcd):
 #    """Parse measurement information from received lcd display state
@@ -75,42 +78,107 @@ from .package_reader import PackageReader
 #    raise RuntimeError("Cannot parse LCD configuration")
 
 
+def measurement_event(event):
+    """Convert package events to measurement events
+
+    :param event: Event published by a package reader
+    :type event: bm257s.subscription.Event
+
+    :return: Measurement or error event for packages, unchanged event otherwise
+    :rtype: bm257s.subscription.Event
+    """
+    if event.event_type is not EventType.PACKAGE:
+        return event
+
+    try:
+        return Event(
+            EventType.MEASUREMENT, parse_package(event.payload), event.timestamp
+        )
+    except RuntimeError as ex:
+        return Event(EventType.ERROR, ex, event.timestamp)
+
+
 class BM257sSerialInterface:
     """Serial interface used to communicate with brymen bm257s multimeters
 
+    In supervised mode, a missing or lost port does not raise. Instead, the port is
+    reopened in the background with exponential backoff and losing and regaining the
+    port is reported as EventType.CONNECTION events to subscribers, with a
+    (connected, outage) tuple as payload. The outage is the duration in seconds the
+    port was missing when reconnecting and None otherwise.
+
     :param port: Device name to use
     :type port: str
     :param read_timeout: Maximum timeout for waiting while reading
     :type read_timeout: float
-    :raise RuntimeError: If opening port is not possible
+    :param supervised: Whether to reopen the port automatically
+    :type supervised: bool
+    :param serial_number: USB serial number of the adapter to find the port by in
+        supervised mode, instead of by its device name
+    :type serial_number: str
+    :param max_backoff: Maximum delay between attempts to reopen the port
+    :type max_backoff: float
+    :raise RuntimeError: If opening port is not possible and not supervised
     """
 
-    def __init__(self, port="/dev/ttyUSB0", read_timeout=0.1):
-        try:
-            self._serial = serial.Serial(
+    def __init__(
+        self,
+        port="/dev/ttyUSB0",
+        read_timeout=0.1,
+        *,
+        supervised=False,
+        serial_number=None,
+        max_backoff=0.5,
+    ):
+        if supervised:
+            self._serial = SupervisedSerial(
                 port,
-                baudrate=9600,
-                parity=serial.PARITY_NONE,
-                bytesize=serial.EIGHTBITS,
-                stopbits=serial.STOPBITS_ONE,
-                timeout=read_timeout,
+                serial_number=serial_number,
+                read_timeout=read_timeout,
+                max_backoff=max_backoff,
+                on_state_change=self._connection_changed,
             )
-        except serial.SerialException as ex:
-            raise RuntimeError(f"Could not open port {port}", ex) from ex
+        else:
+            try:
+                self._serial = open_serial(port, read_timeout)
+            except serial.SerialException as ex:
+                raise RuntimeError(f"Could not open port {port}", ex) from ex
+
+        # In supervised mode, connection events report the port instead of the reader
+        self._package_reader = PackageReader(
+            self._serial, report_running=not supervised
+        )
+
+        if supervised:
+            self._serial.connect()
+
+    def _connection_changed(self, connected, outage):
+        # Runs on the reading thread, bytes of the old connection must not get joined
+        # with new data
+        if connected:
+            self._package_reader.reset()
+        self._package_reader.publish(EventType.CONNECTION, (connected, outage))
+
+    def outages(self):
+        """Get durations of past connection outages in supervised mode
 
-        self._package_reader = PackageReader(self._serial)
+        :return: Outage durations in seconds, oldest first
+        :rtype: list
+        """
+        return list(getattr(self._serial, "outages", ()))
 
     def start(self):
         """Start reading serial measurements
 
-        Call this at most once before calling stop()
+        Does nothing if reading was already started.
         """
         self._package_reader.start()
 
     def stop(self):
         """Stop reading serial measurements
 
-        Call this only when you called start() before
+        Interrupts a pending serial read, so this returns without waiting for the read
+        timeout. Does nothing if reading was not started.
         """
         self._package_reader.stop()
 
@@ -126,11 +194,122 @@ class BM257sSerialInterface:
 
         return parse_package(pkg)
 
+    def subscribe(  # pylint: disable=R0913
+        self,
+        callback,
+        *,
+        events=None,
+        filter=None,  # pylint: disable=W0622
+        executor=None,
+        loop=None,
+        max_queue=16,
+    ):
+        """Subscribe a callback to measurements and state changes of the multimeter
+
+        Callbacks receive a bm257s.subscription.Event for each measurement
+        (EventType.MEASUREMENT, with the same tuple read() returns as payload), each
+        error while reading or parsing (EventType.ERROR) and each change of the
+        connection state (EventType.CONNECTION, whether reading started or stopped, or
+        in supervised mode the port state). Packages get parsed on the dispatching
+        thread, so the serial reader is never blocked by subscribers.
+
+        :param callback: Function called with each delivered event
+        :type callback: callable
+        :param events: Event types to deliver, None for all
+        :type events: set
+        :param filter: Predicate deciding whether to deliver an event, None for all
+        :type filter: callable
+        :param executor: Executor used to run callbacks
+        :type executor: concurrent.futures.Executor
+        :param loop: Event loop used to run callbacks
+        :type loop: asyncio.AbstractEventLoop
+        :param max_queue: Maximum number of undelivered events of this subscriber
+        :type max_queue: int
+
+        :return: The new subscription
+        :rtype: bm257s.subscription.Subscription
+        """
+        return self._package_reader.subscribe(
+            callback,
+            events=events,
+            filter=filter,
+            executor=executor,
+            loop=loop,
+            max_queue=max_queue,
+            transform=measurement_event,
+        )
+
+    def unsubscribe(self, subscription):
+        """Remove a subscription created by subscribe()
+
+        :param subscription: Subscription to remove
+        :type subscription: bm257s.subscription.Subscription
+        """
+        self._package_reader.unsubscribe(subscription)
+
+    def stream(self, max_queue=16):
+        """Create a lazy stream of measurements and errors
+
+        For example, stream().filter(quantity=Measurement.VOLTAGE).normalize()
+        iterates over all voltages in volts.
+
+        :param max_queue: Maximum number of buffered events
+        :type max_queue: int
+
+        :return: Stream subscribing to this multimeter when iterated
+        :rtype: bm257s.stream.Stream
+        """
+        return Stream.subscribe(self, max_queue)
+
+    def stream_async(self, max_queue=16, loop=None):
+        """Create a lazy stream of measurements and errors for "async for"
+
+        :param max_queue: Maximum number of buffered events
+        :type max_queue: int
+        :param loop: Event loop iterating the stream, defaults to the running loop
+        :type loop: asyncio.AbstractEventLoop
+
+        :return: Stream subscribing to this multimeter when iterated
+        :rtype: bm257s.stream.AsyncStream
+        """
+        return AsyncStream.subscribe(self, max_queue, loop)
+
+    def add_package_handler(self, handler):
+        """Add a function called on the reading thread for each received package
+
+        :param handler: Function called with each bm257s.package_reader.Package
+        :type handler: callable
+        """
+        self._package_reader.add_package_handler(handler)
+
+    def remove_package_handler(self, handler):
+        """Remove a function added with add_package_handler()
+
+        :param handler: Handler to remove
+        :type handler: callable
+        """
+        self._package_reader.remove_package_handler(handler)
+
+    def add_frame_handler(self, handler):
+        """Add a function called on the reading thread for each raw frame
+
+        :param handler: Function called with timestamp and raw bytes of each frame,
+            including frames that could not be decoded
+        :type handler: callable
+        """
+        self._package_reader.add_frame_handler(handler)
+
+    def remove_frame_handler(self, handler):
+        """Remove a function added with add_frame_handler()
+
+        :param handler: Handler to remove
+        :type handler: callable
+        """
+        self._package_reader.remove_frame_handler(handler)
+
     def close(self):
         """Closes the used serial port"""
-        if self._package_reader.is_running():
-            self._package_reader.stop()
-
+        self._package_reader.close()
         self._serial.close()
 
     def __enter__(self):
@@ -138,5 +317,4 @@ class BM257sSerialInterface:
         return self
 
     def __exit__(self, exc_type, exc_value, exc_traceback):
-        self._package_reader.stop()
         self.close()
@@ -0,0 +1,238 @@
+"""Supervised serial connections surviving unplugged and replugged adapters"""
+import collections
+import logging
+import threading
+import time
+
+import serial
+import serial.tools.list_ports
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def open_serial(port, read_timeout):
+    """Open a serial port with the settings used by bm257s multimeters
+
+    :param port: Device name to use
+    :type port: str
+    :param read_timeout: Maximum timeout for waiting while reading
+    :type read_timeout: float
+
+    :return: Opened serial port
+    :rtype: serial.Serial
+    :raise serial.SerialException: If opening port is not possible
+    """
+    return serial.Serial(
+        port,
+        baudrate=9600,
+        parity=serial.PARITY_NONE,
+        bytesize=serial.EIGHTBITS,
+        stopbits=serial.STOPBITS_ONE,
+        timeout=read_timeout,
+    )
+
+
+def find_port(serial_number):
+    """Find the device name of a USB serial adapter by its serial number
+
+    :param serial_number: USB serial number of the adapter
+    :type serial_number: str
+
+    :return: Device name or None if no such adapter is plugged in
+    :rtype: str
+    """
+    for info in serial.tools.list_ports.comports():
+        if info.serial_number == serial_number:
+            return info.device
+
+    return None
+
+
+class SupervisedSerial:
+    """Serial port that gets reopened automatically after disconnects
+
+    Reads never raise because of a lost connection. Instead, the port is closed and
+    reopened with exponential backoff, while reads return no data. The port is found by
+    its device name or, if given, by the USB serial number of the adapter, so it is
+    also found if it gets a new device name when plugged in again.
+
+    :param port: Device name to use
+    :type port: str
+    :param serial_number: USB serial number of the adapter, takes precedence over port
+    :type serial_number: str
+    :param read_timeout: Maximum timeout for waiting while reading
+    :type read_timeout: float
+    :param min_backoff: Delay before the first attempt to reopen the port
+    :type min_backoff: float
+    :param max_backoff: Maximum delay between attempts to reopen the port
+    :type max_backoff: float
+    :param on_state_change: Function called with the new connection state and the
+        duration of the outage in seconds when reconnecting, None otherwise
+    :type on_state_change: callable
+    :param open_port: Function opening a port from device name and read timeout
+    :type open_port: callable
+    """
+
+    # pylint: disable=R0902,R0913
+
+    # Number of outage durations kept for reporting
+    MAX_OUTAGES = 256
+
+    def __init__(
+        self,
+        port=None,
+        *,
+        serial_number=None,
+        read_timeout=0.1,
+        min_backoff=0.02,
+        max_backoff=0.5,
+        on_state_change=None,
+        open_port=open_serial,
+    ):
+        if port is None and serial_number is None:
+            raise RuntimeError("Need device name or serial number to find port")
+
+        self._port_name = port
+        self._serial_number = serial_number
+        self._read_timeout = read_timeout
+        self._min_backoff = min_backoff
+        self._max_backoff = max_backoff
+        self._on_state_change = on_state_change
+        self._open_port = open_port
+
+        self._serial = None
+        self._serial_lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._closed = False
+
+        self._backoff = min_backoff
+        self._next_attempt = 0.0
+        self._disconnected_since = None
+        # Durations of past outages in seconds, oldest first
+        self.outages = collections.deque(maxlen=self.MAX_OUTAGES)
+
+    @property
+    def connected(self):
+        """Whether the port is currently open"""
+        return self._serial is not None
+
+    def outage_duration(self):
+        """Get duration of the current outage
+
+        :return: Seconds since the connection got lost or None if there is no outage
+        :rtype: float
+        """
+        if self._serial is not None or self._disconnected_since is None:
+            return None
+
+        return time.monotonic() - self._disconnected_since
+
+    def connect(self):
+        """Try to open the port once, without waiting for the backoff
+
+        :return: Whether the port is open
+        :rtype: bool
+        """
+        if self._serial is not None:
+            return True
+        if self._closed:
+            return False
+
+        port = self._port_name
+        if self._serial_number is not None:
+            port = find_port(self._serial_number)
+
+        try:
+            if port is None:
+                raise serial.SerialException(
+                    f"No adapter with serial number {self._serial_number}"
+                )
+            new_serial = self._open_port(port, self._read_timeout)
+        except (OSError, ValueError) as ex:
+            _LOGGER.debug("Could not open port %s: %s", port, ex)
+            if self._disconnected_since is None:
+                self._disconnected_since = time.monotonic()
+            self._next_attempt = time.monotonic() + self._backoff
+            self._backoff = min(2.0 * self._backoff, self._max_backoff)
+            return False
+
+        with self._serial_lock:
+            if self._closed:
+                new_serial.close()
+                return False
+            self._serial = new_serial
+
+        # Opening the port at the first attempt ends no outage
+        outage = None
+        if self._disconnected_since is not None:
+            outage = time.monotonic() - self._disconnected_since
+            self.outages.append(outage)
+            _LOGGER.info("Reconnected to %s after %.3fs outage", port, outage)
+        self._backoff = self._min_backoff
+
+        if self._on_state_change is not None:
+            self._on_state_change(True, outage)
+        return True
+
+    def _disconnect(self, ex):
+        with self._serial_lock:
+            old_serial = self._serial
+            self._serial = None
+        if old_serial is None:
+            return
+
+        self._disconnected_since = time.monotonic()
+        self._next_attempt = self._disconnected_since + self._backoff
+        _LOGGER.warning("Lost connection to %s: %s", old_serial.port, ex)
+
+        try:
+            old_serial.close()
+        except (OSError, ValueError):
+            pass
+
+        if self._on_state_change is not None:
+            self._on_state_change(False, None)
+
+    def read(self, size):
+        """Read from the port, reopening it if the connection is lost
+
+        :param size: Maximum number of bytes to read
+        :type size: int
+
+        :return: Data read, empty if the port is not open
+        :rtype: bytes
+        """
+        current = self._serial
+        if current is None:
+            delay = self._next_attempt - time.monotonic()
+            if delay > 0.0 and self._cancelled.wait(min(delay, self._read_timeout)):
+                self._cancelled.clear()
+                return b""
+            if time.monotonic() < self._next_attempt or not self.connect():
+                return b""
+            current = self._serial
+            if current is None:
+                return b""
+
+        try:
+            return current.read(size)
+        except (OSError, ValueError) as ex:
+            self._disconnect(ex)
+            return b""
+
+    def cancel_read(self):
+        """Interrupt a pending read or wait for reopening the port"""
+        self._cancelled.set()
+        with self._serial_lock:
+            if self._serial is not None:
+                self._serial.cancel_read()
+
+    def close(self):
+        """Close the port and stop reopening it"""
+        with self._serial_lock:
+            self._closed = True
+            old_serial = self._serial
+            self._serial = None
+
+        if old_serial is not None:
+            old_serial.close()
@@ -0,0 +1,267 @@
+"""Bounded measurement history and terminal trend plots"""
+import bisect
+import math
+
+
+def lttb(timestamps, values, threshold):
+    """Downsample a series with the Largest-Triangle-Three-Buckets algorithm
+
+    Keeps first and last point and from each bucket in between the point forming the
+    largest triangle with the previously kept point and the average of the next bucket,
+    which preserves the visual shape of the series.
+
+    :param timestamps: Sorted timestamps
+    :type timestamps: list
+    :param values: Values, NaN if there is no value
+    :type values: list
+    :param threshold: Number of points to keep
+    :type threshold: int
+
+    :return: Downsampled timestamps and values
+    :rtype: tuple
+    """
+    # pylint: disable=R0914
+    count = len(timestamps)
+    if threshold >= count or threshold < 3:
+        return (list(timestamps), list(values))
+
+    every = (count - 2) / (threshold - 2)
+    result_t = [timestamps[0]]
+    result_v = [values[0]]
+    a = 0
+
+    for i in range(threshold - 2):
+        # Average of next bucket
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, count)
+        next_t = sum(timestamps[next_start:next_end]) / (next_end - next_start)
+        next_v = sum(values[next_start:next_end]) / (next_end - next_start)
+
+        # Point of current bucket with largest triangle
+        a_t, a_v = timestamps[a], values[a]
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        best = start
+        best_area = -1.0
+        for j in range(start, end):
+            area = abs(
+                (a_t - next_t) * (values[j] - a_v)
+                - (a_t - timestamps[j]) * (next_v - a_v)
+            )
+            if area > best_area:
+                best_area = area
+                best = j
+
+        result_t.append(timestamps[best])
+        result_v.append(values[best])
+        a = best
+
+    result_t.append(timestamps[-1])
+    result_v.append(values[-1])
+    return (result_t, result_v)
+
+
+class History:
+    """Multi-resolution history of a single measured value with bounded memory
+
+    New samples are kept at full resolution. When a level is full, its oldest half gets
+    downsampled with LTTB by the reduction factor and moved to the next level, the
+    oldest half of the last level gets dropped. So memory stays bounded while recent
+    samples are kept exactly and older ones with decreasing resolution.
+
+    :param capacity: Maximum number of points per level
+    :type capacity: int
+    :param levels: Number of resolution levels
+    :type levels: int
+    :param factor: Reduction of points from one level to the next
+    :type factor: int
+    """
+
+    def __init__(self, capacity=1024, levels=4, factor=8):
+        if capacity < 2 * factor or levels < 1:
+            raise RuntimeError("History needs room for at least one reduction")
+
+        self._capacity = capacity
+        self._factor = factor
+        # Finest level first, each level is older than the previous one
+        self._levels = [([], []) for _ in range(levels)]
+
+        self.changed_since = math.inf
+
+    def __len__(self):
+        return sum(len(timestamps) for (timestamps, _) in self._levels)
+
+    def add(self, timestamp, value):
+        """Add a sample
+
+        :param timestamp: Time of sample, not older than the previous one
+        :type timestamp: float
+        :param value: Value of sample, None if there is no value
+        :type value: float
+        """
+        timestamps, values = self._levels[0]
+        timestamps.append(timestamp)
+        values.append(math.nan if value is None else value)
+        self.changed_since = min(self.changed_since, timestamp)
+
+        if len(timestamps) > self._capacity:
+            self._reduce(0)
+
+    def _reduce(self, level):
+        timestamps, values = self._levels[level]
+        half = self._capacity // 2
+        old_t, old_v = timestamps[:half], values[:half]
+        del timestamps[:half]
+        del values[:half]
+
+        if level + 1 == len(self._levels):
+            return
+
+        reduced_t, reduced_v = lttb(old_t, old_v, max(3, half // self._factor))
+        next_t, next_v = self._levels[level + 1]
+        next_t.extend(reduced_t)
+        next_v.extend(reduced_v)
+        self.changed_since = min(self.changed_since, reduced_t[0])
+
+        if len(next_t) > self._capacity:
+            self._reduce(level + 1)
+
+    def clear(self):
+        """Remove all samples"""
+        for timestamps, values in self._levels:
+            timestamps.clear()
+            values.clear()
+        self.changed_since = -math.inf
+
+    def points(self, start=-math.inf, end=math.inf):
+        """Get all points in a time range, in best available resolution
+
+        :param start: First time to include
+        :type start: float
+        :param end: Time to stop before
+        :type end: float
+
+        :return: Timestamps and values
+        :rtype: tuple
+        """
+        result_t = []
+        result_v = []
+        for timestamps, values in reversed(self._levels):
+            first = bisect.bisect_left(timestamps, start)
+            last = bisect.bisect_left(timestamps, end)
+            result_t += timestamps[first:last]
+            result_v += values[first:last]
+
+        return (result_t, result_v)
+
+
+class TrendPlot:
+    """Terminal plot of the recent part of a history
+
+    Each column of the plot covers a time bucket aligned to absolute time. The value
+    range of each bucket is cached, so when new samples arrive only the buckets they
+    changed get recomputed.
+
+    :param history: History to plot
+    :type history: bm257s.history.History
+    :param span: Time span shown in seconds
+    :type span: float
+    :param width: Width of plot in characters
+    :type width: int
+    :param height: Height of plot in characters
+    :type height: int
+    """
+
+    def __init__(self, history, span, width, height):
+        self._history = history
+        self._span = span
+        self._width = width
+        self._height = height
+        self._bucket = span / width
+
+        self._cache = {}
+
+    def configure(self, span=None, width=None, height=None):
+        """Change time span or size of plot
+
+        :param span: Time span shown in seconds
+        :type span: float
+        :param width: Width of plot in characters
+        :type width: int
+        :param height: Height of plot in characters
+        :type height: int
+        """
+        self._span = self._span if span is None else span
+        self._width = self._width if width is None else width
+        self._height = self._height if height is None else height
+
+        bucket = self._span / self._width
+        if bucket != self._bucket:
+            self._bucket = bucket
+            self._cache = {}
+
+    def columns(self, now):
+        """Get value range of each column
+
+        :param now: Time shown at right edge of plot
+        :type now: float
+
+        :return: List of (min, max) tuples or None for columns without values
+        :rtype: list
+        """
+        last = math.floor(now / self._bucket)
+        first = last - self._width + 1
+
+        # Forget buckets that are out of view, still filling up or changed
+        changed = self._history.changed_since
+        self._history.changed_since = math.inf
+        self._cache = {
+            b: r
+            for (b, r) in self._cache.items()
+            if first <= b < last and (b + 1) * self._bucket <= changed
+        }
+
+        missing = [b for b in range(first, last + 1) if b not in self._cache]
+        if len(missing) > 0:
+            timestamps, values = self._history.points(
+                missing[0] * self._bucket, (missing[-1] + 1) * self._bucket
+            )
+            for b in missing:
+                low = bisect.bisect_left(timestamps, b * self._bucket)
+                high = bisect.bisect_left(timestamps, (b + 1) * self._bucket)
+                bucket_values = [v for v in values[low:high] if not math.isnan(v)]
+                self._cache[b] = (
+                    (min(bucket_values), max(bucket_values)) if bucket_values else None
+                )
+
+        return [self._cache[b] for b in range(first, last + 1)]
+
+    def render(self, now):
+        """Render plot as lines of text
+
+        :param now: Time shown at right edge of plot
+        :type now: float
+
+        :return: Lines of plot, top to bottom, and shown value range
+        :rtype: tuple
+        """
+        columns = self.columns(now)
+        ranges = [c for c in columns if c is not None]
+        if len(ranges) == 0:
+            return ([" " * self._width] * self._height, None)
+
+        low = min(r[0] for r in ranges)
+        high = max(r[1] for r in ranges)
+        scale = (self._height - 1) / (high - low) if high > low else 0.0
+
+        grid = [[" "] * self._width for _ in range(self._height)]
+        for x, column in enumerate(columns):
+            if column is None:
+                continue
+
+            top = self._height - 1 - round((column[1] - low) * scale)
+            bottom = self._height - 1 - round((column[0] - low) * scale)
+            for y in range(top, bottom + 1):
+                grid[y][x] = "*" if top == bottom else "|"
+
+        return (["".join(row) for row in grid], (low, high))
@@ -16,9 +16,29 @@ class Measurement:
     PREFIX_MILLI = "m"
     PREFIX_MICRO = "u"
 
+    PREFIX_FACTORS = {
+        PREFIX_NONE: 1.0,
+        PREFIX_KILO: 1e3,
+        PREFIX_MEGA: 1e6,
+        PREFIX_MILLI: 1e-3,
+        PREFIX_MICRO: 1e-6,
+    }
+
     def __init__(self, prefix=PREFIX_NONE):
         self.prefix = prefix
 
+    def si_value(self):
+        """Get measured value without metric prefix
+
+        :return: Measured value in SI base unit or None if there is no value
+        :rtype: float
+        """
+        value = getattr(self, "value", None)
+        if value is None:
+            return None
+
+        return value * self.PREFIX_FACTORS[self.prefix]
+
     TEMPERATURE = "TEMPERATURE"
     RESISTANCE = "RESISTANCE"
     VOLTAGE = "VOLTAGE"
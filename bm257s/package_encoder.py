@@ -0,0 +1,174 @@
+"""Encode displayed values and measurements into raw multimeter packages"""
+from .measurement import (
+    Measurement,
+    ResistanceMeasurement,
+    TemperatureMeasurement,
+    VoltageMeasurement,
+)
+from .package_reader import DEFAULT_SPEC, SEGMENT_CHARACTERS, Package, Symbol
+
+CHARACTER_SEGMENTS = {char: segments for (segments, char) in SEGMENT_CHARACTERS.items()}
+
+# Largest count the 6000-count display can show
+MAX_COUNT = 5999
+DIGITS = 4
+
+OVERLOAD_DISPLAY = " 0.L "
+
+PREFIX_SYMBOLS = {
+    Measurement.PREFIX_NONE: set(),
+    Measurement.PREFIX_KILO: {Symbol.KILO},
+    Measurement.PREFIX_MEGA: {Symbol.MEGA},
+    Measurement.PREFIX_MILLI: {Symbol.MILLI},
+    Measurement.PREFIX_MICRO: {Symbol.MICRO},
+}
+
+
+def encode_package(pkg, spec=DEFAULT_SPEC):
+    """Encode a package into raw multimeter data
+
+    This is the inverse of bm257s.package_reader.parse_package().
+
+    :param pkg: Package to encode
+    :type pkg: bm257s.package_reader.Package
+    :param spec: Protocol specification of the multimeter model
+    :type spec: bm257s.protocol.ProtocolSpec
+
+    :return: Raw package data
+    :rtype: bytes
+    :raise RuntimeError: If the package cannot be represented in the protocol
+    """
+    if len(pkg.segments) != len(spec.segments) or len(pkg.dots) != len(spec.dots):
+        raise RuntimeError("Package does not match digits of protocol")
+
+    data = bytearray(i << spec.index_shift for i in range(spec.length))
+    data[0] |= spec.start
+
+    positions = []
+    for (digit, occupancy) in zip(spec.segments, pkg.segments):
+        positions += [pos for (pos, on) in zip(digit, occupancy) if on]
+    positions += [pos for (pos, on) in zip(spec.dots, pkg.dots) if on]
+    if pkg.minus:
+        positions.append(spec.minus)
+    for symbol in pkg.symbols:
+        if symbol.name not in spec.symbols:
+            raise RuntimeError(f"Symbol {symbol.name} is not part of protocol")
+        positions.append(spec.symbols[symbol.name])
+
+    for (byte, bit) in positions:
+        data[byte] |= 1 << bit
+
+    return bytes(data)
+
+
+def display_package(display, symbols=()):
+    """Create a package showing a string on the segment display
+
+    :param display: Characters of all digits, with optional leading minus and dots
+        after digits (e.g. "-5.136" or " 0.L ")
+    :type display: str
+    :param symbols: Symbols shown
+    :type symbols: set
+
+    :return: Package showing the given display state
+    :rtype: bm257s.package_reader.Package
+    :raise RuntimeError: If the display string cannot be shown
+    """
+    minus = display.startswith("-") and len(display.replace(".", "")) > DIGITS
+    if minus:
+        display = display[1:]
+
+    segments = []
+    dots = [False] * (DIGITS - 1)
+    for char in display:
+        if char == ".":
+            if not 0 < len(segments) < DIGITS:
+                raise RuntimeError(f"Cannot show dot at this position in {display}")
+            dots[len(segments) - 1] = True
+        elif char in CHARACTER_SEGMENTS:
+            segments.append(CHARACTER_SEGMENTS[char])
+        else:
+            raise RuntimeError(f"Cannot show character {char} on segment display")
+
+    if len(segments) != DIGITS:
+        raise RuntimeError(f"Display {display} needs exactly {DIGITS} digits")
+
+    return Package(segments, dots, minus, set(symbols))
+
+
+def format_value(value):
+    """Format a value like the segment display would show it
+
+    Uses as many decimals as possible without exceeding the display count.
+
+    :param value: Value to show
+    :type value: float
+
+    :return: Display string or OVERLOAD_DISPLAY if the value is too large
+    :rtype: str
+    """
+    sign = "-" if value < 0 else ""
+    magnitude = abs(value)
+
+    for decimals in range(DIGITS - 1, -1, -1):
+        if round(magnitude * 10**decimals) <= MAX_COUNT:
+            text = f"{magnitude:.{decimals}f}"
+            digit_count = len(text.replace(".", ""))
+            return sign + " " * (DIGITS - digit_count) + text
+
+    return OVERLOAD_DISPLAY
+
+
+def measurement_package(measurement):
+    """Create a package showing a measurement
+
+    :param measurement: Measurement to show
+    :type measurement: bm257s.measurement.Measurement
+
+    :return: Package showing the measurement
+    :rtype: bm257s.package_reader.Package
+    :raise RuntimeError: If the type of measurement is not supported or a temperature
+        does not fit on the display
+    """
+    if isinstance(measurement, TemperatureMeasurement):
+        unit = {
+            TemperatureMeasurement.UNIT_CELSIUS: "C",
+            TemperatureMeasurement.UNIT_FAHRENHEIT: "F",
+        }[measurement.unit]
+        if measurement.value is None:
+            return display_package("---" + unit)
+        text = f"{int(measurement.value):>3}"
+        if len(text) > 3:
+            raise RuntimeError(f"Temperature {measurement.value} does not fit display")
+        return display_package(text + unit)
+
+    symbols = {Symbol.AUTO} | PREFIX_SYMBOLS[measurement.prefix]
+    if isinstance(measurement, VoltageMeasurement):
+        symbols.add(Symbol.VOLT)
+        if measurement.current == VoltageMeasurement.CURRENT_AC:
+            symbols.add(Symbol.AC)
+        else:
+            symbols.add(Symbol.DC)
+    elif isinstance(measurement, ResistanceMeasurement):
+        symbols.add(Symbol.OHM)
+    else:
+        raise RuntimeError(f"Cannot encode {type(measurement).__name__}")
+
+    if measurement.value is None:
+        return display_package(OVERLOAD_DISPLAY, symbols)
+
+    return display_package(format_value(measurement.value), symbols)
+
+
+def encode_measurement(measurement, spec=DEFAULT_SPEC):
+    """Encode a measurement into raw multimeter data
+
+    :param measurement: Measurement to encode
+    :type measurement: bm257s.measurement.Measurement
+    :param spec: Protocol specification of the multimeter model
+    :type spec: bm257s.protocol.ProtocolSpec
+
+    :return: Raw package data
+    :rtype: bytes
+    """
+    return encode_package(measurement_package(measurement), spec)
@@ -14,6 +14,7 @@ def parse_voltage(pkg, prefix):
 
     :return: Multimeter measurement type and measurement
     :rtype: tuple
+    :raise RuntimeError: If package does not contain a valid voltage measurement
     """
     value = pkg.segment_float()
 
@@ -21,6 +22,8 @@ def parse_voltage(pkg, prefix):
         current = VoltageMeasurement.CURRENT_AC
     elif Symbol.DC in pkg.symbols:
         current = VoltageMeasurement.CURRENT_DC
+    else:
+        raise RuntimeError("Cannot determine type of current of voltage measurement")
 
     return (
         Measurement.VOLTAGE,
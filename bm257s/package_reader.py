@@ -1,35 +1,30 @@
 """Read, organize and validate packages from data input"""
-import enum
 import threading
 
-
-class Symbol(enum.Enum):
-    """Enumeration of all LCD symbols"""
-
-    AUTO = enum.auto()
-    DC = enum.auto()
-    AC = enum.auto()
-    REL = enum.auto()
-    BEEP = enum.auto()
-    BATTERY = enum.auto()
-    LOZ = enum.auto()
-    BMINUS = enum.auto()
-    HOLD = enum.auto()
-    DBM = enum.auto()
-    MEGA = enum.auto()
-    KILO = enum.auto()
-    CREST = enum.auto()
-    OHM = enum.auto()
-    HZ = enum.auto()
-    NANO = enum.auto()
-    MAX = enum.auto()
-    FARAD = enum.auto()
-    MICRO = enum.auto()
-    MILLI = enum.auto()
-    MIN = enum.auto()
-    VOLT = enum.auto()
-    AMPERE = enum.auto()
-    SCALE = enum.auto()
+from .protocol import ProtocolSpec, Symbol, compile_decoder
+from .subscription import Event, EventType, Publisher
+
+# Characters shown by 7-segment digits, indexed by occupancy of segments A to G
+SEGMENT_CHARACTERS = {
+    (True, True, True, True, True, True, False): "0",
+    (False, True, True, False, False, False, False): "1",
+    (True, True, False, True, True, False, True): "2",
+    (True, True, True, True, False, False, True): "3",
+    (False, True, True, False, False, True, True): "4",
+    (True, False, True, True, False, True, True): "5",
+    (True, False, True, True, True, True, True): "6",
+    (True, True, True, False, False, False, False): "7",
+    (True, True, True, True, True, True, True): "8",
+    (True, True, True, True, False, True, True): "9",
+    (True, False, False, True, True, True, False): "C",
+    (True, False, False, False, True, True, True): "F",
+    (False, False, False, False, False, False, True): "-",
+    (False, False, False, False, False, False, False): " ",
+    (False, False, False, True, True, True, False): "L",
+}
+
+# Segments of the "L" shown when the measurement is out of range ("0.L")
+OVERLOAD_SEGMENTS = (False, False, False, True, True, True, False)
 
 
 class Package:
@@ -61,30 +56,19 @@ class Package:
         :rtype: str
         :raise RuntimeError: If the segment doesn't show a character
         """
-
-        character_segments = {
-            (True, True, True, True, True, True, False): "0",
-            (False, True, True, False, False, False, False): "1",
-            (True, True, False, True, True, False, True): "2",
-            (True, True, True, True, False, False, True): "3",
-            (False, True, True, False, False, True, True): "4",
-            (True, False, True, True, False, True, True): "5",
-            (True, False, True, True, True, True, True): "6",
-            (True, True, True, False, False, False, False): "7",
-            (True, True, True, True, True, True, True): "8",
-            (True, True, True, True, False, True, True): "9",
-            (True, False, False, True, True, True, False): "C",
-            (True, False, False, False, True, True, True): "F",
-            (False, False, False, False, False, False, True): "-",
-            (False, False, False, False, False, False, False): " ",
-            (False, False, False, True, True, True, False): "L",
-        }
-
-        if self.segments[pos] in character_segments:
-            return character_segments[self.segments[pos]]
+        if self.segments[pos] in SEGMENT_CHARACTERS:
+            return SEGMENT_CHARACTERS[self.segments[pos]]
 
         raise RuntimeError(f"Cannot read character from segment {pos}")
 
+    def is_overload(self):
+        """Check if the display shows an out of range measurement
+
+        :return: Whether the segment display shows an overload ("0.L")
+        :rtype: bool
+        """
+        return OVERLOAD_SEGMENTS in self.segments
+
     def segment_string(self, start_i=0, end_i=3, use_dots=True, use_minus=True):
         """Read segment string value from segment display
 
@@ -134,160 +118,297 @@ class Package:
         raw_str = self.segment_string(start_i, end_i, use_minus)
 
         try:
-            return float(raw_str)
+            return float(raw_str.replace(" ", ""))
         except ValueError as ex:
             raise RuntimeError(
                 "Cannot read float value from segment display", ex
             ) from ex
 
 
-def parse_segment(data, pos):
+DEFAULT_SPEC = ProtocolSpec.for_model("BM257s")
+
+
+def compile_package_decoder(spec):
+    """Compile a protocol specification into a package decoder
+
+    :param spec: Protocol specification of the multimeter model
+    :type spec: bm257s.protocol.ProtocolSpec
+
+    :return: Function parsing a package from raw data aligned to a package boundary
+    :rtype: callable
+    """
+    return compile_decoder(spec, Package, Symbol)
+
+
+_decode_default = compile_package_decoder(DEFAULT_SPEC)
+
+
+def parse_segment(data, pos, spec=DEFAULT_SPEC):
     """Parses a single 7-segment digit from raw multimeter data
 
-    :param data: Raw multimeter data, aligned to 15-byte boundary
+    :param data: Raw multimeter data, aligned to package boundary
     :type data: bytes
     :param pos: Number of segment to parse (numbered left to right)
     :type pos: int
+    :param spec: Protocol specification of the multimeter model
+    :type spec: bm257s.protocol.ProtocolSpec
 
     :return: 7-segment digit configuration
     :rtype: tuple
     """
-    start_i = 3 + 2 * pos
-    return (
-        bool(data[start_i] & (1 << 3)),  # A
-        bool(data[start_i + 1] & (1 << 3)),  # B
-        bool(data[start_i + 1] & (1 << 1)),  # C
-        bool(data[start_i + 1] & 1),  # D
-        bool(data[start_i] & (1 << 1)),  # E
-        bool(data[start_i] & (1 << 2)),  # F
-        bool(data[start_i + 1] & (1 << 2)),  # G
-    )
-
-
-def parse_dot(data, pos):
+    return tuple(bool(data[byte] & (1 << bit)) for (byte, bit) in spec.segments[pos])
+
+
+def parse_dot(data, pos, spec=DEFAULT_SPEC):
     """Parses a single dot from raw multimeter data
 
-    :param data: Raw multimeter data, aligned to 15-byte boundary
+    :param data: Raw multimeter data, aligned to package boundary
     :type data: bytes
     :param pos: Number of dot to parse (numbered left to right)
     :type pos: int
+    :param spec: Protocol specification of the multimeter model
+    :type spec: bm257s.protocol.ProtocolSpec
 
     :return: Whether dot is on
     :rtype: bool
     """
-    return bool(data[5 + 2 * pos] & 1)
+    (byte, bit) = spec.dots[pos]
+    return bool(data[byte] & (1 << bit))
 
 
-def parse_symbols(data):
+def parse_symbols(data, spec=DEFAULT_SPEC):
     """Parses symbols from raw multimeter data
 
-    :param data: Raw multimeter data, aligned to 15-byte boundary
+    :param data: Raw multimeter data, aligned to package boundary
     :type data: bytes
+    :param spec: Protocol specification of the multimeter model
+    :type spec: bm257s.protocol.ProtocolSpec
 
     :return: List of shown symbols
     :rtype: list
     """
-    symbol_positions = {
-        1: (Symbol.AUTO, Symbol.DC, Symbol.AC, Symbol.REL),
-        2: (Symbol.BEEP, Symbol.BATTERY, Symbol.LOZ, Symbol.BMINUS),
-        11: (Symbol.HOLD, Symbol.DBM, Symbol.MEGA, Symbol.KILO),
-        12: (Symbol.CREST, Symbol.OHM, Symbol.HZ, Symbol.NANO),
-        13: (Symbol.MAX, Symbol.FARAD, Symbol.MICRO, Symbol.MILLI),
-        14: (Symbol.MIN, Symbol.VOLT, Symbol.AMPERE, Symbol.SCALE),
-    }
-
-    result = []
-    # Go through all bytes
-    for i in range(0, 15):
-
-        # Skip segment display section
-        if i in symbol_positions:
-
-            # Go through symbol bits
-            for j in range(0, 4):
-                if data[i] & (1 << j):
-                    result.append(symbol_positions[i][3 - j])
+    return [
+        Symbol[name]
+        for (name, (byte, bit)) in spec.symbols.items()
+        if data[byte] & (1 << bit)
+    ]
 
-    return result
 
-
-def parse_minus(data):
+def parse_minus(data, spec=DEFAULT_SPEC):
     """Parse minus sign from raw multimeter data
 
-    :param data: Raw multimeter data, aligned to 15-byte boundary
+    :param data: Raw multimeter data, aligned to package boundary
     :type data: bytes
+    :param spec: Protocol specification of the multimeter model
+    :type spec: bm257s.protocol.ProtocolSpec
 
     :return: Whether minus is on
     :rtype: bool
     """
-    return bool(data[3] & 1)
+    (byte, bit) = spec.minus
+    return bool(data[byte] & (1 << bit))
 
 
 def parse_package(data):
     """Parses a package from raw multimeter data
 
+    Uses the decoder compiled from DEFAULT_SPEC, see compile_package_decoder() for
+    other multimeter models.
+
     :param data: Raw multimeter data, aligned to 15-byte boundary
     :type data: bytes
     :raise RuntimeError: If package contains invalid data
     """
-    # Check byte indices
-    index_mask = ((1 << 5) - 1) << 4
-    for (i, d_i) in enumerate(data):
-        index_field = (d_i & index_mask) >> 4
-        if index_field != i:
-            raise RuntimeError(
-                f"Raw data package contains invalid byte index at byte {i}",
-                index_field,
-            )
+    return _decode_default(bytes(data))
+
+
+class FrameDecoder:
+    """Sans-IO decoder splitting a byte stream into packages
+
+    Bytes can be fed in chunks of any size, from any source. Alignment state is kept
+    across calls, so packages may be split between chunks. The decoder does no I/O
+    and uses no threads, so it can be driven by a reading thread, an event loop or
+    directly by tests.
+
+    :param spec: Protocol specification of the multimeter model, defaults to BM257s
+    :type spec: bm257s.protocol.ProtocolSpec
+    """
+
+    def __init__(self, spec=None):
+        if spec is None:
+            self._pkg_len = DEFAULT_SPEC.length
+            self._pkg_start = DEFAULT_SPEC.start
+            self._decode = _decode_default
+        else:
+            self._pkg_len = spec.length
+            self._pkg_start = spec.start
+            self._decode = compile_package_decoder(spec)
+
+        self._start_byte = bytes([self._pkg_start])
+        self._data = b""
 
-    segments = [parse_segment(data, i) for i in range(0, 4)]
-    dots = [parse_dot(data, i) for i in range(0, 3)]
-    minus = parse_minus(data)
-    symbols = parse_symbols(data)
-    return Package(segments, dots, minus, set(symbols))
+    def bytes_needed(self):
+        """Get number of bytes needed to complete the current package
+
+        Reading exactly this many bytes keeps blocking reads aligned to packages.
+
+        :return: Number of missing bytes
+        :rtype: int
+        """
+        return self._pkg_len - len(self._data)
+
+    def feed(self, data, timestamp=None, frames=None):
+        """Decode all packages completed by new data
+
+        Bytes before the start of a package are skipped. If an aligned package cannot
+        be decoded, an error event is returned and decoding continues after its start
+        byte, so the decoder realigns with the next package.
+
+        :param data: Received bytes
+        :type data: bytes
+        :param timestamp: Time the data was received, defaults to now
+        :type timestamp: float
+        :param frames: List the raw frame of each returned event gets appended to, in
+            the same order, including frames that could not be decoded
+        :type frames: list
+
+        :return: List of EventType.PACKAGE and EventType.ERROR events
+        :rtype: list
+        """
+        buffer = self._data + bytes(data)
+        pkg_len = self._pkg_len
+        events = []
+        pos = 0
+
+        while True:
+            pos = buffer.find(self._start_byte, pos)
+            if pos < 0:
+                # Nothing in buffer can become part of a package
+                buffer = b""
+                pos = 0
+                break
+            if len(buffer) - pos < pkg_len:
+                break
+
+            frame = buffer[pos : pos + pkg_len]  # noqa: E203
+            if frames is not None:
+                frames.append(frame)
+            try:
+                pkg = self._decode(frame)
+            except RuntimeError as ex:
+                events.append(Event(EventType.ERROR, ex, timestamp))
+                pos += 1
+            else:
+                events.append(Event(EventType.PACKAGE, pkg, timestamp))
+                pos += pkg_len
+
+        self._data = buffer[pos:]
+        return events
+
+    def reset(self):
+        """Forget buffered bytes of an incomplete package"""
+        self._data = b""
 
 
 class PackageReader:
     """Read, organize and validate packages from data input
 
+    Reads on a separate thread and splits the data into packages with a FrameDecoder.
+    If the reader provides a cancel_read() method (like pyserial serial ports do), it
+    is used to interrupt blocking reads when stopping. Otherwise stopping takes up to
+    the reader timeout.
+
     :param reader: Input reader used
     :type reader: Class with reader.read(len) method
+    :param spec: Protocol specification of the multimeter model, defaults to BM257s
+    :type spec: bm257s.protocol.ProtocolSpec
+    :param report_running: Whether to publish starting and stopping of the reader as
+        EventType.CONNECTION events
+    :type report_running: bool
     """
 
-    PKG_LEN = 15
-    PKG_START = 0b00000010  # Start of first package byte
+    # pylint: disable=R0902
+    # Reader and alignment state both need to outlive the read thread
 
-    def __init__(self, reader):
+    PKG_LEN = DEFAULT_SPEC.length
+    PKG_START = DEFAULT_SPEC.start  # Start of first package byte
+
+    def __init__(self, reader, spec=None, *, report_running=True):
         self._reader = reader
+        self._report_running = report_running
 
-        self._read_thread = threading.Thread(target=self._run)
+        self._read_thread = None
         self._read_thread_stop = threading.Event()
+        self._run_lock = threading.Lock()
+        self._running = False
+        self._running_lock = threading.Lock()
+
+        # Alignment state, kept across restarts
+        self._decoder = FrameDecoder(spec)
 
         self._last_pkg = None
         self._last_pkg_lock = threading.Lock()
 
         self._received_pkg = threading.Event()
 
+        self._publisher = Publisher()
+        self._package_handlers = ()
+        self._frame_handlers = ()
+
     def start(self):
         """Start reading packages in a seperate thread
 
-        Call this at most once until you call stop().
+        Does nothing if the reader is already running. A reading thread that ended
+        because of a failing reader gets replaced.
         """
-        self._received_pkg.clear()
-        self._last_pkg = None
+        with self._run_lock:
+            if self._read_thread is not None:
+                if self._read_thread.is_alive():
+                    return
+                self._read_thread.join()
+
+            self._received_pkg.clear()
+            self._last_pkg = None
+
+            self._set_running(True)
 
-        self._read_thread_stop.clear()
-        self._read_thread.start()
+            self._read_thread_stop.clear()
+            self._read_thread = threading.Thread(target=self._run, daemon=True)
+            self._read_thread.start()
 
     def stop(self):
         """Stop reading packages in seperate thread
 
-        Only call this if you previously called start().
+        Does nothing if the reader is not running.
         """
-        self._read_thread_stop.set()
-        self._read_thread.join()
+        with self._run_lock:
+            if self._read_thread is None:
+                return
 
-        self._read_thread = threading.Thread(target=self._run)
+            self._read_thread_stop.set()
+            cancel_read = getattr(self._reader, "cancel_read", None)
+            if cancel_read is not None:
+                cancel_read()
+
+            self._read_thread.join()
+            self._read_thread = None
+
+        self._set_running(False)
+
+    def _set_running(self, running):
+        # Reading can end by stopping or by a failing reader, only report it once
+        with self._running_lock:
+            if running == self._running:
+                return
+            self._running = running
+
+        if self._report_running:
+            self._publisher.publish(EventType.CONNECTION, running)
+
+    def close(self):
+        """Stop reading and cancel all subscriptions"""
+        self.stop()
+        self._publisher.close()
 
     def is_running(self):
         """Check if the reader is currently running
@@ -295,7 +416,8 @@ class PackageReader:
         :return: Whether reader is currently running
         :rtype: bool
         """
-        return self._read_thread.is_alive()
+        read_thread = self._read_thread
+        return read_thread is not None and read_thread.is_alive()
 
     def wait_for_package(self, timeout):
         """Wait until a new package is received
@@ -322,30 +444,164 @@ class PackageReader:
 
             return result
 
-    def _run(self):
-        data = bytes()
-        read_next = self.PKG_LEN
+    def subscribe(  # pylint: disable=R0913
+        self,
+        callback,
+        *,
+        events=None,
+        filter=None,  # pylint: disable=W0622
+        executor=None,
+        loop=None,
+        max_queue=16,
+        transform=None,
+    ):
+        """Subscribe a callback to events of this reader
+
+        Callbacks receive a bm257s.subscription.Event for each received package
+        (EventType.PACKAGE), each package that could not get parsed (EventType.ERROR)
+        and each start or stop of the reader (EventType.CONNECTION). They are run on
+        the given executor or event loop, or on a thread pool owned by the reader, so
+        slow callbacks never block reading.
+
+        :param callback: Function called with each delivered event
+        :type callback: callable
+        :param events: Event types to deliver, None for all
+        :type events: set
+        :param filter: Predicate deciding whether to deliver an event, None for all
+        :type filter: callable
+        :param executor: Executor used to run callbacks
+        :type executor: concurrent.futures.Executor
+        :param loop: Event loop used to run callbacks
+        :type loop: asyncio.AbstractEventLoop
+        :param max_queue: Maximum number of undelivered events of this subscriber
+        :type max_queue: int
+        :param transform: Function converting events before filtering and delivery
+        :type transform: callable
+
+        :return: The new subscription
+        :rtype: bm257s.subscription.Subscription
+        """
+        return self._publisher.subscribe(
+            callback,
+            events=events,
+            event_filter=filter,
+            executor=executor,
+            loop=loop,
+            max_queue=max_queue,
+            transform=transform,
+        )
+
+    def unsubscribe(self, subscription):
+        """Remove a subscription created by subscribe()
+
+        :param subscription: Subscription to remove
+        :type subscription: bm257s.subscription.Subscription
+        """
+        self._publisher.unsubscribe(subscription)
+
+    def publish(self, event_type, payload):
+        """Publish an event to all subscriptions, e.g. on behalf of the reader
+
+        :param event_type: Type of event
+        :type event_type: bm257s.subscription.EventType
+        :param payload: Payload of event
+        :type payload: object
+        """
+        self._publisher.publish(event_type, payload)
+
+    def add_package_handler(self, handler):
+        """Add a function called synchronously for each received package
 
+        Handlers run on the reading thread before the package gets published, so they
+        need to be fast. Exceptions raised by handlers are published as errors.
+
+        :param handler: Function called with each package
+        :type handler: callable
+        """
+        self._package_handlers = self._package_handlers + (handler,)
+
+    def remove_package_handler(self, handler):
+        """Remove a function added with add_package_handler()
+
+        :param handler: Handler to remove
+        :type handler: callable
+        """
+        self._package_handlers = tuple(
+            h for h in self._package_handlers if h != handler
+        )
+
+    def add_frame_handler(self, handler):
+        """Add a function called synchronously for each raw frame
+
+        Handlers run on the reading thread with the timestamp and raw bytes of each
+        aligned frame, including frames that could not be decoded, so they need to be
+        fast. Exceptions raised by handlers are published as errors.
+
+        :param handler: Function called with timestamp and frame
+        :type handler: callable
+        """
+        self._frame_handlers = self._frame_handlers + (handler,)
+
+    def remove_frame_handler(self, handler):
+        """Remove a function added with add_frame_handler()
+
+        :param handler: Handler to remove
+        :type handler: callable
+        """
+        self._frame_handlers = tuple(h for h in self._frame_handlers if h != handler)
+
+    def _handle(self, handlers, *args):
+        for handler in handlers:
+            try:
+                handler(*args)
+            except Exception as ex:  # pylint: disable=W0703
+                self._publisher.publish(EventType.ERROR, ex)
+
+    def reset(self):
+        """Forget buffered bytes of an incomplete package, e.g. after reconnecting
+
+        Must only be called from the reading thread or while the reader is stopped.
+        """
+        self._decoder.reset()
+
+    def feed(self, data, timestamp=None):
+        """Process received data like the reading thread does
+
+        Allows driving the reader without its thread, e.g. with data received
+        elsewhere. Must not be used while the reader is running.
+
+        :param data: Received bytes
+        :type data: bytes
+        :param timestamp: Time the data was received, defaults to now
+        :type timestamp: float
+        """
+        frame_handlers = self._frame_handlers
+        frames = [] if frame_handlers else None
+        events = self._decoder.feed(data, timestamp, frames)
+
+        for i, event in enumerate(events):
+            if frame_handlers:
+                self._handle(frame_handlers, event.timestamp, frames[i])
+
+            if event.event_type is EventType.PACKAGE:
+                pkg = event.payload
+                with self._last_pkg_lock:
+                    self._last_pkg = pkg
+                    self._received_pkg.set()
+
+                self._handle(self._package_handlers, pkg)
+
+            self._publisher.publish(event.event_type, event.payload, event.timestamp)
+
+    def _run(self):
         while not self._read_thread_stop.is_set():
-            # Read new data from reader
-            new_data = self._reader.read(read_next)
+            # Read new data from reader, a failing reader ends reading
+            try:
+                new_data = self._reader.read(self._decoder.bytes_needed())
+            except OSError as ex:
+                self._publisher.publish(EventType.ERROR, ex)
+                self._set_running(False)
+                return
 
             if len(new_data) > 0:
-
-                # Find package start and perform alignment with it
-                data = data + new_data
-                for (i, byte) in enumerate(data):
-                    if byte == self.PKG_START:
-                        data = data[i:]
-                        read_next = self.PKG_LEN - len(data)
-                        break
-
-                # Parse package
-                if len(data) >= self.PKG_LEN:
-                    read_next = self.PKG_LEN
-
-                    pkg = parse_package(data[0 : self.PKG_LEN])  # noqa: E203
-                    data = data[self.PKG_LEN :]  # noqa: E203
-                    with self._last_pkg_lock:
-                        self._last_pkg = pkg
-                        self._received_pkg.set()
+                self.feed(new_data)
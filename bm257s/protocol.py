@@ -0,0 +1,333 @@
+"""Declarative frame layouts of multimeter protocols and decoders compiled from them
+
+A layout describes where each segment, dot, the minus sign and every symbol of the LCD
+are located in a raw frame, as [byte, bit] positions. Layouts are plain data (and can
+be loaded from JSON files), so supporting a related model only needs a new layout, as
+long as it only uses symbols known to Symbol.
+"""
+import enum
+import json
+
+
+class Symbol(enum.Enum):
+    """Enumeration of all LCD symbols"""
+
+    AUTO = enum.auto()
+    DC = enum.auto()
+    AC = enum.auto()
+    REL = enum.auto()
+    BEEP = enum.auto()
+    BATTERY = enum.auto()
+    LOZ = enum.auto()
+    BMINUS = enum.auto()
+    HOLD = enum.auto()
+    DBM = enum.auto()
+    MEGA = enum.auto()
+    KILO = enum.auto()
+    CREST = enum.auto()
+    OHM = enum.auto()
+    HZ = enum.auto()
+    NANO = enum.auto()
+    MAX = enum.auto()
+    FARAD = enum.auto()
+    MICRO = enum.auto()
+    MILLI = enum.auto()
+    MIN = enum.auto()
+    VOLT = enum.auto()
+    AMPERE = enum.auto()
+    SCALE = enum.auto()
+
+
+# Brymen 6000-count protocol as used by the BM257s
+BM257S_LAYOUT = {
+    "model": "BM257s",
+    "length": 15,
+    # Value of first byte of a frame, used for alignment
+    "start": 0x02,
+    # Each byte carries its own index in its upper bits
+    "index_shift": 4,
+    # Segments A to G of each digit, left to right
+    "segments": [
+        [[3, 3], [4, 3], [4, 1], [4, 0], [3, 1], [3, 2], [4, 2]],
+        [[5, 3], [6, 3], [6, 1], [6, 0], [5, 1], [5, 2], [6, 2]],
+        [[7, 3], [8, 3], [8, 1], [8, 0], [7, 1], [7, 2], [8, 2]],
+        [[9, 3], [10, 3], [10, 1], [10, 0], [9, 1], [9, 2], [10, 2]],
+    ],
+    # Dots after the first three digits
+    "dots": [[5, 0], [7, 0], [9, 0]],
+    "minus": [3, 0],
+    "symbols": {
+        "AUTO": [1, 3],
+        "DC": [1, 2],
+        "AC": [1, 1],
+        "REL": [1, 0],
+        "BEEP": [2, 3],
+        "BATTERY": [2, 2],
+        "LOZ": [2, 1],
+        "BMINUS": [2, 0],
+        "HOLD": [11, 3],
+        "DBM": [11, 2],
+        "MEGA": [11, 1],
+        "KILO": [11, 0],
+        "CREST": [12, 3],
+        "OHM": [12, 2],
+        "HZ": [12, 1],
+        "NANO": [12, 0],
+        "MAX": [13, 3],
+        "FARAD": [13, 2],
+        "MICRO": [13, 1],
+        "MILLI": [13, 0],
+        "MIN": [14, 3],
+        "VOLT": [14, 2],
+        "AMPERE": [14, 1],
+        "SCALE": [14, 0],
+    },
+}
+
+LAYOUTS = {BM257S_LAYOUT["model"]: BM257S_LAYOUT}
+
+
+class ProtocolSpec:
+    """Validated frame layout of a multimeter model
+
+    :param layout: Frame layout, structured like BM257S_LAYOUT
+    :type layout: dict
+    :raise RuntimeError: If the layout is incomplete or inconsistent
+    """
+
+    # pylint: disable=R0902
+
+    SEGMENT_COUNT = 7
+
+    def __init__(self, layout):
+        try:
+            self.model = layout["model"]
+            self.length = layout["length"]
+            self.start = layout["start"]
+            self.index_shift = layout["index_shift"]
+            self.segments = [
+                [tuple(pos) for pos in digit] for digit in layout["segments"]
+            ]
+            self.dots = [tuple(pos) for pos in layout["dots"]]
+            self.minus = tuple(layout["minus"])
+            self.symbols = {
+                name: tuple(pos) for (name, pos) in layout["symbols"].items()
+            }
+        except (KeyError, TypeError) as ex:
+            raise RuntimeError("Incomplete protocol layout", ex) from ex
+
+        self._validate()
+
+    @classmethod
+    def load(cls, path):
+        """Load layout from a JSON file
+
+        :param path: Path of JSON file
+        :type path: str
+
+        :return: Protocol specification
+        :rtype: bm257s.protocol.ProtocolSpec
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    @classmethod
+    def for_model(cls, model):
+        """Get specification of a builtin model
+
+        :param model: Name of the model (see LAYOUTS)
+        :type model: str
+
+        :return: Protocol specification
+        :rtype: bm257s.protocol.ProtocolSpec
+        :raise RuntimeError: If there is no layout for the model
+        """
+        if model not in LAYOUTS:
+            raise RuntimeError(f"No protocol layout known for model {model}")
+
+        return cls(LAYOUTS[model])
+
+    def positions(self):
+        """Get all bit positions used by the layout
+
+        :return: List of (byte, bit) tuples
+        :rtype: list
+        """
+        result = [pos for digit in self.segments for pos in digit]
+        result += self.dots
+        result.append(self.minus)
+        result += self.symbols.values()
+        return result
+
+    def _validate(self):
+        if len(self.dots) != len(self.segments) - 1:
+            raise RuntimeError("Protocol layout needs a dot between each two digits")
+
+        for digit in self.segments:
+            if len(digit) != self.SEGMENT_COUNT:
+                raise RuntimeError(
+                    f"Protocol layout needs {self.SEGMENT_COUNT} segments per digit"
+                )
+
+        positions = self.positions()
+        for byte, bit in positions:
+            if not (0 <= byte < self.length and 0 <= bit < self.index_shift):
+                raise RuntimeError(f"Invalid position [{byte}, {bit}] in layout")
+
+        if len(set(positions)) != len(positions):
+            raise RuntimeError("Protocol layout uses a position more than once")
+
+        for name in self.symbols:
+            if name not in Symbol.__members__:
+                raise RuntimeError(f"Unknown symbol {name} in layout")
+
+
+def _bit_table(bits, values):
+    """Create lookup table from masked byte values to combinations of values
+
+    :param bits: Bit number of each value
+    :type bits: list
+    :param values: Values to combine
+    :type values: list
+
+    :return: Mask of all bits and table indexed by masked byte value
+    :rtype: tuple
+    """
+    mask = sum(1 << bit for bit in bits)
+    table = tuple(
+        tuple(value for (bit, value) in zip(bits, values) if key & (1 << bit))
+        for key in range(mask + 1)
+    )
+    return (mask, table)
+
+
+def _segment_table(digit):
+    """Create lookup table from masked digit bytes to segment occupancies
+
+    :param digit: (byte, bit) positions of segments A to G
+    :type digit: list
+
+    :return: Bytes used, mask for each byte and table indexed by combined key
+    :rtype: tuple
+    """
+    digit_bytes = sorted({byte for (byte, _) in digit})
+    shifts = {
+        byte: 8 * (len(digit_bytes) - 1 - i) for (i, byte) in enumerate(digit_bytes)
+    }
+    masks = [0] * len(digit_bytes)
+    for byte, bit in digit:
+        masks[digit_bytes.index(byte)] |= 1 << bit
+
+    seg_keys = [(1 << bit) << shifts[byte] for (byte, bit) in digit]
+    table = [None] * (sum(m << shifts[b] for (b, m) in zip(digit_bytes, masks)) + 1)
+    for combination in range(1 << len(digit)):
+        key = 0
+        occupancy = []
+        for i, seg_key in enumerate(seg_keys):
+            occupied = bool(combination & (1 << i))
+            occupancy.append(occupied)
+            if occupied:
+                key |= seg_key
+        table[key] = tuple(occupancy)
+
+    return (digit_bytes, masks, shifts, tuple(table))
+
+
+def compile_decoder(spec, package_type, symbol_type):
+    """Compile a protocol specification into a specialized decoder function
+
+    The decoder is generated as python source with all positions and masks baked in,
+    using lookup tables for segments and symbols, so decoding does not interpret the
+    layout for each frame.
+
+    :param spec: Protocol specification
+    :type spec: bm257s.protocol.ProtocolSpec
+    :param package_type: Class the decoder instantiates with segments, dots, minus
+        and symbols
+    :type package_type: type
+    :param symbol_type: Enumeration containing all symbols named in the layout
+    :type symbol_type: enum.EnumMeta
+
+    :return: Function decoding a single aligned frame into a package
+    :rtype: callable
+    """
+    # pylint: disable=R0914
+    namespace = {
+        "Package": package_type,
+        "INDEX_TABLE": bytes((v >> spec.index_shift) for v in range(256)),
+        "INDEX_EXPECTED": bytes(range(spec.length)),
+        "raise_index_error": _raise_index_error,
+    }
+
+    used = set()
+
+    segment_exprs = []
+    for i, digit in enumerate(spec.segments):
+        digit_bytes, masks, shifts, table = _segment_table(digit)
+        namespace[f"SEG{i}"] = table
+        used.update(digit_bytes)
+        key = " | ".join(
+            f"((b{byte} & {mask}) << {shifts[byte]})"
+            if shifts[byte] > 0
+            else f"(b{byte} & {mask})"
+            for (byte, mask) in zip(digit_bytes, masks)
+        )
+        segment_exprs.append(f"SEG{i}[{key}]")
+
+    dot_exprs = []
+    for byte, bit in spec.dots + [spec.minus]:
+        used.add(byte)
+        dot_exprs.append(f"(b{byte} & {1 << bit}) != 0")
+
+    symbols_by_byte = {}
+    for name, (byte, bit) in spec.symbols.items():
+        symbols_by_byte.setdefault(byte, []).append((bit, symbol_type[name]))
+    symbol_exprs = []
+    for byte, entries in sorted(symbols_by_byte.items()):
+        mask, table = _bit_table([e[0] for e in entries], [e[1] for e in entries])
+        namespace[f"SYM{byte}"] = table
+        used.add(byte)
+        symbol_exprs.append(f"*SYM{byte}[b{byte} & {mask}]")
+
+    unpacked = ", ".join(f"b{i}" if i in used else "_" for i in range(spec.length))
+    symbols_expr = "{" + ", ".join(symbol_exprs) + "}" if symbol_exprs else "set()"
+    source = "\n".join(
+        [
+            "def decode(data):",
+            "    if data.translate(INDEX_TABLE) != INDEX_EXPECTED:",
+            "        raise_index_error(data, INDEX_TABLE)",
+            f"    {unpacked}, = data",
+            "    return Package(",
+            f"        [{', '.join(segment_exprs)}],",
+            f"        [{', '.join(dot_exprs[:-1])}],",
+            f"        {dot_exprs[-1]},",
+            f"        {symbols_expr},",
+            "    )",
+        ]
+    )
+
+    # pylint: disable=W0122
+    exec(compile(source, f"<decoder {spec.model}>", "exec"), namespace)
+    decode = namespace["decode"]
+    decode.source = source
+    return decode
+
+
+def _raise_index_error(data, index_table):
+    """Raise error describing the first byte with invalid index
+
+    :param data: Raw frame
+    :type data: bytes
+    :param index_table: Table mapping raw bytes to their index field
+    :type index_table: bytes
+    :raise RuntimeError: Always
+    """
+    for i, d_i in enumerate(data):
+        index_field = index_table[d_i]
+        if index_field != i:
+            raise RuntimeError(
+                f"Raw data package contains invalid byte index at byte {i}",
+                index_field,
+            )
+
+    raise RuntimeError(f"Raw data package has invalid length {len(data)}")
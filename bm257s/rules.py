@@ -0,0 +1,352 @@
+"""Threshold and mode alert rules evaluated for every received package"""
+from .package_parser import parse_package
+from .subscription import EventType, Publisher
+
+
+class Sample:
+    """Per-package view shared by all rules during one evaluation
+
+    :param pkg: Package to evaluate rules for
+    :type pkg: bm257s.package_reader.Package
+    """
+
+    # pylint: disable=R0903
+
+    __slots__ = ("package", "quantity", "measurement", "value", "current", "overload")
+
+    def __init__(self, pkg):
+        self.package = pkg
+        self.overload = pkg.is_overload()
+
+        try:
+            self.quantity, self.measurement = parse_package(pkg)
+        except RuntimeError:
+            self.quantity, self.measurement = None, None
+
+        if self.measurement is None:
+            self.value = None
+            self.current = None
+        else:
+            self.value = self.measurement.si_value()
+            self.current = getattr(self.measurement, "current", None)
+
+
+class Alert:
+    """State change of a single rule, or a new reason of an active violation
+
+    :param rule: Rule that changed state
+    :type rule: bm257s.rules.Rule
+    :param active: Whether the rule is now violated
+    :type active: bool
+    :param reason: Description of the violation or None if it got cleared
+    :type reason: str
+    :param sample: Sample causing the change
+    :type sample: bm257s.rules.Sample
+    """
+
+    # pylint: disable=R0903
+
+    def __init__(self, rule, active, reason, sample):
+        self.rule = rule
+        self.active = active
+        self.reason = reason
+        self.sample = sample
+
+    def __str__(self):
+        state = self.reason if self.active else "cleared"
+        return f"{self.rule.name}: {state}"
+
+
+class Rule:
+    """Declaration of the expected state of a multimeter
+
+    A rule is violated as soon as any of its conditions does not hold. Limits are given
+    in SI base units and need to get re-entered by the hysteresis before a violation
+    clears. Violations only get activated or cleared after holding for debounce
+    consecutive samples.
+
+    :param name: Name used to identify the rule in alerts
+    :type name: str
+    :param quantity: Expected measured quantity (e.g. Measurement.VOLTAGE)
+    :type quantity: str
+    :param low: Lowest allowed value, None if unbounded
+    :type low: float
+    :param high: Highest allowed value, None if unbounded
+    :type high: float
+    :param hysteresis: Distance to the limits needed to clear a limit violation
+    :type hysteresis: float
+    :param debounce: Number of consecutive samples needed to change state
+    :type debounce: int
+    :param current: Expected type of current (e.g. VoltageMeasurement.CURRENT_DC)
+    :type current: int
+    :param required_symbols: Symbols that have to be shown
+    :type required_symbols: set
+    :param forbidden_symbols: Symbols that must not be shown (e.g. Symbol.BATTERY)
+    :type forbidden_symbols: set
+    :param allow_overload: Whether out of range measurements ("0.L") are allowed
+    :type allow_overload: bool
+    """
+
+    # pylint: disable=R0902,R0903,R0913
+
+    def __init__(
+        self,
+        name,
+        *,
+        quantity=None,
+        low=None,
+        high=None,
+        hysteresis=0.0,
+        debounce=1,
+        current=None,
+        required_symbols=(),
+        forbidden_symbols=(),
+        allow_overload=False,
+    ):
+        if debounce < 1:
+            raise RuntimeError(f"Rule {name} needs a debounce count of at least 1")
+        if low is not None and high is not None and low > high:
+            raise RuntimeError(f"Rule {name} has lower limit above upper limit")
+
+        self.name = name
+        self.quantity = quantity
+        self.low = low
+        self.high = high
+        self.hysteresis = hysteresis
+        self.debounce = debounce
+        self.current = current
+        self.required_symbols = frozenset(required_symbols)
+        self.forbidden_symbols = frozenset(forbidden_symbols)
+        self.allow_overload = allow_overload
+
+
+def compile_checks(rule):
+    """Compile the conditions of a rule into check functions
+
+    Each check gets called with the sample and returns a description of the violation
+    or None. Checks needing state (like the hysteresis of limits) keep it themselves.
+
+    :param rule: Rule to compile
+    :type rule: bm257s.rules.Rule
+
+    :return: Check functions for all configured conditions
+    :rtype: list
+    """
+    # pylint: disable=R0914
+    checks = []
+
+    if not rule.allow_overload:
+
+        def check_overload(sample):
+            return "overload" if sample.overload else None
+
+        checks.append(check_overload)
+
+    quantity = rule.quantity
+    if quantity is not None:
+        quantity_reason = f"quantity is not {quantity}"
+
+        def check_quantity(sample):
+            return None if sample.quantity == quantity else quantity_reason
+
+        checks.append(check_quantity)
+
+    current = rule.current
+    if current is not None:
+        current_reason = f"current type is not {current}"
+
+        def check_current(sample):
+            return None if sample.current == current else current_reason
+
+        checks.append(check_current)
+
+    required = rule.required_symbols
+    if required:
+        required_reason = f"symbols {set(required)} not shown"
+
+        def check_required(sample):
+            return None if required <= sample.package.symbols else required_reason
+
+        checks.append(check_required)
+
+    forbidden = rule.forbidden_symbols
+    if forbidden:
+        forbidden_reason = f"one of symbols {set(forbidden)} shown"
+
+        def check_forbidden(sample):
+            return forbidden_reason if forbidden & sample.package.symbols else None
+
+        checks.append(check_forbidden)
+
+    inf = float("inf")
+    low = -inf if rule.low is None else rule.low
+    high = inf if rule.high is None else rule.high
+    if low != -inf or high != inf:
+        clear_low = low + rule.hysteresis
+        clear_high = high - rule.hysteresis
+        limit_reason = f"value outside [{rule.low}, {rule.high}]"
+        # Hysteresis only applies while the limits themselves are violated, not while
+        # the rule is violated by other conditions
+        violated = False
+
+        def check_limits(sample):
+            nonlocal violated
+            value = sample.value
+            if value is None:
+                return None
+            if violated:
+                violated = not clear_low <= value <= clear_high
+            else:
+                violated = not low <= value <= high
+            return limit_reason if violated else None
+
+        checks.append(check_limits)
+
+    return checks
+
+
+def compile_rule(rule):
+    """Compile a rule into a stateful evaluation function
+
+    The returned function gets called with each sample and returns an alert if the
+    state of the rule changed or a different condition of an active rule failed, None
+    otherwise.
+
+    :param rule: Rule to compile
+    :type rule: bm257s.rules.Rule
+
+    :return: Evaluation function
+    :rtype: callable
+    """
+    checks = tuple(compile_checks(rule))
+    debounce = rule.debounce
+
+    active = False
+    count = 0
+    reason = None
+
+    def evaluate(sample):
+        nonlocal active, count, reason
+
+        new_reason = None
+        for check in checks:
+            new_reason = check(sample)
+            if new_reason is not None:
+                break
+
+        if (new_reason is not None) is active:
+            count = 0
+            if not active or new_reason == reason:
+                return None
+
+            # Still violated, but by a different condition
+            reason = new_reason
+            return Alert(rule, active, reason, sample)
+
+        count += 1
+        if count < debounce:
+            return None
+
+        count = 0
+        active = not active
+        reason = new_reason
+        return Alert(rule, active, reason, sample)
+
+    return evaluate
+
+
+class RuleEngine:
+    """Evaluates alert rules for each package of a multimeter
+
+    Rules get compiled into plain functions when added, so evaluation only runs the
+    conditions each rule actually uses. Alerts are published as EventType.ALERT events
+    to subscriptions of the engine.
+
+    :param rules: Initial rules
+    :type rules: list
+    """
+
+    def __init__(self, rules=()):
+        self._rules = []
+        self._evaluators = ()
+        self._publisher = Publisher()
+
+        for rule in rules:
+            self.add_rule(rule)
+
+    def add_rule(self, rule):
+        """Add a rule, starting in non-violated state
+
+        :param rule: Rule to add
+        :type rule: bm257s.rules.Rule
+        """
+        self._rules.append(rule)
+        self._evaluators = self._evaluators + (compile_rule(rule),)
+
+    def rules(self):
+        """Get all rules of this engine
+
+        :return: List of rules
+        :rtype: list
+        """
+        return list(self._rules)
+
+    def process(self, pkg):
+        """Evaluate all rules for a package and publish alerts
+
+        :param pkg: Received package
+        :type pkg: bm257s.package_reader.Package
+
+        :return: Alerts caused by this package
+        :rtype: list
+        """
+        sample = Sample(pkg)
+
+        alerts = []
+        for evaluate in self._evaluators:
+            alert = evaluate(sample)
+            if alert is not None:
+                alerts.append(alert)
+                self._publisher.publish(EventType.ALERT, alert)
+
+        return alerts
+
+    def attach(self, reader):
+        """Evaluate rules for every package of a reader on its reading thread
+
+        :param reader: Reader or serial interface to attach to
+        :type reader: bm257s.package_reader.PackageReader
+        """
+        reader.add_package_handler(self.process)
+
+    def detach(self, reader):
+        """Stop evaluating rules for packages of a reader
+
+        :param reader: Reader or serial interface to detach from
+        :type reader: bm257s.package_reader.PackageReader
+        """
+        reader.remove_package_handler(self.process)
+
+    def subscribe(self, callback, **kwargs):
+        """Subscribe to alerts of this engine
+
+        :param callback: Function called with each alert event
+        :type callback: callable
+        :param kwargs: Further arguments of bm257s.subscription.Subscription
+
+        :return: The new subscription
+        :rtype: bm257s.subscription.Subscription
+        """
+        return self._publisher.subscribe(callback, **kwargs)
+
+    def unsubscribe(self, subscription):
+        """Remove a subscription created by subscribe()
+
+        :param subscription: Subscription to remove
+        :type subscription: bm257s.subscription.Subscription
+        """
+        self._publisher.unsubscribe(subscription)
+
+    def close(self):
+        """Cancel all subscriptions"""
+        self._publisher.close()
@@ -0,0 +1,399 @@
+"""Synthetic multimeter producing raw packages for testing without hardware"""
+import math
+import os
+import random
+import threading
+import time
+import tty
+
+from .measurement import (
+    Measurement,
+    ResistanceMeasurement,
+    TemperatureMeasurement,
+    VoltageMeasurement,
+)
+from .package_encoder import encode_measurement
+from .package_reader import DEFAULT_SPEC
+
+
+def constant(value):
+    """Create waveform with constant value
+
+    :param value: Value of waveform
+    :type value: float
+
+    :return: Function mapping time to value
+    :rtype: callable
+    """
+    return lambda _: value
+
+
+def sine(amplitude, frequency, offset=0.0):
+    """Create sine waveform
+
+    :param amplitude: Amplitude of waveform
+    :type amplitude: float
+    :param frequency: Frequency in Hz
+    :type frequency: float
+    :param offset: Value added to waveform
+    :type offset: float
+
+    :return: Function mapping time to value
+    :rtype: callable
+    """
+    omega = 2.0 * math.pi * frequency
+    return lambda t: offset + amplitude * math.sin(omega * t)
+
+
+def square(low, high, frequency):
+    """Create square waveform starting with its high value
+
+    :param low: Value of low phase
+    :type low: float
+    :param high: Value of high phase
+    :type high: float
+    :param frequency: Frequency in Hz
+    :type frequency: float
+
+    :return: Function mapping time to value
+    :rtype: callable
+    """
+    return lambda t: high if (t * frequency) % 1.0 < 0.5 else low
+
+
+def ramp(start, slope):
+    """Create linear ramp waveform
+
+    :param start: Value at time zero
+    :type start: float
+    :param slope: Change of value per second
+    :type slope: float
+
+    :return: Function mapping time to value
+    :rtype: callable
+    """
+    return lambda t: start + slope * t
+
+
+class Mode:
+    """Measuring mode of the simulated multimeter
+
+    :param waveform: Function mapping time since start of simulation to the value
+    :type waveform: callable
+    :param measurement: Function creating a measurement from a value
+    :type measurement: callable
+    :param duration: Time in seconds until switching to the next mode
+    :type duration: float
+    """
+
+    # pylint: disable=R0903
+
+    def __init__(self, waveform, measurement, duration=math.inf):
+        self.waveform = waveform
+        self.measurement = measurement
+        self.duration = duration
+
+    @classmethod
+    def dc_voltage(cls, waveform, duration=math.inf):
+        """Create DC voltage mode
+
+        :param waveform: Voltage waveform in volts
+        :type waveform: callable
+        :param duration: Time in seconds until switching to the next mode
+        :type duration: float
+
+        :return: Measuring mode
+        :rtype: bm257s.simulator.Mode
+        """
+        return cls(
+            waveform,
+            lambda v: VoltageMeasurement(v, VoltageMeasurement.CURRENT_DC),
+            duration,
+        )
+
+    @classmethod
+    def ac_voltage(cls, waveform, duration=math.inf):
+        """Create AC voltage mode
+
+        :param waveform: Voltage waveform in volts
+        :type waveform: callable
+        :param duration: Time in seconds until switching to the next mode
+        :type duration: float
+
+        :return: Measuring mode
+        :rtype: bm257s.simulator.Mode
+        """
+        return cls(
+            waveform,
+            lambda v: VoltageMeasurement(v, VoltageMeasurement.CURRENT_AC),
+            duration,
+        )
+
+    @classmethod
+    def resistance(cls, waveform, duration=math.inf):
+        """Create resistance mode, shown in kiloohms
+
+        :param waveform: Resistance waveform in kiloohms
+        :type waveform: callable
+        :param duration: Time in seconds until switching to the next mode
+        :type duration: float
+
+        :return: Measuring mode
+        :rtype: bm257s.simulator.Mode
+        """
+        return cls(
+            waveform,
+            lambda v: ResistanceMeasurement(v, Measurement.PREFIX_KILO),
+            duration,
+        )
+
+    @classmethod
+    def temperature(cls, waveform, duration=math.inf):
+        """Create temperature mode
+
+        :param waveform: Temperature waveform in degrees celsius
+        :type waveform: callable
+        :param duration: Time in seconds until switching to the next mode
+        :type duration: float
+
+        :return: Measuring mode
+        :rtype: bm257s.simulator.Mode
+        """
+        return cls(
+            waveform,
+            lambda v: TemperatureMeasurement(TemperatureMeasurement.UNIT_CELSIUS, v),
+            duration,
+        )
+
+
+class MeterSimulator:
+    """Simulated multimeter producing raw packages
+
+    Packages are generated on a simulated clock advancing by one package period per
+    package. In realtime mode reads wait for the simulated clock, otherwise packages
+    are produced as fast as they are read.
+
+    :param modes: Measuring modes, cycled through by their durations
+    :type modes: list
+    :param rate: Packages per second
+    :type rate: float
+    :param realtime: Whether to produce packages at the given rate in real time
+    :type realtime: bool
+    :param noise: Standard deviation of gaussian noise added to waveform values
+    :type noise: float
+    :param corruption: Probability of corrupting each package
+    :type corruption: float
+    :param seed: Seed of random number generator for noise and corruption
+    :type seed: int
+    :param timeout: Maximum time a read blocks in realtime mode
+    :type timeout: float
+    :param spec: Protocol specification of simulated multimeter model
+    :type spec: bm257s.protocol.ProtocolSpec
+    """
+
+    # pylint: disable=R0902,R0913
+
+    # Approximate package rate of a real multimeter
+    PACKAGE_RATE = 5.0
+
+    def __init__(
+        self,
+        modes=None,
+        *,
+        rate=PACKAGE_RATE,
+        realtime=False,
+        noise=0.0,
+        corruption=0.0,
+        seed=None,
+        timeout=1.0,
+        spec=DEFAULT_SPEC,
+    ):
+        self._modes = modes or [Mode.dc_voltage(constant(0.0))]
+        self._period = 1.0 / rate
+        self._realtime = realtime
+        self._noise = noise
+        self._corruption = corruption
+        self._random = random.Random(seed)
+        self._timeout = timeout
+        self._spec = spec
+
+        self._count = 0
+        self._mode_index = 0
+        self._mode_start = 0.0
+        self._started = None
+
+        self._buffer = b""
+        self._cancelled = threading.Event()
+
+        self._pty_thread = None
+        self._pty_master = None
+        self._pty_stop = threading.Event()
+
+    def sim_time(self):
+        """Get simulated time of the next package
+
+        :return: Seconds since start of simulation
+        :rtype: float
+        """
+        return self._count * self._period
+
+    def _mode(self, now):
+        mode = self._modes[self._mode_index]
+        while now - self._mode_start >= mode.duration:
+            self._mode_start += mode.duration
+            self._mode_index = (self._mode_index + 1) % len(self._modes)
+            mode = self._modes[self._mode_index]
+
+        return mode
+
+    def next_measurement(self):
+        """Simulate the next measurement and advance the simulated clock
+
+        Values the display cannot show are returned as overload (value None).
+
+        :return: Measurement shown by the simulated multimeter
+        :rtype: bm257s.measurement.Measurement
+        """
+        now = self.sim_time()
+        mode = self._mode(now)
+        self._count += 1
+
+        value = mode.waveform(now)
+        if self._noise > 0.0 and value is not None:
+            value += self._random.gauss(0.0, self._noise)
+        if value is not None and not math.isfinite(value):
+            value = None
+
+        measurement = mode.measurement(value)
+        if isinstance(measurement, TemperatureMeasurement) and value is not None:
+            # Temperatures are shown as whole degrees with 3 digits, else as "---"
+            if not -100.0 < value < 1000.0:
+                measurement = mode.measurement(None)
+
+        return measurement
+
+    def next_package(self):
+        """Simulate the next raw package and advance the simulated clock
+
+        :return: Raw package, corrupted with the configured probability
+        :rtype: bytes
+        """
+        data = encode_measurement(self.next_measurement(), self._spec)
+        if self._corruption > 0.0 and self._random.random() < self._corruption:
+            data = self._corrupt(data)
+
+        return data
+
+    def _corrupt(self, data):
+        kind = self._random.randrange(3)
+        pos = self._random.randrange(len(data))
+
+        if kind == 0:
+            # Flip a single bit
+            flipped = data[pos] ^ (1 << self._random.randrange(8))
+            return data[:pos] + bytes([flipped]) + data[pos + 1 :]  # noqa: E203
+        if kind == 1:
+            # Lose a byte
+            return data[:pos] + data[pos + 1 :]  # noqa: E203
+
+        # Truncate package
+        return data[:pos]
+
+    def packages(self, count):
+        """Generate raw packages as fast as possible
+
+        :param count: Number of packages
+        :type count: int
+
+        :return: Concatenated raw packages
+        :rtype: bytes
+        """
+        return b"".join(self.next_package() for _ in range(count))
+
+    def read(self, size):
+        """Read simulated raw data, like from a serial port
+
+        :param size: Maximum number of bytes to read
+        :type size: int
+
+        :return: Raw data, empty if no package was due before the timeout
+        :rtype: bytes
+        """
+        if len(self._buffer) == 0:
+            if self._realtime and not self._wait_for_package():
+                return b""
+            self._buffer = self.next_package()
+
+        result = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return result
+
+    def cancel_read(self):
+        """Interrupt a read waiting for the next package"""
+        self._cancelled.set()
+
+    def _wait_for_package(self):
+        if self._started is None:
+            self._started = time.monotonic()
+
+        delay = self._started + self.sim_time() - time.monotonic()
+        if delay > self._timeout:
+            self._cancelled.wait(self._timeout)
+            self._cancelled.clear()
+            return False
+
+        if delay > 0.0 and self._cancelled.wait(delay):
+            self._cancelled.clear()
+            return False
+
+        return True
+
+    def open_pty(self):
+        """Start writing packages in real time to a pseudo terminal
+
+        :return: Device path of the pseudo terminal to read from
+        :rtype: str
+        """
+        if self._pty_thread is not None:
+            raise RuntimeError("Simulator already writes to a pseudo terminal")
+
+        master, slave = os.openpty()
+        path = os.ttyname(slave)
+        tty.setraw(slave)
+        os.close(slave)
+
+        # Like a serial line, drop data nobody reads instead of blocking
+        os.set_blocking(master, False)
+
+        self._pty_master = master
+        self._pty_stop.clear()
+        self._pty_thread = threading.Thread(target=self._run_pty, daemon=True)
+        self._pty_thread.start()
+
+        return path
+
+    def close_pty(self):
+        """Stop writing to the pseudo terminal and close it"""
+        if self._pty_thread is None:
+            return
+
+        self._pty_stop.set()
+        self._pty_thread.join()
+        self._pty_thread = None
+
+        os.close(self._pty_master)
+        self._pty_master = None
+
+    def _run_pty(self):
+        started = time.monotonic()
+        while not self._pty_stop.is_set():
+            delay = started + self.sim_time() - time.monotonic()
+            if delay > 0.0 and self._pty_stop.wait(delay):
+                return
+
+            try:
+                os.write(self._pty_master, self.next_package())
+            except BlockingIOError:
+                pass
+            except OSError:
+                return
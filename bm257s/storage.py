@@ -0,0 +1,367 @@
+"""Storage of measurement time series in a SQLite database"""
+
+import array
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+from .subscription import EventType
+
+_LOGGER = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS series (
+    id INTEGER PRIMARY KEY,
+    meter TEXT NOT NULL,
+    quantity TEXT NOT NULL,
+    UNIQUE (meter, quantity)
+);
+CREATE TABLE IF NOT EXISTS samples (
+    series INTEGER NOT NULL REFERENCES series (id),
+    timestamp REAL NOT NULL,
+    value REAL
+);
+CREATE INDEX IF NOT EXISTS samples_time ON samples (series, timestamp);
+"""
+
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollup_{name} (
+    series INTEGER NOT NULL REFERENCES series (id),
+    bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    sum REAL NOT NULL,
+    min REAL NOT NULL,
+    max REAL NOT NULL,
+    PRIMARY KEY (series, bucket)
+) WITHOUT ROWID;
+"""
+
+ROLLUP_UPSERT = """
+INSERT INTO rollup_{name} (series, bucket, count, sum, min, max)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (series, bucket) DO UPDATE SET
+    count = count + excluded.count,
+    sum = sum + excluded.sum,
+    min = min(min, excluded.min),
+    max = max(max, excluded.max)
+"""
+
+
+class _Flush:
+    """Queue marker used to wait until all previously added samples are written"""
+
+    # pylint: disable=R0903
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class SQLiteStore:
+    """Time series store for measurements of multiple multimeters
+
+    Samples are written by a background thread in batched transactions. Besides the
+    raw samples, count, sum, minimum and maximum are kept per series in rollup tables
+    for each of the ROLLUPS resolutions, so long time ranges can be queried quickly.
+    A batch that cannot be written gets logged and dropped, the store keeps running.
+
+    :param path: Path of database file
+    :type path: str
+    :param batch_size: Maximum number of samples written in a single transaction
+    :type batch_size: int
+    :param flush_interval: Maximum time in seconds samples wait before getting written
+    :type flush_interval: float
+    """
+
+    # pylint: disable=R0902
+
+    # Rollup resolutions by name, in seconds
+    ROLLUPS = {"1s": 1, "1m": 60, "1h": 3600}
+
+    def __init__(self, path, batch_size=1000, flush_interval=0.5):
+        self._path = path
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+
+        self._series_ids = {}
+        self._queue = queue.SimpleQueue()
+        # Keeps samples and flush markers from being queued after the stop marker
+        self._queue_lock = threading.Lock()
+        self._closed = False
+
+        connection = self._connect()
+        with connection:
+            connection.executescript(SCHEMA)
+            for name in self.ROLLUPS:
+                connection.executescript(ROLLUP_SCHEMA.format(name=name))
+        connection.close()
+
+        self._query_connection = self._connect()
+        self._query_lock = threading.Lock()
+
+        self._write_thread = threading.Thread(target=self._run, daemon=True)
+        self._write_thread.start()
+
+    def _connect(self):
+        connection = sqlite3.connect(self._path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def add(self, meter, quantity, timestamp, value):
+        """Queue a single sample for writing without blocking
+
+        :param meter: Name of the multimeter
+        :type meter: str
+        :param quantity: Measured quantity (e.g. Measurement.VOLTAGE)
+        :type quantity: str
+        :param timestamp: Time of measurement as unix timestamp
+        :type timestamp: float
+        :param value: Measured value in SI base unit or None if there is no value
+        :type value: float
+        :raise RuntimeError: If the store is closed
+        """
+        self._put((meter, quantity, timestamp, value))
+
+    def _put(self, item):
+        with self._queue_lock:
+            if self._closed:
+                raise RuntimeError("Store is closed")
+            self._queue.put(item)
+
+    def attach(self, source, meter, **kwargs):
+        """Store all measurements of a multimeter
+
+        :param source: Serial interface or other source of measurement events
+        :type source: bm257s.BM257sSerialInterface
+        :param meter: Name the measurements get stored under
+        :type meter: str
+        :param kwargs: Further arguments of the subscription
+
+        :return: Subscription used, unsubscribe it from the source to stop storing
+        :rtype: bm257s.subscription.Subscription
+        """
+
+        def store(event):
+            quantity, measurement = event.payload
+            self.add(meter, quantity, event.timestamp, measurement.si_value())
+
+        kwargs.setdefault("max_queue", 1024)
+        return source.subscribe(store, events={EventType.MEASUREMENT}, **kwargs)
+
+    def flush(self, timeout=None):
+        """Wait until all previously added samples are written
+
+        :param timeout: Maximum time to wait in seconds, None to wait forever
+        :type timeout: float
+
+        :return: Whether all samples got written in time
+        :rtype: bool
+        :raise RuntimeError: If the store is closed
+        """
+        marker = _Flush()
+        self._put(marker)
+        return marker.done.wait(timeout)
+
+    def close(self):
+        """Write all remaining samples and close the database"""
+        with self._queue_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+
+        self._write_thread.join()
+        self._write_thread = None
+
+        with self._query_lock:
+            self._query_connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+    def series(self):
+        """Get all stored time series
+
+        :return: List of (meter, quantity) tuples
+        :rtype: list
+        """
+        with self._query_lock:
+            return self._query_connection.execute(
+                "SELECT meter, quantity FROM series ORDER BY meter, quantity"
+            ).fetchall()
+
+    def query(self, meter, quantity, start, end, *, resolution=None):
+        """Query a time range of a series as columnar arrays
+
+        Raw queries return "timestamp" and "value" columns, with missing values as NaN.
+        Rollup queries return "timestamp" (start of bucket), "count", "mean", "min" and
+        "max" columns.
+
+        :param meter: Name of the multimeter
+        :type meter: str
+        :param quantity: Measured quantity
+        :type quantity: str
+        :param start: First timestamp to include
+        :type start: float
+        :param end: Timestamp to stop before
+        :type end: float
+        :param resolution: Name of rollup resolution (see ROLLUPS) or None for raw data
+        :type resolution: str
+
+        :return: Dictionary of column names and array.array columns
+        :rtype: dict
+        :raise RuntimeError: If resolution is unknown
+        """
+        # pylint: disable=R0913
+        if resolution is None:
+            return self._query_raw(meter, quantity, start, end)
+        if resolution not in self.ROLLUPS:
+            raise RuntimeError(f"Unknown rollup resolution {resolution}")
+
+        return self._query_rollup(meter, quantity, start, end, resolution=resolution)
+
+    def _query_raw(self, meter, quantity, start, end):
+        with self._query_lock:
+            rows = self._query_connection.execute(
+                "SELECT timestamp, value FROM samples WHERE series = "
+                "(SELECT id FROM series WHERE meter = ? AND quantity = ?) "
+                "AND timestamp >= ? AND timestamp < ? ORDER BY timestamp",
+                (meter, quantity, start, end),
+            ).fetchall()
+
+        nan = float("nan")
+        return {
+            "timestamp": array.array("d", [row[0] for row in rows]),
+            "value": array.array(
+                "d", [nan if row[1] is None else row[1] for row in rows]
+            ),
+        }
+
+    def _query_rollup(self, meter, quantity, start, end, *, resolution):
+        # pylint: disable=R0913
+        period = self.ROLLUPS[resolution]
+        with self._query_lock:
+            rows = self._query_connection.execute(
+                f"SELECT bucket, count, sum, min, max FROM rollup_{resolution} "
+                "WHERE series = "
+                "(SELECT id FROM series WHERE meter = ? AND quantity = ?) "
+                "AND bucket >= ? AND bucket < ? ORDER BY bucket",
+                (meter, quantity, int(start // period), -int(-end // period)),
+            ).fetchall()
+
+        return {
+            "timestamp": array.array("d", [row[0] * period for row in rows]),
+            "count": array.array("q", [row[1] for row in rows]),
+            "mean": array.array("d", [row[2] / row[1] for row in rows]),
+            "min": array.array("d", [row[3] for row in rows]),
+            "max": array.array("d", [row[4] for row in rows]),
+        }
+
+    def _run(self):
+        connection = self._connect()
+
+        running = True
+        while running:
+            batch = []
+            markers = []
+
+            # Block for first sample, then collect until batch is full or time is up
+            item = self._queue.get()
+            deadline = time.monotonic() + self._flush_interval
+            while True:
+                if item is None:
+                    running = False
+                    break
+                if isinstance(item, _Flush):
+                    markers.append(item)
+                    break
+
+                batch.append(item)
+                if len(batch) >= self._batch_size:
+                    break
+
+                timeout = deadline - time.monotonic()
+                if timeout <= 0.0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+
+            try:
+                if len(batch) > 0:
+                    self._write(connection, batch)
+            except (sqlite3.Error, TypeError, ValueError):
+                _LOGGER.exception("Could not write batch of %d samples", len(batch))
+                # Series inserted by the failed transaction got rolled back
+                self._series_ids.clear()
+            finally:
+                for marker in markers:
+                    marker.done.set()
+
+        connection.close()
+
+    def _series_id(self, connection, meter, quantity):
+        key = (meter, quantity)
+        series_id = self._series_ids.get(key)
+        if series_id is None:
+            connection.execute(
+                "INSERT OR IGNORE INTO series (meter, quantity) VALUES (?, ?)", key
+            )
+            series_id = connection.execute(
+                "SELECT id FROM series WHERE meter = ? AND quantity = ?", key
+            ).fetchone()[0]
+            self._series_ids[key] = series_id
+
+        return series_id
+
+    def _write(self, connection, batch):
+        with connection:
+            rows = [
+                (self._series_id(connection, meter, quantity), timestamp, value)
+                for (meter, quantity, timestamp, value) in batch
+            ]
+            connection.executemany(
+                "INSERT INTO samples (series, timestamp, value) VALUES (?, ?, ?)", rows
+            )
+
+            for name, period in self.ROLLUPS.items():
+                connection.executemany(
+                    ROLLUP_UPSERT.format(name=name), rollup(rows, period)
+                )
+
+
+def rollup(rows, period):
+    """Aggregate samples into buckets of a fixed period
+
+    :param rows: List of (series, timestamp, value) tuples
+    :type rows: list
+    :param period: Length of buckets in seconds
+    :type period: int
+
+    :return: List of (series, bucket, count, sum, min, max) tuples
+    :rtype: list
+    """
+    buckets = {}
+    for series, timestamp, value in rows:
+        if value is None:
+            continue
+
+        key = (series, int(timestamp // period))
+        bucket = buckets.get(key)
+        if bucket is None:
+            buckets[key] = [1, value, value, value]
+        else:
+            bucket[0] += 1
+            bucket[1] += value
+            if value < bucket[2]:
+                bucket[2] = value
+            if value > bucket[3]:
+                bucket[3] = value
+
+    return [key + tuple(bucket) for (key, bucket) in buckets.items()]
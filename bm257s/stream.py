@@ -0,0 +1,600 @@
+"""Lazy stream operators over measurement events
+
+Streams are chains of generators, so samples are processed one at a time when the
+consumer pulls them and no intermediate lists are built. Items are
+bm257s.subscription.Event objects: operators work on the payload of measurement
+events, while errors travel along the stream as EventType.ERROR events. Adjacent map
+and filter stages are fused into a single generator.
+"""
+import asyncio
+import collections
+import math
+import threading
+
+from .subscription import COALESCIBLE_EVENTS, Event, EventType
+
+# Event types of live streams
+STREAM_EVENTS = frozenset({EventType.MEASUREMENT, EventType.ERROR})
+
+_MAP = 0
+_FILTER = 1
+
+
+def _quantity_filter(quantity):
+    return lambda payload: payload[0] == quantity
+
+
+def _normalize(payload):
+    quantity, measurement = payload
+    return (quantity, measurement.si_value())
+
+
+class _Step:
+    """Per-event logic of an operator, shared by synchronous and asynchronous streams
+
+    Each received event produces at most one event, so streams only need a single
+    generator per operator to drive a step.
+    """
+
+    # Whether the step takes no further events
+    done = False
+
+    def push(self, event):
+        """Process a received event
+
+        :param event: Received event
+        :type event: bm257s.subscription.Event
+
+        :return: Event to pass on or None
+        :rtype: bm257s.subscription.Event
+        """
+        raise NotImplementedError()
+
+    def finish(self):
+        """Process the end of the received events
+
+        :return: Event to pass on or None
+        :rtype: bm257s.subscription.Event
+        """
+        return None
+
+
+class _Fused(_Step):
+    """Sequence of map and filter stages applied in a single step
+
+    :param stages: (kind, function) tuples
+    :type stages: tuple
+    """
+
+    def __init__(self, stages):
+        self._stages = stages
+
+    def push(self, event):
+        if event.event_type is EventType.ERROR:
+            return event
+
+        payload = event.payload
+        try:
+            for kind, function in self._stages:
+                if kind is _MAP:
+                    payload = function(payload)
+                elif not function(payload):
+                    return None
+        except Exception as ex:  # pylint: disable=W0703
+            return Event(EventType.ERROR, ex, event.timestamp)
+
+        return Event(event.event_type, payload, event.timestamp)
+
+
+class _Window(_Step):
+    """Grouping of payloads into tumbling time windows
+
+    :param duration: Length of windows in seconds
+    :type duration: float
+    """
+
+    def __init__(self, duration):
+        self._duration = duration
+        self._current = None
+        self._window = []
+
+    def push(self, event):
+        if event.event_type is EventType.ERROR:
+            return event
+
+        result = None
+        key = math.floor(event.timestamp / self._duration)
+        if key != self._current:
+            result = self.finish()
+            self._current = key
+            self._window = []
+        self._window.append(event.payload)
+        return result
+
+    def finish(self):
+        if not self._window:
+            return None
+        return Event(
+            EventType.MEASUREMENT, self._window, self._current * self._duration
+        )
+
+
+class _Batch(_Step):
+    """Grouping of payloads into lists of fixed size
+
+    :param size: Number of payloads per batch
+    :type size: int
+    """
+
+    def __init__(self, size):
+        self._size = size
+        self._batch = []
+        self._timestamp = None
+
+    def push(self, event):
+        if event.event_type is EventType.ERROR:
+            return event
+
+        if not self._batch:
+            self._timestamp = event.timestamp
+        self._batch.append(event.payload)
+        if len(self._batch) < self._size:
+            return None
+
+        result = self.finish()
+        self._batch = []
+        return result
+
+    def finish(self):
+        if not self._batch:
+            return None
+        return Event(EventType.MEASUREMENT, self._batch, self._timestamp)
+
+
+class _Take(_Step):
+    """End of the stream after a number of events
+
+    :param count: Number of events
+    :type count: int
+    """
+
+    def __init__(self, count):
+        self._remaining = count
+        self.done = count <= 0
+
+    def push(self, event):
+        self._remaining -= 1
+        self.done = self._remaining <= 0
+        return event
+
+
+class _RaiseErrors(_Step):
+    """Raising of errors instead of passing them on"""
+
+    def push(self, event):
+        if event.event_type is EventType.ERROR:
+            raise event.payload
+        return event
+
+
+def _run_step(events, step_type, *args):
+    step = step_type(*args)
+    if step.done:
+        return
+
+    for event in events:
+        result = step.push(event)
+        if result is not None:
+            yield result
+        if step.done:
+            return
+
+    result = step.finish()
+    if result is not None:
+        yield result
+
+
+async def _run_step_async(events, step_type, *args):
+    step = step_type(*args)
+    if step.done:
+        return
+
+    async for event in events:
+        result = step.push(event)
+        if result is not None:
+            yield result
+        if step.done:
+            return
+
+    result = step.finish()
+    if result is not None:
+        yield result
+
+
+class _EventBuffer:
+    """Bounded handoff of events from a subscription to a stream consumer
+
+    Adding events never blocks. If the consumer falls behind, a new measurement
+    replaces the newest buffered one, otherwise the oldest buffered event gets dropped,
+    like in bm257s.subscription.Subscription.
+
+    :param size: Maximum number of buffered events
+    :type size: int
+    """
+
+    def __init__(self, size):
+        self._size = size
+        self._items = collections.deque()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._waiter = None
+
+    def put(self, event):
+        """Add an event without blocking
+
+        :param event: Event to add
+        :type event: bm257s.subscription.Event
+        """
+        with self._condition:
+            if self._closed:
+                return
+
+            if len(self._items) >= self._size:
+                last = self._items[-1]
+                if (
+                    event.event_type is last.event_type
+                    and event.event_type in COALESCIBLE_EVENTS
+                ):
+                    self._items[-1] = event
+                    return
+                self._items.popleft()
+
+            self._items.append(event)
+            self._condition.notify()
+            waiter = self._waiter
+            self._waiter = None
+
+        self._wake(waiter)
+
+    def get(self):
+        """Take the oldest event, waiting for one
+
+        :return: Event or None if the buffer got closed
+        :rtype: bm257s.subscription.Event
+        """
+        with self._condition:
+            while len(self._items) == 0 and not self._closed:
+                self._condition.wait()
+            if len(self._items) == 0:
+                return None
+
+            return self._items.popleft()
+
+    async def get_async(self, loop):
+        """Take the oldest event, waiting for one without blocking the event loop
+
+        :param loop: Running event loop
+        :type loop: asyncio.AbstractEventLoop
+
+        :return: Event or None if the buffer got closed
+        :rtype: bm257s.subscription.Event
+        """
+        while True:
+            with self._condition:
+                if len(self._items) > 0:
+                    return self._items.popleft()
+                if self._closed:
+                    return None
+
+                future = loop.create_future()
+                self._waiter = (loop, future)
+
+            await future
+
+    def close(self):
+        """Stop adding events and wake up a waiting consumer"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+            waiter = self._waiter
+            self._waiter = None
+
+        self._wake(waiter)
+
+    @staticmethod
+    def _wake(waiter):
+        if waiter is None:
+            return
+
+        loop, future = waiter
+        loop.call_soon_threadsafe(
+            lambda: None if future.done() else future.set_result(None)
+        )
+
+
+class _Subscribed:
+    """Subscription of a source feeding an event buffer
+
+    :param source: Serial interface or other source of measurement events
+    :type source: bm257s.BM257sSerialInterface
+    :param max_queue: Maximum number of buffered events
+    :type max_queue: int
+    """
+
+    # pylint: disable=R0903
+
+    def __init__(self, source, max_queue):
+        self._source = source
+        self.buffer = _EventBuffer(max_queue)
+        self._subscription = source.subscribe(
+            self.buffer.put, events=STREAM_EVENTS, max_queue=max_queue
+        )
+
+    def close(self):
+        """Unsubscribe and wake up a waiting consumer"""
+        self._source.unsubscribe(self._subscription)
+        self.buffer.close()
+
+
+def _subscribed_events(source, max_queue):
+    subscribed = _Subscribed(source, max_queue)
+    try:
+        while True:
+            event = subscribed.buffer.get()
+            if event is None:
+                return
+            yield event
+    finally:
+        subscribed.close()
+
+
+async def _subscribed_events_async(source, max_queue, loop):
+    loop = asyncio.get_running_loop() if loop is None else loop
+    subscribed = _Subscribed(source, max_queue)
+    try:
+        while True:
+            event = await subscribed.buffer.get_async(loop)
+            if event is None:
+                return
+            yield event
+    finally:
+        subscribed.close()
+
+
+class _Operators:
+    """Operators shared by synchronous and asynchronous streams
+
+    :param events: Events to process
+    :type events: iterable
+    """
+
+    def __init__(self, events, _stages=()):
+        self._events = events
+        self._stages = _stages
+
+    def _then(self, step_type, *args):
+        raise NotImplementedError()
+
+    def map(self, function):
+        """Apply a function to the payload of each measurement event
+
+        :param function: Function mapping a payload to a new payload
+        :type function: callable
+
+        :return: New stream
+        :rtype: bm257s.stream.Stream
+        """
+        return type(self)(self._events, self._stages + ((_MAP, function),))
+
+    def filter(self, predicate=None, *, quantity=None):
+        """Only keep measurement events matching a predicate and quantity
+
+        :param predicate: Function deciding whether to keep a payload
+        :type predicate: callable
+        :param quantity: Quantity to keep (e.g. Measurement.VOLTAGE)
+        :type quantity: str
+
+        :return: New stream
+        :rtype: bm257s.stream.Stream
+        """
+        stages = self._stages
+        if quantity is not None:
+            stages += ((_FILTER, _quantity_filter(quantity)),)
+        if predicate is not None:
+            stages += ((_FILTER, predicate),)
+        return type(self)(self._events, stages)
+
+    def normalize(self):
+        """Convert measurements to values in SI base units
+
+        :return: New stream of (quantity, value) payloads, value is None if there is
+            no value
+        :rtype: bm257s.stream.Stream
+        """
+        return self.map(_normalize)
+
+    def window(self, duration):
+        """Group measurement events into tumbling time windows
+
+        Windows are aligned to multiples of their duration. Error events are passed on
+        immediately.
+
+        :param duration: Length of windows in seconds
+        :type duration: float
+
+        :return: New stream of events with a list of payloads, timestamped with the
+            start of their window
+        :rtype: bm257s.stream.Stream
+        """
+        return self._then(_Window, duration)
+
+    def batch(self, size):
+        """Group measurement events into lists of fixed size
+
+        The last batch may be smaller. Error events are passed on immediately.
+
+        :param size: Number of payloads per batch
+        :type size: int
+
+        :return: New stream of events with a list of payloads
+        :rtype: bm257s.stream.Stream
+        """
+        return self._then(_Batch, size)
+
+    def take(self, count):
+        """End the stream after a number of events
+
+        :param count: Number of events
+        :type count: int
+
+        :return: New stream
+        :rtype: bm257s.stream.Stream
+        """
+        return self._then(_Take, count)
+
+    def raise_errors(self):
+        """Raise errors instead of passing them on as events
+
+        :return: New stream of measurement events only
+        :rtype: bm257s.stream.Stream
+        """
+        return self._then(_RaiseErrors)
+
+
+class Stream(_Operators):
+    """Lazy chain of operators over measurement events
+
+    Operators return new streams and do nothing until the stream is iterated.
+    Measurement events carry (quantity, measurement) tuples until they get mapped to
+    something else. Errors raised by stage functions are passed on as error events.
+
+    :param events: Events to process (e.g. a generator)
+    :type events: iterable
+    """
+
+    @classmethod
+    def subscribe(cls, source, max_queue=16):
+        """Create stream of live measurements and errors of a multimeter
+
+        The source is subscribed when iteration starts and unsubscribed when the
+        iterator gets closed. A slow consumer never blocks the source: if it falls
+        behind by more than max_queue events, the newest buffered measurement gets
+        replaced, so it continues with current data.
+
+        :param source: Serial interface or other source of measurement events
+        :type source: bm257s.BM257sSerialInterface
+        :param max_queue: Maximum number of buffered events
+        :type max_queue: int
+
+        :return: Stream of measurement and error events
+        :rtype: bm257s.stream.Stream
+        """
+        return cls(_Lazy(_subscribed_events, source, max_queue))
+
+    def __iter__(self):
+        events = iter(self._events)
+        if self._stages:
+            return _run_step(events, _Fused, self._stages)
+        return events
+
+    def _then(self, step_type, *args):
+        return Stream(_Lazy(_run_step, self, step_type, *args))
+
+    def payloads(self):
+        """Iterate over the payloads of all events
+
+        :return: Iterator of payloads
+        :rtype: iterator
+        """
+        return (event.payload for event in self)
+
+
+class _Lazy:
+    """Iterable calling a generator function anew for each iteration
+
+    :param function: Generator function
+    :type function: callable
+    :param args: Arguments of function
+    """
+
+    # pylint: disable=R0903
+
+    def __init__(self, function, *args):
+        self._function = function
+        self._args = args
+
+    def __iter__(self):
+        return self._function(*self._args)
+
+
+async def _aiterate(events):
+    for event in events:
+        yield event
+
+
+class AsyncStream(_Operators):
+    """Lazy chain of operators over measurement events for asyncio
+
+    Supports the same operators as bm257s.stream.Stream, but is iterated with
+    "async for".
+
+    :param events: Events to process, an async iterable or a plain iterable
+    :type events: iterable
+    """
+
+    def __init__(self, events, _stages=()):
+        if not hasattr(events, "__aiter__"):
+            events = _ALazy(_aiterate, events)
+        super().__init__(events, _stages)
+
+    @classmethod
+    def subscribe(cls, source, max_queue=16, loop=None):
+        """Create async stream of live measurements and errors of a multimeter
+
+        :param source: Serial interface or other source of measurement events
+        :type source: bm257s.BM257sSerialInterface
+        :param max_queue: Maximum number of buffered events
+        :type max_queue: int
+        :param loop: Event loop iterating the stream, defaults to the running loop
+        :type loop: asyncio.AbstractEventLoop
+
+        :return: Stream of measurement and error events
+        :rtype: bm257s.stream.AsyncStream
+        """
+        return cls(_ALazy(_subscribed_events_async, source, max_queue, loop))
+
+    def __aiter__(self):
+        events = self._events.__aiter__()
+        if self._stages:
+            return _run_step_async(events, _Fused, self._stages)
+        return events
+
+    def _then(self, step_type, *args):
+        return AsyncStream(_ALazy(_run_step_async, self, step_type, *args))
+
+    async def payloads(self):
+        """Iterate over the payloads of all events
+
+        :return: Async iterator of payloads
+        :rtype: collections.abc.AsyncIterator
+        """
+        async for event in self:
+            yield event.payload
+
+
+class _ALazy:
+    """Async iterable calling an async generator function anew for each iteration
+
+    :param function: Async generator function
+    :type function: callable
+    :param args: Arguments of function
+    """
+
+    # pylint: disable=R0903
+
+    def __init__(self, function, *args):
+        self._function = function
+        self._args = args
+
+    def __aiter__(self):
+        return self._function(*self._args)
@@ -0,0 +1,295 @@
+"""Push-based delivery of reader events to subscribed callbacks"""
+import collections
+import collections.abc
+import concurrent.futures
+import enum
+import logging
+import threading
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class EventType(enum.Enum):
+    """Enumeration of all event types delivered to subscribers"""
+
+    PACKAGE = enum.auto()
+    MEASUREMENT = enum.auto()
+    ERROR = enum.auto()
+    CONNECTION = enum.auto()
+    ALERT = enum.auto()
+
+
+# Only the newest of these events is interesting to slow subscribers
+COALESCIBLE_EVENTS = frozenset({EventType.PACKAGE, EventType.MEASUREMENT})
+
+
+class Event:
+    """Single event delivered to subscribers
+
+    :param event_type: Type of event
+    :type event_type: bm257s.subscription.EventType
+    :param payload: Package, measurement tuple, exception, connection state or alert
+    :type payload: object
+    :param timestamp: Time the event occured at, defaults to now
+    :type timestamp: float
+    """
+
+    # pylint: disable=R0903
+
+    __slots__ = ("event_type", "payload", "timestamp")
+
+    def __init__(self, event_type, payload, timestamp=None):
+        self.event_type = event_type
+        self.payload = payload
+        self.timestamp = time.time() if timestamp is None else timestamp
+
+    def __repr__(self):
+        return f"Event({self.event_type}, {self.payload!r}, {self.timestamp})"
+
+
+class Subscription:
+    """Subscription of a single callback with its own bounded event queue
+
+    Events are queued by the publishing thread and delivered in order by a single
+    drain task running on an executor or asyncio event loop. If the queue is full, a
+    new package or measurement replaces a queued one of the same type, otherwise the
+    oldest queued event gets dropped.
+
+    :param callback: Function called with each delivered event
+    :type callback: callable
+    :param events: Event types to deliver, None for all
+    :type events: set
+    :param event_filter: Predicate deciding whether to deliver an event, None for all
+    :type event_filter: callable
+    :param executor: Executor used to run callbacks (ignored if loop is given)
+    :type executor: concurrent.futures.Executor
+    :param loop: Event loop used to run callbacks
+    :type loop: asyncio.AbstractEventLoop
+    :param max_queue: Maximum number of undelivered events
+    :type max_queue: int
+    :param transform: Function converting events before filtering and delivery
+    :type transform: callable
+    """
+
+    # pylint: disable=R0902,R0913
+    # Subscriptions are configured once and need all of this on the hot path
+
+    def __init__(
+        self,
+        callback,
+        *,
+        events=None,
+        event_filter=None,
+        executor=None,
+        loop=None,
+        max_queue=16,
+        transform=None,
+    ):
+        if max_queue < 1:
+            raise RuntimeError("Subscription queue needs room for at least one event")
+
+        self._callback = callback
+        self._events = None if events is None else frozenset(events)
+        self._filter = event_filter
+        self._executor = executor
+        self._loop = loop
+        self._max_queue = max_queue
+        self._transform = transform
+
+        self._queue = collections.deque()
+        self._queue_lock = threading.Lock()
+        self._scheduled = False
+        self._active = True
+
+        self.dropped = 0
+
+    @property
+    def active(self):
+        """Whether this subscription still receives events
+
+        :rtype: bool
+        """
+        return self._active
+
+    def put(self, event):
+        """Queue an event for delivery without blocking
+
+        If delivery cannot be scheduled anymore (e.g. because the executor got shut
+        down), the subscription gets cancelled.
+
+        :param event: Event to deliver
+        :type event: bm257s.subscription.Event
+        """
+        if (
+            self._transform is None
+            and self._events is not None
+            and event.event_type not in self._events
+        ):
+            return
+
+        with self._queue_lock:
+            if not self._active:
+                return
+
+            if len(self._queue) >= self._max_queue:
+                self.dropped += 1
+
+                last = self._queue[-1]
+                if (
+                    event.event_type is last.event_type
+                    and event.event_type in COALESCIBLE_EVENTS
+                ):
+                    self._queue[-1] = event
+                    return
+
+                self._queue.popleft()
+
+            self._queue.append(event)
+
+            if self._scheduled:
+                return
+            self._scheduled = True
+
+        try:
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._drain)
+            else:
+                self._executor.submit(self._drain)
+        except RuntimeError:
+            # Closed loop or shut down executor, must not break the publishing thread
+            _LOGGER.exception("Cannot schedule delivery, cancelling subscription")
+            with self._queue_lock:
+                self._scheduled = False
+            self.cancel()
+
+    def cancel(self):
+        """Stop delivering events
+
+        Callbacks already running are not interrupted, but no new ones get started.
+        """
+        with self._queue_lock:
+            self._active = False
+            self._queue.clear()
+
+    def _drain(self):
+        while True:
+            with self._queue_lock:
+                if not self._active or len(self._queue) == 0:
+                    self._scheduled = False
+                    return
+
+                event = self._queue.popleft()
+
+            self._deliver(event)
+
+    def _deliver(self, event):
+        try:
+            if self._transform is not None:
+                event = self._transform(event)
+                if self._events is not None and event.event_type not in self._events:
+                    return
+
+            if self._filter is not None and not self._filter(event):
+                return
+
+            result = self._callback(event)
+            # Checked without asyncio, so decoding does not need to import it
+            if self._loop is not None and isinstance(result, collections.abc.Coroutine):
+                self._loop.create_task(result)
+
+        except Exception:  # pylint: disable=W0703
+            # A broken subscriber must not stop delivery to itself or others
+            _LOGGER.exception("Subscriber callback failed for %r", event)
+
+
+class Publisher:
+    """Distributes published events to all current subscriptions
+
+    :param max_workers: Number of threads used for subscriptions without own executor
+    :type max_workers: int
+    """
+
+    def __init__(self, max_workers=4):
+        self._max_workers = max_workers
+        self._executor = None
+        self._subscriptions = ()
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback, **kwargs):
+        """Subscribe a callback to published events
+
+        :param callback: Function called with each delivered event
+        :type callback: callable
+        :param kwargs: Further arguments of bm257s.subscription.Subscription
+
+        :return: The new subscription, used to unsubscribe later
+        :rtype: bm257s.subscription.Subscription
+        """
+        with self._lock:
+            if kwargs.get("loop") is None and kwargs.get("executor") is None:
+                if self._executor is None:
+                    self._executor = concurrent.futures.ThreadPoolExecutor(
+                        max_workers=self._max_workers,
+                        thread_name_prefix="bm257s-dispatch",
+                    )
+                kwargs["executor"] = self._executor
+
+            subscription = Subscription(callback, **kwargs)
+            self._subscriptions = self._subscriptions + (subscription,)
+
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Remove a subscription
+
+        Does nothing if the subscription is not (or no longer) subscribed.
+
+        :param subscription: Subscription returned by subscribe()
+        :type subscription: bm257s.subscription.Subscription
+        """
+        subscription.cancel()
+        with self._lock:
+            self._subscriptions = tuple(
+                s for s in self._subscriptions if s is not subscription
+            )
+
+    def has_subscriptions(self):
+        """Check whether anyone is subscribed
+
+        :return: Whether there is at least one subscription
+        :rtype: bool
+        """
+        return len(self._subscriptions) > 0
+
+    def publish(self, event_type, payload, timestamp=None):
+        """Publish an event to all subscriptions without blocking
+
+        :param event_type: Type of event
+        :type event_type: bm257s.subscription.EventType
+        :param payload: Event payload
+        :type payload: object
+        :param timestamp: Time the event occured at, defaults to now
+        :type timestamp: float
+        """
+        subscriptions = self._subscriptions
+        if len(subscriptions) == 0:
+            return
+
+        event = Event(event_type, payload, timestamp)
+        for subscription in subscriptions:
+            subscription.put(event)
+
+    def close(self):
+        """Remove all subscriptions and shut down the owned executor"""
+        with self._lock:
+            subscriptions = self._subscriptions
+            self._subscriptions = ()
+            executor = self._executor
+            self._executor = None
+
+        for subscription in subscriptions:
+            subscription.cancel()
+
+        if executor is not None:
+            executor.shutdown(wait=False)
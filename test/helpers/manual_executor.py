@@ -0,0 +1,30 @@
+"""Executor running submitted work only when asked to, for deterministic tests"""
+
+
+class ManualExecutor:
+    """Executor collecting submitted functions until run_all() is called"""
+
+    def __init__(self):
+        self._pending = []
+
+    def submit(self, func, *args, **kwargs):
+        """Store function for later execution
+
+        :param func: Function to execute
+        :type func: callable
+        """
+        self._pending.append((func, args, kwargs))
+
+    def pending(self):
+        """Get number of functions waiting for execution
+
+        :return: Number of submitted but not yet executed functions
+        :rtype: int
+        """
+        return len(self._pending)
+
+    def run_all(self):
+        """Execute all pending functions in order of submission"""
+        while len(self._pending) > 0:
+            func, args, kwargs = self._pending.pop(0)
+            func(*args, **kwargs)
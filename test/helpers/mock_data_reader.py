@@ -4,11 +4,18 @@ import threading
 
 
 class MockDataReader:
-    """Mock data reader to test package reader interactions"""
+    """Mock data reader to test package reader interactions
+
+    :param timeout: Maximum time a read blocks while no data is available
+    :type timeout: float
+    """
+
+    def __init__(self, timeout=0.0):
+        self._timeout = timeout
 
-    def __init__(self):
         self._next_data = b""
-        self._next_data_lock = threading.Lock()
+        self._cancelled = False
+        self._next_data_cond = threading.Condition()
 
     def set_next_data(self, data):
         """Set the next data to get read from by the next read invocation
@@ -16,8 +23,9 @@ class MockDataReader:
         :param data: Data to read from in the next read invocation
         :type data: bytes
         """
-        with self._next_data_lock:
+        with self._next_data_cond:
             self._next_data = data
+            self._next_data_cond.notify_all()
 
     def all_data_used(self):
         """Test if all data set by set_next_data got read in read() invocations
@@ -27,19 +35,32 @@ class MockDataReader:
         :return: Whether there is more dummy data left
         :rtype: bool
         """
-        with self._next_data_lock:
+        with self._next_data_cond:
             return len(self._next_data) == 0
 
+    def cancel_read(self):
+        """Interrupt a pending or the next read invocation"""
+        with self._next_data_cond:
+            self._cancelled = True
+            self._next_data_cond.notify_all()
+
     def read(self, size):
         """Read dummy data previously set by set_next_data
 
+        Blocks for at most the configured timeout if no data is available.
+
         :param size: Amount of data to read
         :type size: int
 
         :return: Chunk of dummy data set by set_next_data
         :rtype: bytes
         """
-        with self._next_data_lock:
+        with self._next_data_cond:
+            self._next_data_cond.wait_for(
+                lambda: len(self._next_data) > 0 or self._cancelled, self._timeout
+            )
+            self._cancelled = False
+
             real_size = min(size, len(self._next_data))
             result = self._next_data[0:real_size]
             self._next_data = self._next_data[real_size:]
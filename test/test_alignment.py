@@ -0,0 +1,141 @@
+"""Unit tests for alignment module"""
+
+import math
+import random
+import time
+import unittest
+
+from bm257s.alignment import TimeAligner, estimate_period
+from bm257s.measurement import Measurement, VoltageMeasurement
+from bm257s.subscription import EventType, Publisher
+
+
+class TestTimeAligner(unittest.TestCase):
+    """Testcase for aligning streams onto a common timeline"""
+
+    def setUp(self):
+        """Set up aligner with two streams of different rates"""
+        super().setUp()
+
+        self._aligner = TimeAligner()
+        for i in range(11):
+            self._aligner.add("fast", i * 0.5, float(i))
+        for i in range(6):
+            self._aligner.add("slow", 0.2 + i, 10.0 * i)
+
+    def test_period_estimation(self):
+        """Test estimation of sample periods with jitter and dropped samples"""
+        self.assertAlmostEqual(self._aligner.sample_period("fast"), 0.5)
+        self.assertAlmostEqual(self._aligner.sample_period("slow"), 1.0)
+
+        rng = random.Random(31)
+        timestamps = [i * 0.25 + rng.uniform(-0.02, 0.02) for i in range(1000)]
+        del timestamps[100:105]
+        self.assertAlmostEqual(estimate_period(timestamps), 0.25, delta=0.01)
+        self.assertIsNone(estimate_period([1.0]))
+
+    def test_hold(self):
+        """Test sample-and-hold resampling on default timeline"""
+        table = self._aligner.align()
+
+        self.assertEqual(table.names(), ["fast", "slow"])
+        self.assertAlmostEqual(table.timestamps[0], 0.2, msg="Start when all have data")
+        self.assertAlmostEqual(table.timestamps[-1], 4.7, msg="End when first stops")
+        self.assertEqual(len(table), 10, msg="Use shortest sample period")
+
+        rows = list(table.rows())
+        self.assertEqual(rows[0][1:], (0.0, 0.0))
+        self.assertEqual(rows[1][1:], (1.0, 0.0))
+        self.assertEqual(rows[2][1:], (2.0, 10.0))
+
+    def test_linear(self):
+        """Test linear interpolation and NaN outside of sampled range"""
+        table = self._aligner.align(
+            period=0.25, start=0.0, end=6.0, method=TimeAligner.LINEAR
+        )
+        fast = table.columns["fast"]
+        slow = table.columns["slow"]
+
+        self.assertAlmostEqual(fast[1], 0.5)
+        self.assertAlmostEqual(fast[20], 10.0, msg="Include last sample")
+        self.assertTrue(math.isnan(fast[21]), msg="No extrapolation after last sample")
+        self.assertTrue(math.isnan(slow[0]), msg="No extrapolation before first sample")
+        self.assertAlmostEqual(slow[4], 8.0)
+
+    def test_unsorted_samples(self):
+        """Test that late samples are sorted into their stream"""
+        aligner = TimeAligner()
+        aligner.add("meter", 2.0, 2.0)
+        aligner.add("meter", 1.0, 1.0)
+        aligner.add_series("meter", [3.0, 0.0], [3.0, 0.0])
+
+        table = aligner.align(period=1.0, start=0.0, end=3.0)
+        self.assertListEqual(list(table.columns["meter"]), [0.0, 1.0, 2.0, 3.0])
+
+    def test_errors(self):
+        """Test errors for invalid configuration and missing data"""
+        self.assertRaises(RuntimeError, TimeAligner, "cubic")
+        self.assertRaises(RuntimeError, TimeAligner().align)
+
+        aligner = TimeAligner()
+        aligner.add("meter", 0.0, 1.0)
+        self.assertRaises(RuntimeError, aligner.align)
+
+    def test_attach(self):
+        """Test collecting measurement events of a source"""
+        aligner = TimeAligner()
+        publisher = Publisher()
+        aligner.attach(publisher, "meter")
+        for i in range(3):
+            publisher.publish(
+                EventType.MEASUREMENT,
+                (
+                    Measurement.VOLTAGE,
+                    VoltageMeasurement(
+                        float(i), VoltageMeasurement.CURRENT_DC, Measurement.PREFIX_KILO
+                    ),
+                ),
+                float(i),
+            )
+
+        deadline = time.monotonic() + 1.0
+        while time.monotonic() < deadline:
+            if aligner.names() and aligner.sample_period("meter") is not None:
+                table = aligner.align(period=1.0, start=0.0, end=2.0)
+                if not math.isnan(table.columns["meter"][-1]):
+                    break
+            time.sleep(0.01)
+        publisher.close()
+
+        self.assertListEqual(list(table.columns["meter"]), [0.0, 1000.0, 2000.0])
+
+
+class TestTimeAlignerBenchmark(unittest.TestCase):
+    """Benchmark of aligning long recordings of many multimeters"""
+
+    METERS = 24
+    DURATION = 2 * 3600
+    PERIOD = 0.25
+    MAX_TIME = 10.0
+
+    def test_many_meters(self):
+        """Test aligning hours of data from dozens of meters"""
+        rng = random.Random(24)
+        aligner = TimeAligner()
+        count = int(self.DURATION / self.PERIOD)
+        for meter in range(self.METERS):
+            period = self.PERIOD * rng.uniform(0.95, 1.05)
+            aligner.add_series(
+                f"m{meter}",
+                [i * period + rng.uniform(0.0, 0.01) for i in range(count)],
+                [float(i) for i in range(count)],
+            )
+
+        start = time.perf_counter()
+        hold = aligner.align(period=self.PERIOD)
+        linear = aligner.align(period=self.PERIOD, method=TimeAligner.LINEAR)
+        duration = time.perf_counter() - start
+
+        self.assertGreater(len(hold), 0.9 * count)
+        self.assertEqual(len(linear.columns), self.METERS)
+        self.assertLess(duration, self.MAX_TIME)
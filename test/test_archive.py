@@ -0,0 +1,180 @@
+"""Unit tests for archive module"""
+
+import os
+import random
+import tempfile
+import time
+import unittest
+
+from bm257s.archive import ArchiveReader, ArchiveWriter, decode_block, encode_block
+from bm257s.package_reader import PackageReader, parse_package
+from bm257s.simulator import MeterSimulator, Mode, constant, ramp, sine
+
+from .helpers.raw_package_helpers import EXAMPLE_RAW_PKG, change_byte_index
+
+
+def capture(count, seed=0):
+    """Simulate a capture of a slowly changing voltage with jittery timestamps
+
+    :param count: Number of frames
+    :type count: int
+    :param seed: Seed of random number generator
+    :type seed: int
+
+    :return: List of (timestamp, frame) tuples
+    :rtype: list
+    """
+    simulator = MeterSimulator(
+        [Mode.dc_voltage(sine(0.5, 0.001, 12.0))], rate=5.0, seed=seed
+    )
+    rand = random.Random(seed)
+    start = 1.6e9
+    return [
+        (start + i * 0.2 + rand.uniform(0.0, 0.003), simulator.next_package())
+        for i in range(count)
+    ]
+
+
+class TestBlockEncoding(unittest.TestCase):
+    """Testcase for encoding of single blocks"""
+
+    def test_round_trip(self):
+        """Test decoding of encoded blocks, including clock jumps backwards"""
+        ticks = [1000, 1200, 1400, 1390, 1600, 10**12]
+        frames = [bytes([i] * 15) for i in (1, 1, 1, 2, 3, 3)]
+
+        data = encode_block(ticks, frames, 15)
+        self.assertEqual(data[-15:], bytes(15), msg="Repeated frames are zero")
+        self.assertEqual(decode_block(bytes(data), 1000, 6, 15), (ticks, frames))
+
+
+class TestArchive(unittest.TestCase):
+    """Testcase for writing and reading archives"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        self.path = os.path.join(self.directory.name, "meter.bmarc")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _write(self, frames, **kwargs):
+        with ArchiveWriter(self.path, **kwargs) as writer:
+            for timestamp, frame in frames:
+                writer.add(timestamp, frame)
+
+    def test_round_trip(self):
+        """Test that all frames are read back with millisecond timestamps"""
+        frames = capture(1000)
+        for compression in ("zlib", "lzma"):
+            self._write(frames, compression=compression, block_frames=64)
+
+            with ArchiveReader(self.path) as reader:
+                self.assertEqual(reader.compression, compression)
+                self.assertEqual(len(reader), 1000)
+                self.assertEqual(reader.block_count(), 16)
+
+                result = list(reader.frames())
+                self.assertEqual([f for (_, f) in result], [f for (_, f) in frames])
+                for (t_read, _), (t_written, _) in zip(result, frames):
+                    self.assertAlmostEqual(t_read, t_written, delta=0.0005)
+
+    def test_compression_ratio(self):
+        """Test size compared to raw frames with 8 byte timestamps"""
+        frames = capture(20000)
+        self._write(frames)
+
+        raw_size = len(frames) * (15 + 8)
+        ratio = raw_size / os.path.getsize(self.path)
+        self.assertGreater(ratio, 20.0, msg=f"Compression ratio is {ratio:.1f}")
+
+    def test_seek(self):
+        """Test reading time ranges by decompressing only the blocks needed"""
+        frames = capture(20000)
+        self._write(frames, block_frames=256)
+
+        with ArchiveReader(self.path) as reader:
+            first, last = reader.time_range()
+            self.assertAlmostEqual(first, frames[0][0], delta=0.0005)
+            self.assertAlmostEqual(last, frames[-1][0], delta=0.0005)
+
+            start = time.perf_counter()
+            full = list(reader.frames())
+            full_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            selected = list(reader.frames(full[12345][0], full[12354][0]))
+            seek_time = time.perf_counter() - start
+
+        self.assertEqual(selected, full[12345:12355])
+        self.assertLess(seek_time, full_time / 10)
+
+    def test_missing_index(self):
+        """Test recovery of archives whose writer did not get closed"""
+        frames = capture(300)
+        writer = ArchiveWriter(self.path, block_frames=100)
+        for timestamp, frame in frames:
+            writer.add(timestamp, frame)
+        writer.flush()
+
+        # Simulate a crash while writing the last block
+        with open(self.path, "ab") as f:
+            f.write(b"\x00" * 20)
+
+        with ArchiveReader(self.path) as reader:
+            self.assertEqual(len(reader), 300)
+            self.assertEqual(
+                [f for (_, f) in reader.frames()], [f for (_, f) in frames]
+            )
+
+        writer.close()
+
+    def test_invalid(self):
+        """Test rejection of invalid files and frames"""
+        with open(self.path, "wb") as f:
+            f.write(b"not an archive at all")
+        self.assertRaises(RuntimeError, ArchiveReader, self.path)
+        self.assertRaises(RuntimeError, ArchiveWriter, self.path, compression="zip")
+
+        with ArchiveWriter(self.path) as writer:
+            self.assertRaises(RuntimeError, writer.add, 0.0, b"\x02")
+
+        with ArchiveReader(self.path) as reader:
+            self.assertEqual(len(reader), 0)
+            self.assertIsNone(reader.time_range())
+            self.assertEqual(list(reader.frames()), [])
+
+    def test_closed(self):
+        """Test that using a closed writer raises"""
+        writer = ArchiveWriter(self.path)
+        writer.close()
+        writer.close()
+
+        self.assertRaises(RuntimeError, writer.add, 0.0, EXAMPLE_RAW_PKG)
+        self.assertRaises(RuntimeError, writer.flush)
+
+    def test_attach(self):
+        """Test archiving all raw frames of a reader, including invalid ones"""
+        simulator = MeterSimulator(
+            [Mode.dc_voltage(ramp(0.0, 0.1), 1.0), Mode.resistance(constant(None))]
+        )
+        invalid = change_byte_index(EXAMPLE_RAW_PKG, 7, 12)
+        reader = PackageReader(simulator)
+        writer = ArchiveWriter(self.path, compression="lzma", block_frames=16)
+        handler = writer.attach(reader)
+
+        reader.feed(simulator.packages(30), 1.0)
+        reader.feed(invalid, 2.0)
+        reader.feed(simulator.packages(30), 3.0)
+        reader.remove_frame_handler(handler)
+        reader.feed(simulator.packages(1), 4.0)
+        reader.close()
+        writer.close()
+
+        with ArchiveReader(self.path) as archive:
+            frames = list(archive.frames())
+
+        self.assertEqual(len(frames), 61)
+        self.assertEqual(frames[30], (2.0, invalid), msg="Invalid frame is kept")
+        self.assertEqual(frames[-1][0], 3.0)
+        self.assertRaises(RuntimeError, parse_package, invalid)
@@ -0,0 +1,275 @@
+"""Unit tests for connection module"""
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import bm257s
+from bm257s.connection import SupervisedSerial
+from bm257s.measurement import VoltageMeasurement
+from bm257s.package_encoder import encode_measurement
+from bm257s.package_reader import PackageReader
+from bm257s.simulator import MeterSimulator
+from bm257s.subscription import EventType
+
+from .helpers.manual_executor import ManualExecutor
+
+
+class FailingReader:
+    """Reader failing like an unplugged serial adapter"""
+
+    # pylint: disable=R0903
+
+    def read(self, _size):
+        """Fail reading
+
+        :raise OSError: Always
+        """
+        raise OSError("device disconnected")
+
+
+class FakePort:
+    """Serial port returning prepared chunks of data"""
+
+    def __init__(self, chunks):
+        self.port = "fake"
+        self._chunks = list(chunks)
+
+    def read(self, _size):
+        """Return the next chunk, or nothing after a short wait
+
+        :raise OSError: If the next chunk is an exception
+        """
+        if not self._chunks:
+            time.sleep(0.01)
+            return b""
+
+        chunk = self._chunks.pop(0)
+        if isinstance(chunk, Exception):
+            raise chunk
+        return chunk
+
+    def cancel_read(self):
+        """Nothing to cancel"""
+
+    def close(self):
+        """Nothing to close"""
+
+
+class TestSupervisedSerial(unittest.TestCase):
+    """Testcase for serial ports reopened after disconnects"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        self.link = os.path.join(self.directory.name, "ttyMETER")
+        self.simulator = None
+
+    def tearDown(self):
+        if self.simulator is not None:
+            self.simulator.close_pty()
+        self.directory.cleanup()
+
+    def _plug_in(self):
+        """Create a new simulated multimeter behind the link"""
+        self.simulator = MeterSimulator(rate=50.0)
+        os.symlink(self.simulator.open_pty(), self.link)
+
+    def _unplug(self):
+        """Remove the simulated multimeter"""
+        os.remove(self.link)
+        self.simulator.close_pty()
+        self.simulator = None
+
+    def _wait_for(self, predicate, timeout=2.0):
+        end = time.monotonic() + timeout
+        while not predicate():
+            if time.monotonic() > end:
+                self.fail("Timeout while waiting")
+            time.sleep(0.005)
+
+    def test_reconnect(self):
+        """Test that readers keep running while the port is replaced"""
+        self._plug_in()
+        states = []
+        port = SupervisedSerial(
+            self.link, read_timeout=0.05, on_state_change=lambda *s: states.append(s)
+        )
+        reader = PackageReader(port)
+        received = []
+        reader.add_package_handler(lambda _: received.append(time.monotonic()))
+
+        self.assertTrue(port.connect())
+        reader.start()
+        try:
+            self._wait_for(lambda: len(received) > 0)
+
+            with self.assertLogs("bm257s.connection", "WARNING"):
+                self._unplug()
+                self._wait_for(lambda: not port.connected)
+            self.assertTrue(reader.is_running())
+            self.assertIsNotNone(port.outage_duration())
+
+            time.sleep(0.3)
+            self._plug_in()
+            plugged_in = time.monotonic()
+            self._wait_for(lambda: len(received) > 0 and received[-1] > plugged_in)
+
+            self.assertLess(received[-1] - plugged_in, 0.5, msg="Fast recovery")
+            self.assertEqual(
+                states, [(True, None), (False, None), (True, states[-1][1])]
+            )
+            self.assertEqual(len(port.outages), 1)
+            self.assertGreater(port.outages[0], 0.3)
+        finally:
+            reader.close()
+            port.close()
+
+    def test_missing_port(self):
+        """Test that a missing port is retried with bounded backoff"""
+        attempts = []
+
+        def open_port(port, _timeout):
+            attempts.append(time.monotonic())
+            raise OSError(f"No such device {port}")
+
+        port = SupervisedSerial(
+            self.link,
+            read_timeout=0.05,
+            min_backoff=0.01,
+            max_backoff=0.04,
+            open_port=open_port,
+        )
+        end = time.monotonic() + 0.5
+        while time.monotonic() < end:
+            self.assertEqual(port.read(15), b"")
+
+        delays = [b - a for (a, b) in zip(attempts, attempts[1:])]
+        self.assertGreater(len(delays), 5)
+        self.assertLess(delays[0], delays[2])
+        self.assertLess(max(delays), 0.04 + 0.05)
+
+    def test_cancel_backoff(self):
+        """Test that cancelling interrupts waiting for the next attempt"""
+
+        def open_port(port, _timeout):
+            raise OSError(f"No such device {port}")
+
+        port = SupervisedSerial(
+            self.link, read_timeout=5.0, min_backoff=5.0, open_port=open_port
+        )
+        port.read(15)
+
+        threading.Timer(0.05, port.cancel_read).start()
+        start = time.monotonic()
+        self.assertEqual(port.read(15), b"")
+        self.assertLess(time.monotonic() - start, 1.0)
+
+    def test_interface(self):
+        """Test supervised interface starting without its port"""
+        executor = ManualExecutor()
+        with bm257s.BM257sSerialInterface(
+            self.link, read_timeout=0.05, supervised=True
+        ) as interface:
+            events = []
+            interface.subscribe(
+                events.append, events={EventType.CONNECTION}, executor=executor
+            )
+
+            self._plug_in()
+            self._wait_for(lambda: interface.read() is not None)
+            with self.assertLogs("bm257s.connection", "WARNING"):
+                self._unplug()
+                time.sleep(0.1)
+            self._plug_in()
+            self._wait_for(lambda: len(interface.outages()) == 2)
+
+            interface.stop()
+            executor.run_all()
+            outages = interface.outages()
+
+        self.assertEqual(
+            [e.payload for e in events],
+            [(True, outages[0]), (False, None), (True, outages[1])],
+            msg="Only port state is reported, with outages when reconnecting",
+        )
+
+    def test_reconnect_resets_decoder(self):
+        """Test that bytes of a lost connection are not joined with new data"""
+        pkg = encode_measurement(VoltageMeasurement(1.0, VoltageMeasurement.CURRENT_DC))
+        ports = [
+            FakePort([pkg[:7], OSError("device disconnected")]),
+            FakePort([pkg]),
+        ]
+
+        executor = ManualExecutor()
+        events = []
+        with mock.patch("serial.Serial", side_effect=ports):
+            interface = bm257s.BM257sSerialInterface(
+                "fake", read_timeout=0.05, supervised=True
+            )
+            interface.subscribe(events.append, executor=executor)
+            try:
+                with self.assertLogs("bm257s.connection", "WARNING"):
+                    interface.start()
+                    self._wait_for(lambda: interface.read() is not None)
+
+                interface.stop()
+                executor.run_all()
+            finally:
+                interface.close()
+
+        self.assertEqual(
+            [e.event_type for e in events],
+            [EventType.CONNECTION, EventType.CONNECTION, EventType.MEASUREMENT],
+            msg="No error from joining old and new bytes",
+        )
+
+
+class TestFailingReader(unittest.TestCase):
+    """Testcase for readers failing without supervision"""
+
+    def test_reader_stops(self):
+        """Test that a failing reader ends reading with an error"""
+        executor = ManualExecutor()
+        reader = PackageReader(FailingReader())
+        events = []
+        reader.subscribe(events.append, executor=executor)
+
+        reader.start()
+        for _ in range(100):
+            if not reader.is_running():
+                break
+            time.sleep(0.01)
+        reader.stop()
+        executor.run_all()
+        reader.close()
+
+        self.assertEqual(
+            [e.event_type for e in events],
+            [EventType.CONNECTION, EventType.ERROR, EventType.CONNECTION],
+        )
+        self.assertEqual([events[0].payload, events[2].payload], [True, False])
+
+    def test_restart(self):
+        """Test that a reader ended by a failing reader can be started again"""
+        executor = ManualExecutor()
+        reader = PackageReader(FailingReader())
+        events = []
+        reader.subscribe(events.append, events={EventType.ERROR}, executor=executor)
+
+        for _ in range(2):
+            reader.start()
+            for _ in range(100):
+                if not reader.is_running():
+                    break
+                time.sleep(0.01)
+            self.assertFalse(reader.is_running())
+
+        reader.stop()
+        executor.run_all()
+        reader.close()
+
+        self.assertEqual(len(events), 2, msg="Restarted reader reads again")
@@ -0,0 +1,119 @@
+"""Unit tests for history module"""
+
+import math
+import time
+import unittest
+
+from bm257s.history import History, TrendPlot, lttb
+
+
+class TestLTTB(unittest.TestCase):
+    """Testcase for Largest-Triangle-Three-Buckets downsampling"""
+
+    def test_keeps_extremes(self):
+        """Test that spikes and end points survive downsampling"""
+        timestamps = list(range(1000))
+        values = [0.0] * 1000
+        values[500] = 10.0
+        values[700] = -5.0
+
+        result_t, result_v = lttb(timestamps, values, 20)
+        self.assertEqual(len(result_t), 20)
+        self.assertEqual((result_t[0], result_t[-1]), (0, 999))
+        self.assertIn(10.0, result_v, msg="Keep positive spike")
+        self.assertIn(-5.0, result_v, msg="Keep negative spike")
+        self.assertListEqual(result_t, sorted(result_t))
+
+    def test_small_series(self):
+        """Test that short series are not changed"""
+        self.assertEqual(lttb([1, 2], [3, 4], 10), ([1, 2], [3, 4]))
+
+
+class TestHistory(unittest.TestCase):
+    """Testcase for bounded multi-resolution histories"""
+
+    def test_bounded(self):
+        """Test that memory stays bounded and recent samples stay exact"""
+        history = History(capacity=64, levels=3, factor=4)
+        for i in range(100000):
+            history.add(float(i), math.sin(i / 100.0))
+
+        self.assertLessEqual(len(history), 3 * 64)
+        timestamps, values = history.points()
+        self.assertListEqual(timestamps, sorted(timestamps))
+        self.assertEqual(timestamps[-1], 99999.0)
+        self.assertEqual(timestamps[-32:], [float(i) for i in range(99968, 100000)])
+        self.assertAlmostEqual(values[-1], math.sin(999.99))
+
+        recent_t, _ = history.points(99990.0, 99995.0)
+        self.assertListEqual(recent_t, [float(i) for i in range(99990, 99995)])
+
+    def test_missing_values(self):
+        """Test samples without value"""
+        history = History(capacity=16, factor=2)
+        history.add(0.0, None)
+        history.add(1.0, 1.0)
+        _, values = history.points()
+        self.assertTrue(math.isnan(values[0]))
+
+    def test_invalid(self):
+        """Test rejection of histories without room for reductions"""
+        self.assertRaises(RuntimeError, History, capacity=4, factor=4)
+
+
+class TestTrendPlot(unittest.TestCase):
+    """Testcase for terminal trend plots"""
+
+    def test_render(self):
+        """Test rendering of a ramp"""
+        history = History()
+        for i in range(100):
+            history.add(i * 0.1, float(i))
+
+        plot = TrendPlot(history, span=10.0, width=10, height=5)
+        lines, value_range = plot.render(9.95)
+
+        self.assertEqual(value_range, (0.0, 99.0))
+        self.assertEqual(len(lines), 5)
+        self.assertTrue(all(len(line) == 10 for line in lines))
+        self.assertNotEqual(lines[-1][0], " ", msg="Lowest values in first column")
+        self.assertNotEqual(lines[0][-1], " ", msg="Highest values in last column")
+        self.assertEqual(lines[0][0], " ")
+
+    def test_cached_columns(self):
+        """Test that only changed columns get recomputed"""
+        history = History()
+        for i in range(50):
+            history.add(float(i), float(i))
+
+        plot = TrendPlot(history, span=50.0, width=50, height=10)
+        before = plot.columns(49.5)
+        self.assertEqual(before[0], (0.0, 0.0))
+
+        history.add(49.8, 100.0)
+        after = plot.columns(49.9)
+        self.assertEqual(after[:-1], before[:-1])
+        self.assertEqual(after[-1], (49.0, 100.0))
+
+        history.clear()
+        self.assertTrue(all(c is None for c in plot.columns(49.9)))
+
+    def test_flat_cpu(self):
+        """Test that rendering time does not grow with history length"""
+        history = History(capacity=4096)
+        plot = TrendPlot(history, span=60.0, width=80, height=20)
+
+        def add_and_render(count, offset):
+            start = time.perf_counter()
+            for i in range(count):
+                now = offset + i * 0.1
+                history.add(now, math.sin(now))
+                plot.render(now)
+            return time.perf_counter() - start
+
+        short = add_and_render(500, 0.0)
+        for i in range(200000):
+            history.add(50.0 + i * 0.01, 0.0)
+        long = add_and_render(500, 2100.0)
+
+        self.assertLess(long, 5 * short + 0.5)
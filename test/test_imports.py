@@ -0,0 +1,98 @@
+"""Unit tests for import time of the package"""
+
+import os
+import subprocess
+import sys
+import unittest
+
+import bm257s
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules needed to decode recorded data
+DECODE_MODULES = [
+    "bm257s",
+    "bm257s.archive",
+    "bm257s.measurement",
+    "bm257s.package_parser",
+    "bm257s.package_reader",
+    "bm257s.protocol",
+]
+
+# Modules decoding must not import
+HEAVY_MODULES = ["serial", "asyncio", "bm257s.bm257s"]
+
+
+def import_times(statement):
+    """Run a statement in a new interpreter and collect its import times
+
+    :param statement: Python statement to run
+    :type statement: str
+
+    :return: Cumulative import time in seconds and nesting level (0 for modules
+        imported directly by the statement) by module name
+    :rtype: dict
+    """
+    python_path = os.pathsep.join(
+        path for path in (ROOT, os.environ.get("PYTHONPATH")) if path
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=ROOT,
+        env=dict(os.environ, PYTHONPATH=python_path),
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")  # noqa: E203
+        # Nested imports are indented by two spaces per level
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        times[name.strip()] = (int(cumulative) * 1e-6, level)
+
+    return times
+
+
+class TestImports(unittest.TestCase):
+    """Testcase for cold start of processes only decoding data"""
+
+    RUNS = 3
+    MAX_IMPORT_TIME = 0.15
+
+    def test_decode_imports(self):
+        """Test that decoding does not import the serial interface"""
+        # The fastest run is the least disturbed by other processes
+        totals = []
+        for _ in range(self.RUNS):
+            times = import_times("import " + ", ".join(DECODE_MODULES))
+
+            for module in HEAVY_MODULES:
+                self.assertNotIn(module, times, msg=f"Decoding imports {module}")
+
+            # Modules imported by others are already part of their cumulative time
+            totals.append(
+                sum(
+                    cumulative
+                    for (module, (cumulative, level)) in times.items()
+                    if module in DECODE_MODULES and level == 0
+                )
+            )
+
+        total = min(totals)
+        self.assertLess(
+            total,
+            self.MAX_IMPORT_TIME,
+            msg=f"Importing decoding modules takes {total * 1e3:.1f}ms",
+        )
+
+    def test_lazy_serial_interface(self):
+        """Test that the serial interface gets imported on first access"""
+        times = import_times("import bm257s; bm257s.BM257sSerialInterface")
+        self.assertIn("bm257s.bm257s", times)
+
+        self.assertIn("BM257sSerialInterface", dir(bm257s))
+        self.assertRaises(AttributeError, getattr, bm257s, "NoSuchAttribute")
@@ -0,0 +1,109 @@
+"""Unit tests for package encoder module"""
+
+import random
+import unittest
+
+from bm257s.measurement import (
+    Measurement,
+    ResistanceMeasurement,
+    TemperatureMeasurement,
+    VoltageMeasurement,
+)
+from bm257s.package_encoder import (
+    OVERLOAD_DISPLAY,
+    display_package,
+    encode_measurement,
+    encode_package,
+    format_value,
+)
+from bm257s.package_parser import parse_package as parse_measurement
+from bm257s.package_reader import Symbol, parse_package
+
+from .helpers.raw_package_helpers import EXAMPLE_RAW_PKG, EXAMPLE_RAW_PKG_SYMBOLS
+
+
+class TestPackageEncoder(unittest.TestCase):
+    """Testcase for encoding packages into raw data"""
+
+    def test_example_package(self):
+        """Test encoding of 'spec'-provided example package"""
+        self.assertEqual(
+            encode_package(parse_package(EXAMPLE_RAW_PKG)),
+            EXAMPLE_RAW_PKG,
+            msg="Encoding parsed package should yield original data",
+        )
+        self.assertEqual(
+            encode_package(display_package("513.6", EXAMPLE_RAW_PKG_SYMBOLS)),
+            EXAMPLE_RAW_PKG,
+            msg="Encoding display state should yield example package",
+        )
+
+    def test_random_roundtrip(self):
+        """Test that all encodable packages survive encoding and decoding"""
+        rng = random.Random(32)
+        for _ in range(200):
+            data = bytearray(i << 4 for i in range(15))
+            data[0] = 0x02
+            for i in range(1, 15):
+                data[i] |= rng.randrange(16)
+
+            self.assertEqual(encode_package(parse_package(bytes(data))), bytes(data))
+
+    def test_format_value(self):
+        """Test formatting values like the display"""
+        self.assertEqual(format_value(513.6), "513.6")
+        self.assertEqual(format_value(0.5), "0.500")
+        self.assertEqual(format_value(-12.345), "-12.35")
+        self.assertEqual(format_value(5999), "5999")
+        self.assertEqual(format_value(999), " 999")
+        self.assertEqual(format_value(6000), OVERLOAD_DISPLAY)
+
+    def test_measurements(self):
+        """Test encoding of measurements"""
+        for value in (0.0, 1.234, -42.5, 513.6, -999.0):
+            for current in (
+                VoltageMeasurement.CURRENT_AC,
+                VoltageMeasurement.CURRENT_DC,
+            ):
+                measurement = VoltageMeasurement(
+                    value, current, Measurement.PREFIX_MILLI
+                )
+                quantity, parsed = parse_measurement(
+                    parse_package(encode_measurement(measurement))
+                )
+                self.assertEqual(quantity, Measurement.VOLTAGE)
+                self.assertAlmostEqual(parsed.value, value)
+                self.assertEqual(parsed.current, current)
+                self.assertEqual(parsed.prefix, Measurement.PREFIX_MILLI)
+
+        pkg = parse_package(encode_measurement(ResistanceMeasurement(None)))
+        self.assertTrue(pkg.is_overload(), msg="Open loop shows overload")
+        self.assertIn(Symbol.OHM, pkg.symbols)
+
+        pkg = parse_package(
+            encode_measurement(
+                TemperatureMeasurement(TemperatureMeasurement.UNIT_FAHRENHEIT, 77)
+            )
+        )
+        self.assertEqual(pkg.segment_string(), " 77F")
+        self.assertSetEqual(pkg.symbols, set())
+
+        pkg = parse_package(
+            encode_measurement(
+                TemperatureMeasurement(TemperatureMeasurement.UNIT_CELSIUS, -99)
+            )
+        )
+        self.assertEqual(pkg.segment_string(), "-99C")
+        for value in (1234, -100):
+            self.assertRaises(
+                RuntimeError,
+                encode_measurement,
+                TemperatureMeasurement(TemperatureMeasurement.UNIT_CELSIUS, value),
+            )
+
+    def test_invalid_display(self):
+        """Test errors for display states that cannot be shown"""
+        self.assertRaises(RuntimeError, display_package, "12345")
+        self.assertRaises(RuntimeError, display_package, "1.2")
+        self.assertRaises(RuntimeError, display_package, ".123")
+        self.assertRaises(RuntimeError, display_package, "12X4")
@@ -1,9 +1,14 @@
 """Unit tests for package reader module"""
 
+import time
 import unittest
 
-from bm257s.package_reader import PackageReader, parse_package
+from bm257s.package_reader import FrameDecoder, PackageReader, parse_package
+from bm257s.protocol import BM257S_LAYOUT, ProtocolSpec
+from bm257s.simulator import MeterSimulator, Mode, ramp
+from bm257s.subscription import EventType
 
+from .helpers.manual_executor import ManualExecutor
 from .helpers.mock_data_reader import MockDataReader
 from .helpers.raw_package_helpers import (
     EXAMPLE_RAW_PKG,
@@ -13,63 +18,36 @@ from .helpers.raw_package_helpers import (
 
 
 class TestPackageReader(unittest.TestCase):
-    """Testcase for package reader unit tests"""
+    """Testcase for package reader unit tests
 
-    READER_TIMEOUT = 0.1
+    Data is fed directly, so no test waits for the reading thread.
+    """
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-
-    @classmethod
-    def setUpClass(cls):
-        cls._mock_reader = MockDataReader()
-        cls._pkg_reader = PackageReader(cls._mock_reader)
+    BLOCKING_TIMEOUT = 10.0
 
     def setUp(self):
         """Set up package reader to get tested"""
         super().setUp()
 
-        self.assertTrue(
-            self._mock_reader.all_data_used(),
-            msg="Mock data should be empty before test start",
-        )
-
-        self._pkg_reader.start()
+        self._pkg_reader = PackageReader(MockDataReader(timeout=self.BLOCKING_TIMEOUT))
 
     def tearDown(self):
         """Stop package reader"""
         super().tearDown()
 
-        self._pkg_reader.stop()
-        self.assertTrue(
-            self._mock_reader.all_data_used(),
-            msg="Mock data should be empty after test end",
-        )
+        self._pkg_reader.close()
 
     def test_reader_restart(self):
         """Test restart behavior of package reader"""
-        self._mock_reader.set_next_data(EXAMPLE_RAW_PKG)
-        self.assertTrue(
-            self._pkg_reader.wait_for_package(self.READER_TIMEOUT),
-            msg="Reader should read package from input",
-        )
-        self.assertTrue(
-            self._mock_reader.all_data_used(),
-            "Reader should read all input data to get a package",
-        )
-        self.assertTrue(
-            self._pkg_reader.is_running(), "Reader should normally be running"
-        )
-
-        # Stop reader
-        self._pkg_reader.stop()
-        self.assertFalse(
-            self._pkg_reader.is_running(), "Reader should not be running after stop"
+        self._pkg_reader.feed(EXAMPLE_RAW_PKG)
+        self.assertIsNotNone(
+            self._pkg_reader.next_package(), msg="Reader should read package from input"
         )
+        self._pkg_reader.feed(EXAMPLE_RAW_PKG)
 
         self._pkg_reader.start()
         self.assertTrue(
-            self._pkg_reader.is_running(), "Reader should be running again after start"
+            self._pkg_reader.is_running(), "Reader should be running after start"
         )
 
         # Should not keep any package lying around
@@ -77,10 +55,16 @@ class TestPackageReader(unittest.TestCase):
             self._pkg_reader.next_package(), msg="Restart should clear read packages"
         )
 
+        # Stop reader
+        self._pkg_reader.stop()
+        self.assertFalse(
+            self._pkg_reader.is_running(), "Reader should not be running after stop"
+        )
+
         # But should read new packages again
-        self._mock_reader.set_next_data(EXAMPLE_RAW_PKG)
+        self._pkg_reader.feed(EXAMPLE_RAW_PKG)
         self.assertTrue(
-            self._pkg_reader.wait_for_package(self.READER_TIMEOUT),
+            self._pkg_reader.wait_for_package(0.0),
             msg="Package reader reads new package after restart",
         )
         pkg = self._pkg_reader.next_package()
@@ -91,14 +75,9 @@ class TestPackageReader(unittest.TestCase):
 
     def test_example_package(self):
         """Test parsing with 'spec'-provided example package"""
-        self._mock_reader.set_next_data(EXAMPLE_RAW_PKG)
-        self.assertTrue(
-            self._pkg_reader.wait_for_package(self.READER_TIMEOUT),
-            "Read package data from raw data reader",
-        )
+        self._pkg_reader.feed(EXAMPLE_RAW_PKG)
         pkg = self._pkg_reader.next_package()
         self.assertIsNotNone(pkg, "Package could get parsed fully")
-        self.assertTrue(self._mock_reader.all_data_used)
 
         check_example_pkg(self, pkg)
 
@@ -111,28 +90,26 @@ class TestPackageReader(unittest.TestCase):
         }
 
         for misalignment, data in misaligned_data.items():
-            self.assertTrue(
-                self._mock_reader.all_data_used,
-                "Mock data should be empty before test start",
-            )
-
-            self._mock_reader.set_next_data(data)
-            self.assertTrue(
-                self._pkg_reader.wait_for_package(self.READER_TIMEOUT),
-                f"Read package from raw data reader (misaligned by {misalignment})",
-            )
+            self._pkg_reader.feed(data)
             pkg = self._pkg_reader.next_package()
             self.assertIsNotNone(
                 pkg, f"Package could not get parsed (misaligned by {misalignment})"
             )
-            self.assertTrue(
-                self._mock_reader.all_data_used,
-                msg="Did not read all data from package (misaligned by "
-                f"{misalignment})",
-            )
 
             check_example_pkg(self, pkg)
 
+    def test_restart_keeps_alignment(self):
+        """Test that a partially received package survives a restart"""
+        self._pkg_reader.feed(EXAMPLE_RAW_PKG[0:7])
+
+        self._pkg_reader.start()
+        self._pkg_reader.stop()
+
+        self._pkg_reader.feed(EXAMPLE_RAW_PKG[7:15])
+        pkg = self._pkg_reader.next_package()
+        self.assertIsNotNone(pkg, msg="Package should be completed after restart")
+        check_example_pkg(self, pkg)
+
 
 class TestPackageParsing(unittest.TestCase):
     """Testcase for parsing of raw data packages"""
@@ -164,3 +141,171 @@ class TestPackageParsing(unittest.TestCase):
             lambda _: parse_package(change_byte_index(EXAMPLE_RAW_PKG, 7, 12)),
             "Detect changed byte index in middle of package",
         )
+
+
+class TestPackageReaderShutdown(unittest.TestCase):
+    """Testcase for starting and stopping package readers with blocking input"""
+
+    BLOCKING_TIMEOUT = 10.0
+    MAX_STOP_TIME = 0.05
+
+    def setUp(self):
+        """Set up package reader with slow blocking input"""
+        super().setUp()
+
+        self._mock_reader = MockDataReader(timeout=self.BLOCKING_TIMEOUT)
+        self._pkg_reader = PackageReader(self._mock_reader)
+
+    def tearDown(self):
+        """Make sure package reader is stopped"""
+        super().tearDown()
+
+        self._pkg_reader.stop()
+
+    def test_fast_stop(self):
+        """Test that stopping interrupts a blocking read"""
+        self._pkg_reader.start()
+
+        start = time.monotonic()
+        self._pkg_reader.stop()
+        duration = time.monotonic() - start
+
+        self.assertFalse(
+            self._pkg_reader.is_running(), msg="Reader should stop running"
+        )
+        self.assertLess(
+            duration,
+            self.MAX_STOP_TIME,
+            msg="Stopping should not wait for read timeout",
+        )
+
+    def test_idempotent_start_stop(self):
+        """Test that repeated start() and stop() calls are harmless"""
+        self._pkg_reader.stop()
+        self.assertFalse(
+            self._pkg_reader.is_running(), msg="Stopping unstarted reader does nothing"
+        )
+
+        self._pkg_reader.start()
+        self._pkg_reader.start()
+        self.assertTrue(
+            self._pkg_reader.is_running(), msg="Reader should run after start"
+        )
+
+        self._pkg_reader.stop()
+        self._pkg_reader.stop()
+        self.assertFalse(
+            self._pkg_reader.is_running(), msg="Reader should not run after stop"
+        )
+
+
+class TestFrameDecoder(unittest.TestCase):
+    """Testcase for decoding byte streams without threads or timeouts"""
+
+    def test_split_package(self):
+        """Test packages split between chunks at every position"""
+        for split in range(1, 15):
+            decoder = FrameDecoder()
+            self.assertEqual(decoder.feed(EXAMPLE_RAW_PKG[:split]), [])
+            self.assertEqual(decoder.bytes_needed(), 15 - split)
+
+            events = decoder.feed(EXAMPLE_RAW_PKG[split:])
+            self.assertEqual([e.event_type for e in events], [EventType.PACKAGE])
+            check_example_pkg(self, events[0].payload)
+            self.assertEqual(decoder.bytes_needed(), 15)
+
+    def test_many_packages(self):
+        """Test decoding many packages and garbage from a single chunk"""
+        decoder = FrameDecoder()
+        data = b"\x13\xff" + EXAMPLE_RAW_PKG * 3 + EXAMPLE_RAW_PKG[:5]
+
+        events = decoder.feed(data, timestamp=12.5)
+        self.assertEqual([e.event_type for e in events], [EventType.PACKAGE] * 3)
+        self.assertTrue(all(e.timestamp == 12.5 for e in events))
+        self.assertEqual(decoder.bytes_needed(), 10)
+
+        decoder.reset()
+        self.assertEqual(decoder.bytes_needed(), 15)
+        self.assertEqual(decoder.feed(b"\x13\x24"), [])
+        self.assertEqual(decoder.bytes_needed(), 15, msg="Skip unaligned bytes")
+
+    def test_realign(self):
+        """Test realigning after a corrupted package"""
+        decoder = FrameDecoder()
+        corrupted = change_byte_index(EXAMPLE_RAW_PKG, 7, 12)
+
+        events = decoder.feed(corrupted[:10] + EXAMPLE_RAW_PKG + corrupted[:12])
+        self.assertEqual(
+            [e.event_type for e in events], [EventType.ERROR, EventType.PACKAGE]
+        )
+        self.assertIsInstance(events[0].payload, RuntimeError)
+        check_example_pkg(self, events[1].payload)
+
+        events = decoder.feed(corrupted[12:] + EXAMPLE_RAW_PKG)
+        self.assertEqual(
+            [e.event_type for e in events], [EventType.ERROR, EventType.PACKAGE]
+        )
+
+    def test_spec(self):
+        """Test decoding with a protocol specification"""
+        layout = dict(BM257S_LAYOUT, start=0x03)
+        decoder = FrameDecoder(ProtocolSpec(layout))
+        data = b"\x03" + EXAMPLE_RAW_PKG[1:]
+
+        events = decoder.feed(EXAMPLE_RAW_PKG + data)
+        self.assertEqual([e.event_type for e in events], [EventType.PACKAGE])
+        check_example_pkg(self, events[0].payload)
+
+    def test_reader_feed(self):
+        """Test driving a package reader without its thread"""
+        reader = PackageReader(MockDataReader())
+        executor = ManualExecutor()
+        events = []
+        reader.subscribe(events.append, executor=executor)
+        handled = []
+        reader.add_package_handler(handled.append)
+
+        reader.feed(EXAMPLE_RAW_PKG[:4])
+        self.assertIsNone(reader.next_package())
+        reader.feed(EXAMPLE_RAW_PKG[4:] + change_byte_index(EXAMPLE_RAW_PKG, 3, 4))
+        executor.run_all()
+
+        check_example_pkg(self, reader.next_package())
+        self.assertEqual(len(handled), 1)
+        self.assertEqual(
+            [e.event_type for e in events], [EventType.PACKAGE, EventType.ERROR]
+        )
+        reader.close()
+
+
+class TestFrameDecoderBenchmark(unittest.TestCase):
+    """Benchmark of decoding a byte stream"""
+
+    PACKAGE_COUNT = 50000
+    RUNS = 3
+    # Several times the usual decoding time, to only catch real regressions
+    MAX_TIME_PER_PACKAGE = 15e-6
+
+    def test_throughput(self):
+        """Test decoding speed of captured data fed in large chunks"""
+        simulator = MeterSimulator([Mode.dc_voltage(ramp(-50.0, 0.01))])
+        data = simulator.packages(self.PACKAGE_COUNT)
+
+        # The fastest run is the least disturbed by other processes
+        durations = []
+        for _ in range(self.RUNS):
+            decoder = FrameDecoder()
+            start = time.perf_counter()
+            count = 0
+            for pos in range(0, len(data), 4096):
+                count += len(decoder.feed(data[pos : pos + 4096]))  # noqa: E203
+            durations.append(time.perf_counter() - start)
+
+            self.assertEqual(count, self.PACKAGE_COUNT)
+
+        time_per_package = min(durations) / self.PACKAGE_COUNT
+        self.assertLess(
+            time_per_package,
+            self.MAX_TIME_PER_PACKAGE,
+            msg=f"Decoding takes {time_per_package * 1e6:.2f}us per package",
+        )
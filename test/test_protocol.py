@@ -0,0 +1,146 @@
+"""Unit tests for protocol module"""
+
+import copy
+import json
+import os
+import random
+import tempfile
+import timeit
+import unittest
+
+from bm257s.package_reader import (
+    DEFAULT_SPEC,
+    Package,
+    PackageReader,
+    Symbol,
+    compile_package_decoder,
+    parse_dot,
+    parse_minus,
+    parse_package,
+    parse_segment,
+    parse_symbols,
+)
+from bm257s.protocol import BM257S_LAYOUT, ProtocolSpec
+
+from .helpers.mock_data_reader import MockDataReader
+from .helpers.raw_package_helpers import EXAMPLE_RAW_PKG, check_example_pkg
+
+
+def random_frame(rng, length=15):
+    """Create frame with valid byte indices and random data bits
+
+    :param rng: Random number generator
+    :type rng: random.Random
+    :param length: Frame length
+    :type length: int
+
+    :return: Raw frame
+    :rtype: bytes
+    """
+    return bytes((i << 4) | rng.randrange(16) for i in range(length))
+
+
+def interpret_frame(data, spec):
+    """Decode frame by interpreting the layout for each position
+
+    :param data: Raw frame
+    :type data: bytes
+    :param spec: Protocol specification
+    :type spec: bm257s.protocol.ProtocolSpec
+
+    :return: Decoded package
+    :rtype: bm257s.package_reader.Package
+    """
+    return Package(
+        [parse_segment(data, i, spec) for i in range(len(spec.segments))],
+        [parse_dot(data, i, spec) for i in range(len(spec.dots))],
+        parse_minus(data, spec),
+        set(parse_symbols(data, spec)),
+    )
+
+
+class TestCompiledDecoder(unittest.TestCase):
+    """Testcase for decoders compiled from protocol specifications"""
+
+    def assert_same_package(self, pkg, expected):
+        """Assert that two packages have the same content"""
+        self.assertListEqual(list(pkg.segments), list(expected.segments))
+        self.assertListEqual(list(pkg.dots), list(expected.dots))
+        self.assertEqual(pkg.minus, expected.minus)
+        self.assertSetEqual(pkg.symbols, expected.symbols)
+
+    def test_matches_layout(self):
+        """Test compiled decoder against interpretation of the layout"""
+        rng = random.Random(257)
+        for _ in range(500):
+            data = random_frame(rng)
+            self.assert_same_package(
+                parse_package(data), interpret_frame(data, DEFAULT_SPEC)
+            )
+
+    def test_example_package(self):
+        """Test compiled decoder with example package"""
+        check_example_pkg(self, parse_package(EXAMPLE_RAW_PKG))
+        check_example_pkg(self, parse_package(bytearray(EXAMPLE_RAW_PKG)))
+
+    def test_invalid_length(self):
+        """Test that frames of wrong length are rejected"""
+        self.assertRaises(RuntimeError, parse_package, EXAMPLE_RAW_PKG[0:14])
+        self.assertRaises(RuntimeError, parse_package, EXAMPLE_RAW_PKG + b"\x00")
+
+    def test_other_model(self):
+        """Test reading packages of a model with different layout from JSON"""
+        layout = copy.deepcopy(BM257S_LAYOUT)
+        layout["model"] = "Swapped"
+        layout["symbols"]["AC"], layout["symbols"]["DC"] = (
+            layout["symbols"]["DC"],
+            layout["symbols"]["AC"],
+        )
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "swapped.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(layout, f)
+            spec = ProtocolSpec.load(path)
+
+        pkg = compile_package_decoder(spec)(EXAMPLE_RAW_PKG)
+        self.assertIn(Symbol.DC, pkg.symbols, msg="AC bit is DC in swapped layout")
+        self.assertNotIn(Symbol.AC, pkg.symbols)
+
+        mock_reader = MockDataReader(timeout=1.0)
+        pkg_reader = PackageReader(mock_reader, spec=spec)
+        try:
+            pkg_reader.start()
+            mock_reader.set_next_data(EXAMPLE_RAW_PKG)
+            self.assertTrue(pkg_reader.wait_for_package(1.0))
+            self.assertIn(Symbol.DC, pkg_reader.next_package().symbols)
+        finally:
+            pkg_reader.close()
+
+    def test_invalid_layouts(self):
+        """Test validation of layouts"""
+        self.assertRaises(RuntimeError, ProtocolSpec.for_model, "BM000")
+
+        missing = copy.deepcopy(BM257S_LAYOUT)
+        del missing["minus"]
+        self.assertRaises(RuntimeError, ProtocolSpec, missing)
+
+        duplicate = copy.deepcopy(BM257S_LAYOUT)
+        duplicate["minus"] = [5, 0]
+        self.assertRaises(RuntimeError, ProtocolSpec, duplicate)
+
+        out_of_range = copy.deepcopy(BM257S_LAYOUT)
+        out_of_range["symbols"]["AUTO"] = [15, 0]
+        self.assertRaises(RuntimeError, ProtocolSpec, out_of_range)
+
+        unknown_symbol = copy.deepcopy(BM257S_LAYOUT)
+        unknown_symbol["symbols"]["DIODE"] = unknown_symbol["symbols"].pop("LOZ")
+        self.assertRaises(RuntimeError, ProtocolSpec, unknown_symbol)
+
+    def test_decoding_speed(self):
+        """Test that compiled decoding is faster than interpreting the layout"""
+        compiled = timeit.timeit(lambda: parse_package(EXAMPLE_RAW_PKG), number=2000)
+        interpreted = timeit.timeit(
+            lambda: interpret_frame(EXAMPLE_RAW_PKG, DEFAULT_SPEC), number=2000
+        )
+        self.assertLess(compiled, interpreted)
@@ -0,0 +1,248 @@
+"""Unit tests for rules module"""
+
+import time
+import unittest
+
+from bm257s.measurement import Measurement, VoltageMeasurement
+from bm257s.package_encoder import display_package, format_value
+from bm257s.package_reader import PackageReader, Symbol
+from bm257s.rules import Rule, RuleEngine
+from bm257s.subscription import EventType
+
+from .helpers.manual_executor import ManualExecutor
+from .helpers.mock_data_reader import MockDataReader
+from .helpers.raw_package_helpers import EXAMPLE_RAW_PKG
+
+DC_VOLT = {Symbol.AUTO, Symbol.DC, Symbol.VOLT}
+AC_VOLT = {Symbol.AUTO, Symbol.AC, Symbol.VOLT}
+
+
+def dc_voltage(display, *extra_symbols):
+    """Create package of DC voltage measurement
+
+    :param display: Segment display content
+    :type display: str
+
+    :return: Package showing a DC voltage in volts
+    :rtype: bm257s.package_reader.Package
+    """
+    return display_package(display, DC_VOLT | set(extra_symbols))
+
+
+class TestRuleEngine(unittest.TestCase):
+    """Testcase for evaluation of alert rules"""
+
+    def _states(self, engine, packages):
+        return [
+            [(alert.rule.name, alert.active) for alert in engine.process(pkg)]
+            for pkg in packages
+        ]
+
+    def test_limits_with_hysteresis(self):
+        """Test limit violation and hysteresis when clearing"""
+        engine = RuleEngine(
+            [Rule("limit", low=1.0, high=5.0, hysteresis=0.5, allow_overload=True)]
+        )
+        states = self._states(
+            engine,
+            [
+                dc_voltage("3.000"),
+                dc_voltage("5.100"),
+                dc_voltage("4.800"),
+                dc_voltage("4.400"),
+                dc_voltage("0.900"),
+            ],
+        )
+        self.assertListEqual(
+            states,
+            [[], [("limit", True)], [], [("limit", False)], [("limit", True)]],
+        )
+
+    def test_hysteresis_of_limits_only(self):
+        """Test that hysteresis does not apply to violations of other conditions"""
+        engine = RuleEngine(
+            [
+                Rule(
+                    "limit",
+                    low=1.0,
+                    high=5.0,
+                    hysteresis=0.5,
+                    forbidden_symbols={Symbol.HOLD},
+                )
+            ]
+        )
+        states = self._states(
+            engine,
+            [
+                dc_voltage("4.800"),
+                dc_voltage("4.800", Symbol.HOLD),
+                dc_voltage("4.800"),
+            ],
+        )
+        self.assertListEqual(states, [[], [("limit", True)], [("limit", False)]])
+
+    def test_si_limits(self):
+        """Test that limits are compared in SI base units"""
+        engine = RuleEngine([Rule("limit", high=0.5)])
+        alerts = engine.process(display_package("600.0", DC_VOLT | {Symbol.MILLI}))
+        self.assertEqual(len(alerts), 1, msg="600mV should exceed 0.5V")
+
+    def test_debounce(self):
+        """Test that state changes need consecutive samples"""
+        engine = RuleEngine([Rule("limit", high=5.0, debounce=3)])
+        states = self._states(
+            engine,
+            [
+                dc_voltage("6.000"),
+                dc_voltage("6.000"),
+                dc_voltage("3.000"),
+                dc_voltage("6.000"),
+                dc_voltage("6.000"),
+                dc_voltage("6.000"),
+            ],
+        )
+        self.assertListEqual(states, [[], [], [], [], [], [("limit", True)]])
+
+    def test_mode_conditions(self):
+        """Test quantity, current and overload conditions"""
+        engine = RuleEngine(
+            [
+                Rule(
+                    "dc",
+                    quantity=Measurement.VOLTAGE,
+                    current=VoltageMeasurement.CURRENT_DC,
+                )
+            ]
+        )
+        self.assertListEqual(engine.process(dc_voltage("1.000")), [])
+
+        alerts = engine.process(display_package("1.000", AC_VOLT))
+        self.assertEqual(len(alerts), 1, msg="AC should violate DC rule")
+        self.assertIn("current", alerts[0].reason)
+
+        self.assertEqual(len(engine.process(dc_voltage("1.000"))), 1)
+
+        alerts = engine.process(dc_voltage(" 0.L "))
+        self.assertEqual(alerts[0].reason, "overload", msg="Detect overload")
+
+    def test_reason_change(self):
+        """Test that a different failing condition of an active rule is reported"""
+        engine = RuleEngine([Rule("limit", high=5.0)])
+        alerts = engine.process(dc_voltage("6.000"))
+        self.assertIn("value", alerts[0].reason)
+
+        self.assertListEqual(engine.process(dc_voltage("7.000")), [])
+
+        alerts = engine.process(dc_voltage(" 0.L "))
+        self.assertEqual(len(alerts), 1)
+        self.assertTrue(alerts[0].active)
+        self.assertEqual(alerts[0].reason, "overload")
+
+        self.assertListEqual(engine.process(dc_voltage(" 0.L ")), [])
+        self.assertFalse(engine.process(dc_voltage("1.000"))[0].active)
+
+    def test_symbol_conditions(self):
+        """Test required and forbidden symbols"""
+        engine = RuleEngine(
+            [
+                Rule("battery", forbidden_symbols={Symbol.BATTERY, Symbol.HOLD}),
+                Rule("auto", required_symbols={Symbol.AUTO}),
+            ]
+        )
+        states = self._states(
+            engine,
+            [
+                dc_voltage("1.000"),
+                dc_voltage("1.000", Symbol.BATTERY),
+                display_package("1.000", {Symbol.DC, Symbol.VOLT}),
+            ],
+        )
+        self.assertListEqual(
+            states,
+            [[], [("battery", True)], [("battery", False), ("auto", True)]],
+        )
+
+    def test_invalid_rules(self):
+        """Test that invalid rule declarations are rejected"""
+        self.assertRaises(RuntimeError, Rule, "debounce", debounce=0)
+        self.assertRaises(RuntimeError, Rule, "limits", low=2.0, high=1.0)
+
+    def test_alert_events(self):
+        """Test that alerts get published to subscribers"""
+        engine = RuleEngine([Rule("limit", high=5.0)])
+        executor = ManualExecutor()
+        received = []
+        engine.subscribe(received.append, executor=executor)
+
+        engine.process(dc_voltage("6.000"))
+        self.assertListEqual(received, [], msg="Alerts should not block processing")
+
+        executor.run_all()
+        self.assertEqual(len(received), 1)
+        self.assertEqual(received[0].event_type, EventType.ALERT)
+        self.assertTrue(received[0].payload.active)
+
+    def test_attach(self):
+        """Test rule evaluation on the reading thread of a package reader"""
+        mock_reader = MockDataReader(timeout=1.0)
+        pkg_reader = PackageReader(mock_reader)
+        engine = RuleEngine([Rule("limit", high=100.0)])
+        engine.attach(pkg_reader)
+
+        executor = ManualExecutor()
+        received = []
+        engine.subscribe(received.append, executor=executor)
+        try:
+            pkg_reader.start()
+            mock_reader.set_next_data(EXAMPLE_RAW_PKG)
+            self.assertTrue(pkg_reader.wait_for_package(1.0))
+        finally:
+            # Package handlers are done when the reading thread ended
+            pkg_reader.close()
+
+        engine.detach(pkg_reader)
+        executor.run_all()
+
+        self.assertEqual(len(received), 1, msg="513.6V should violate rule")
+        self.assertEqual(received[0].event_type, EventType.ALERT)
+        self.assertTrue(received[0].payload.active)
+        self.assertEqual(received[0].payload.sample.value, 513.6)
+
+
+class TestRuleEngineBenchmark(unittest.TestCase):
+    """Benchmark of rule evaluation with many rules"""
+
+    RULE_COUNT = 500
+    SAMPLE_COUNT = 200
+    MAX_TIME_PER_RULE = 5e-6
+
+    def test_many_rules(self):
+        """Test evaluation speed of hundreds of rules at maximum package rate"""
+        rules = []
+        for i in range(self.RULE_COUNT):
+            rules.append(
+                Rule(
+                    f"rule {i}",
+                    quantity=Measurement.VOLTAGE,
+                    current=VoltageMeasurement.CURRENT_DC,
+                    low=float(i % 10),
+                    high=float(i % 10) + 2.0,
+                    hysteresis=0.1,
+                    debounce=2,
+                    forbidden_symbols={Symbol.BATTERY, Symbol.HOLD},
+                )
+            )
+        engine = RuleEngine(rules)
+        packages = [dc_voltage(format_value(i % 12)) for i in range(self.SAMPLE_COUNT)]
+
+        start = time.perf_counter()
+        for pkg in packages:
+            engine.process(pkg)
+        duration = time.perf_counter() - start
+
+        time_per_rule = duration / (self.SAMPLE_COUNT * self.RULE_COUNT)
+        self.assertLess(
+            time_per_rule,
+            self.MAX_TIME_PER_RULE,
+            msg=f"Rule evaluation takes {time_per_rule * 1e6:.2f}us per rule",
+        )
@@ -0,0 +1,167 @@
+"""Unit tests for simulator module"""
+
+import os
+import time
+import unittest
+
+from bm257s.measurement import Measurement, VoltageMeasurement
+from bm257s.package_parser import parse_package as parse_measurement
+from bm257s.package_reader import PackageReader, parse_package
+from bm257s.simulator import MeterSimulator, Mode, constant, ramp, sine, square
+from bm257s.subscription import EventType
+
+from .helpers.manual_executor import ManualExecutor
+
+
+def measurements(simulator, count):
+    """Read measurements from the raw packages of a simulator
+
+    :param simulator: Simulator to read from
+    :type simulator: bm257s.simulator.MeterSimulator
+    :param count: Number of measurements
+    :type count: int
+
+    :return: List of (quantity, measurement) tuples
+    :rtype: list
+    """
+    return [
+        parse_measurement(parse_package(simulator.next_package())) for _ in range(count)
+    ]
+
+
+class TestMeterSimulator(unittest.TestCase):
+    """Testcase for simulated multimeters"""
+
+    def test_waveforms(self):
+        """Test waveform functions"""
+        self.assertEqual(constant(1.5)(10.0), 1.5)
+        self.assertAlmostEqual(sine(2.0, 0.25, 1.0)(1.0), 3.0)
+        self.assertEqual(square(0.0, 1.0, 1.0)(0.25), 1.0)
+        self.assertEqual(square(0.0, 1.0, 1.0)(0.75), 0.0)
+        self.assertEqual(ramp(1.0, 2.0)(3.0), 7.0)
+
+    def test_mode_switches(self):
+        """Test cycling through modes on the simulated clock"""
+        simulator = MeterSimulator(
+            [
+                Mode.dc_voltage(ramp(0.0, 1.0), duration=1.0),
+                Mode.ac_voltage(constant(230.0), duration=0.4),
+            ],
+            rate=5.0,
+        )
+        result = measurements(simulator, 10)
+
+        currents = [m.current for (_, m) in result]
+        self.assertListEqual(
+            currents,
+            [VoltageMeasurement.CURRENT_DC] * 5
+            + [VoltageMeasurement.CURRENT_AC] * 2
+            + [VoltageMeasurement.CURRENT_DC] * 3,
+        )
+        self.assertAlmostEqual(result[3][1].value, 0.6)
+        self.assertAlmostEqual(result[5][1].value, 230.0)
+        self.assertAlmostEqual(simulator.sim_time(), 2.0)
+
+    def test_noise(self):
+        """Test that noise is reproducible by seed"""
+        modes = [Mode.dc_voltage(constant(1.0))]
+        first = measurements(MeterSimulator(modes, noise=0.01, seed=3), 20)
+        second = measurements(MeterSimulator(modes, noise=0.01, seed=3), 20)
+
+        values = [m.value for (_, m) in first]
+        self.assertListEqual(values, [m.value for (_, m) in second])
+        self.assertGreater(len(set(values)), 1, msg="Noise should change values")
+        for value in values:
+            self.assertAlmostEqual(value, 1.0, delta=0.1)
+
+    def test_out_of_range(self):
+        """Test that values the display cannot show are shown as overload"""
+        simulator = MeterSimulator(
+            [
+                Mode.temperature(ramp(990.0, 10.0), duration=2.0),
+                Mode.dc_voltage(constant(float("nan")), duration=0.2),
+                Mode.ac_voltage(constant(float("inf")), duration=0.2),
+            ],
+            rate=5.0,
+        )
+        packages = [parse_package(simulator.next_package()) for _ in range(12)]
+
+        displays = [pkg.segment_string() for pkg in packages[:10]]
+        self.assertListEqual(displays[:5], ["990C", "992C", "994C", "996C", "998C"])
+        self.assertListEqual(displays[5:], ["---C"] * 5)
+        for pkg in packages[10:]:
+            self.assertTrue(pkg.is_overload(), msg="Invalid values are overload")
+
+    def test_corruption(self):
+        """Test that readers recover from corrupted packages"""
+        simulator = MeterSimulator(corruption=0.2, seed=4, timeout=0.0)
+        pkg_reader = PackageReader(simulator)
+        executor = ManualExecutor()
+        events = []
+        pkg_reader.subscribe(events.append, executor=executor)
+
+        pkg_reader.start()
+        deadline = time.monotonic() + 5.0
+        while simulator.sim_time() < 200.0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        pkg_reader.stop()
+        executor.run_all()
+        pkg_reader.close()
+
+        types = [event.event_type for event in events]
+        self.assertGreater(types.count(EventType.PACKAGE), 0)
+        self.assertGreater(types.count(EventType.ERROR), 0)
+
+    def test_realtime(self):
+        """Test producing packages at the configured rate"""
+        simulator = MeterSimulator(rate=50.0, realtime=True)
+        pkg_reader = PackageReader(simulator)
+
+        start = time.monotonic()
+        pkg_reader.start()
+        for _ in range(5):
+            self.assertTrue(pkg_reader.wait_for_package(1.0))
+            pkg_reader.next_package()
+        duration = time.monotonic() - start
+
+        stop_start = time.monotonic()
+        pkg_reader.close()
+        self.assertLess(time.monotonic() - stop_start, 0.05, msg="Reads cancellable")
+        self.assertGreater(duration, 0.07, msg="Packages should be paced")
+
+    def test_max_rate(self):
+        """Test generating packages as fast as possible"""
+        simulator = MeterSimulator(
+            [
+                Mode.dc_voltage(sine(5.0, 1.0), duration=1.0),
+                Mode.resistance(constant(None)),
+            ]
+        )
+        data = simulator.packages(1000)
+        self.assertEqual(len(data), 15000)
+
+    @unittest.skipUnless(hasattr(os, "openpty"), "Needs pseudo terminals")
+    def test_pty(self):
+        """Test reading packages from a pseudo terminal"""
+        simulator = MeterSimulator(
+            [Mode.dc_voltage(constant(12.5))], rate=100.0, realtime=True
+        )
+        path = simulator.open_pty()
+        try:
+            fd = os.open(path, os.O_RDONLY | os.O_NOCTTY)
+            try:
+                data = b""
+                deadline = time.monotonic() + 2.0
+                while len(data) < 45 and time.monotonic() < deadline:
+                    data += os.read(fd, 45)
+            finally:
+                os.close(fd)
+        finally:
+            simulator.close_pty()
+
+        start = data.index(0x02)
+        quantity, measurement = parse_measurement(
+            parse_package(data[start : start + 15])  # noqa: E203
+        )
+        self.assertEqual(quantity, Measurement.VOLTAGE)
+        self.assertEqual(measurement.value, 12.5)
@@ -0,0 +1,230 @@
+"""Unit tests for storage module"""
+
+import math
+import os
+import tempfile
+import time
+import unittest
+
+from bm257s.measurement import Measurement, VoltageMeasurement
+from bm257s.storage import SQLiteStore
+from bm257s.subscription import EventType, Publisher
+
+
+class TestSQLiteStore(unittest.TestCase):
+    """Testcase for storing measurements in SQLite"""
+
+    TIMEOUT = 5.0
+    START = 1600000000.0
+
+    def setUp(self):
+        """Create store in temporary directory"""
+        super().setUp()
+
+        self._tmp_dir = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        self._path = os.path.join(self._tmp_dir.name, "meters.db")
+        self._store = SQLiteStore(self._path, flush_interval=0.01)
+
+    def tearDown(self):
+        """Close store and remove temporary directory"""
+        super().tearDown()
+
+        self._store.close()
+        self._tmp_dir.cleanup()
+
+    def test_raw_query(self):
+        """Test querying raw samples of a series"""
+        for i in range(10):
+            self._store.add("meter1", Measurement.VOLTAGE, self.START + i, float(i))
+        self._store.add("meter1", Measurement.VOLTAGE, self.START + 10, None)
+        self._store.add("meter2", Measurement.VOLTAGE, self.START, 42.0)
+        self.assertTrue(self._store.flush(self.TIMEOUT))
+
+        result = self._store.query(
+            "meter1", Measurement.VOLTAGE, self.START + 2, self.START + 20
+        )
+        self.assertListEqual(
+            list(result["timestamp"]), [self.START + i for i in range(2, 11)]
+        )
+        self.assertListEqual(
+            list(result["value"])[:-1], [float(i) for i in range(2, 10)]
+        )
+        self.assertTrue(math.isnan(result["value"][-1]), msg="Missing value is NaN")
+
+        self.assertListEqual(
+            self._store.series(),
+            [("meter1", Measurement.VOLTAGE), ("meter2", Measurement.VOLTAGE)],
+        )
+
+    def test_rollups(self):
+        """Test aggregation into rollup tables across batches"""
+        for i in range(240):
+            self._store.add("meter", Measurement.VOLTAGE, self.START + i * 0.5, i)
+            if i % 50 == 0:
+                self._store.flush(self.TIMEOUT)
+        self.assertTrue(self._store.flush(self.TIMEOUT))
+
+        seconds = self._store.query(
+            "meter", Measurement.VOLTAGE, self.START, self.START + 2, resolution="1s"
+        )
+        self.assertListEqual(list(seconds["count"]), [2, 2])
+        self.assertListEqual(list(seconds["mean"]), [0.5, 2.5])
+
+        minutes = self._store.query(
+            "meter", Measurement.VOLTAGE, self.START, self.START + 3600, resolution="1m"
+        )
+        self.assertEqual(sum(minutes["count"]), 240)
+        self.assertEqual(min(minutes["min"]), 0)
+        self.assertEqual(max(minutes["max"]), 239)
+        self.assertAlmostEqual(
+            sum(m * c for m, c in zip(minutes["mean"], minutes["count"])),
+            sum(range(240)),
+        )
+
+        self.assertRaises(
+            RuntimeError,
+            self._store.query,
+            "meter",
+            Measurement.VOLTAGE,
+            self.START,
+            self.START + 1,
+            resolution="1d",
+        )
+
+    def test_attach(self):
+        """Test storing measurement events of a source"""
+        publisher = Publisher()
+        self._store.attach(publisher, "meter")
+        publisher.publish(
+            EventType.MEASUREMENT,
+            (
+                Measurement.VOLTAGE,
+                VoltageMeasurement(
+                    12.0, VoltageMeasurement.CURRENT_DC, Measurement.PREFIX_MILLI
+                ),
+            ),
+            self.START,
+        )
+        publisher.publish(EventType.CONNECTION, False)
+
+        deadline = time.monotonic() + self.TIMEOUT
+        while time.monotonic() < deadline:
+            self._store.flush(self.TIMEOUT)
+            result = self._store.query(
+                "meter", Measurement.VOLTAGE, self.START, self.START + 1
+            )
+            if len(result["value"]) > 0:
+                break
+            time.sleep(0.01)
+        publisher.close()
+
+        self.assertListEqual(list(result["timestamp"]), [self.START])
+        self.assertAlmostEqual(result["value"][0], 0.012, msg="Values stored in SI")
+
+    def test_flush_interval(self):
+        """Test that a steady stream of samples gets written within the interval"""
+        interval = 0.2
+        self._store.close()
+        self._store = SQLiteStore(self._path, flush_interval=interval)
+
+        start = time.monotonic()
+        for i in range(10):
+            self._store.add("meter", Measurement.VOLTAGE, self.START + i, float(i))
+            time.sleep(interval / 4)
+
+            result = self._store.query(
+                "meter", Measurement.VOLTAGE, self.START, self.START + 10
+            )
+            if len(result["value"]) > 0:
+                break
+
+        self.assertGreater(len(result["value"]), 0, msg="Samples should get written")
+        self.assertLess(time.monotonic() - start, 3 * interval)
+
+    def test_failed_write(self):
+        """Test that a batch failing to write does not stop the writer"""
+        with self.assertLogs("bm257s.storage"):
+            self._store.add("meter", Measurement.VOLTAGE, self.START, object())
+            self.assertTrue(self._store.flush(self.TIMEOUT))
+
+        self._store.add("meter", Measurement.VOLTAGE, self.START + 1, 1.0)
+        self.assertTrue(self._store.flush(self.TIMEOUT))
+        result = self._store.query(
+            "meter", Measurement.VOLTAGE, self.START, self.START + 2
+        )
+        self.assertListEqual(list(result["value"]), [1.0])
+
+    def test_closed(self):
+        """Test that using a closed store raises instead of blocking"""
+        self._store.close()
+        self._store.close()
+
+        self.assertRaises(
+            RuntimeError, self._store.add, "meter", Measurement.VOLTAGE, self.START, 1.0
+        )
+        self.assertRaises(RuntimeError, self._store.flush)
+
+    def test_reopen(self):
+        """Test that stored data survives closing the store"""
+        self._store.add("meter", Measurement.VOLTAGE, self.START, 1.0)
+        self._store.close()
+
+        self._store = SQLiteStore(self._path)
+        result = self._store.query(
+            "meter", Measurement.VOLTAGE, self.START, self.START + 1, resolution="1h"
+        )
+        self.assertListEqual(list(result["count"]), [1])
+
+
+class TestSQLiteStoreBenchmark(unittest.TestCase):
+    """Benchmark of writing and querying many series"""
+
+    METERS = 20
+    SAMPLES_PER_METER = 3600
+    MAX_WRITE_TIME = 5.0
+    # A month of samples, one every 10 seconds
+    MONTH = 30 * 24 * 3600
+    MONTH_INTERVAL = 10.0
+    MAX_QUERY_TIME = 0.05
+
+    def test_many_meters(self):
+        """Test write throughput of many meters at full frame rate"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with SQLiteStore(os.path.join(tmp_dir, "bench.db")) as store:
+                start = time.perf_counter()
+                for i in range(self.SAMPLES_PER_METER):
+                    for meter in range(self.METERS):
+                        store.add(f"m{meter}", Measurement.VOLTAGE, i * 0.25, 1.0)
+                store.flush()
+                write_time = time.perf_counter() - start
+
+                result = store.query(
+                    "m0", Measurement.VOLTAGE, 0.0, 1e9, resolution="1m"
+                )
+
+        self.assertEqual(sum(result["count"]), self.SAMPLES_PER_METER)
+        self.assertLess(write_time, self.MAX_WRITE_TIME)
+
+    def test_month_query(self):
+        """Test rollup query speed over a month of data"""
+        count = int(self.MONTH / self.MONTH_INTERVAL)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with SQLiteStore(
+                os.path.join(tmp_dir, "bench.db"), batch_size=10000
+            ) as store:
+                for i in range(count):
+                    store.add(
+                        "meter", Measurement.VOLTAGE, i * self.MONTH_INTERVAL, 1.0
+                    )
+                store.add("other", Measurement.VOLTAGE, 0.0, 1.0)
+                store.flush()
+
+                start = time.perf_counter()
+                result = store.query(
+                    "meter", Measurement.VOLTAGE, 0.0, self.MONTH, resolution="1h"
+                )
+                query_time = time.perf_counter() - start
+
+        self.assertEqual(len(result["count"]), self.MONTH // 3600)
+        self.assertEqual(sum(result["count"]), count)
+        self.assertLess(query_time, self.MAX_QUERY_TIME)
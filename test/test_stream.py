@@ -0,0 +1,312 @@
+"""Unit tests for stream module"""
+
+import asyncio
+import threading
+import time
+import unittest
+
+from bm257s.measurement import (
+    Measurement,
+    ResistanceMeasurement,
+    TemperatureMeasurement,
+    VoltageMeasurement,
+)
+from bm257s.stream import AsyncStream, Stream
+from bm257s.subscription import Event, EventType, Publisher
+
+
+def voltage(value, timestamp, prefix=Measurement.PREFIX_NONE):
+    """Create a DC voltage measurement event
+
+    :param value: Measured value
+    :type value: float
+    :param timestamp: Time of measurement
+    :type timestamp: float
+    :param prefix: Metric prefix of measurement
+    :type prefix: str
+
+    :return: Measurement event
+    :rtype: bm257s.subscription.Event
+    """
+    return Event(
+        EventType.MEASUREMENT,
+        (
+            Measurement.VOLTAGE,
+            VoltageMeasurement(value, VoltageMeasurement.CURRENT_DC, prefix),
+        ),
+        timestamp,
+    )
+
+
+def mixed_events(count):
+    """Create alternating voltage and temperature events with an error in between
+
+    :param count: Number of events
+    :type count: int
+
+    :return: List of events, ten per second
+    :rtype: list
+    """
+    events = []
+    for i in range(count):
+        if i % 10 == 5:
+            events.append(Event(EventType.ERROR, RuntimeError("bad package"), i / 10))
+        elif i % 2 == 0:
+            events.append(voltage(float(i), i / 10, Measurement.PREFIX_MILLI))
+        else:
+            events.append(
+                Event(
+                    EventType.MEASUREMENT,
+                    (
+                        Measurement.TEMPERATURE,
+                        TemperatureMeasurement(TemperatureMeasurement.UNIT_CELSIUS, i),
+                    ),
+                    i / 10,
+                )
+            )
+    return events
+
+
+class TestStream(unittest.TestCase):
+    """Testcase for synchronous streams"""
+
+    def test_pipeline(self):
+        """Test filtering, normalizing and windowing"""
+        events = list(
+            Stream(mixed_events(40))
+            .filter(quantity=Measurement.VOLTAGE)
+            .normalize()
+            .window(1.0)
+        )
+
+        errors = [e for e in events if e.event_type is EventType.ERROR]
+        windows = [e for e in events if e.event_type is EventType.MEASUREMENT]
+        self.assertEqual(len(errors), 4)
+        self.assertEqual([w.timestamp for w in windows], [0.0, 1.0, 2.0, 3.0])
+        self.assertEqual(
+            windows[1].payload,
+            [(Measurement.VOLTAGE, v * 1e-3) for v in (10, 12, 14, 16, 18)],
+        )
+
+    def test_batch(self):
+        """Test fixed size batches"""
+        batches = list(Stream(voltage(i, i) for i in range(10)).batch(4).payloads())
+        self.assertEqual([len(b) for b in batches], [4, 4, 2])
+        self.assertEqual(batches[2][1][1].value, 9)
+
+    def test_lazy(self):
+        """Test that events are only pulled when needed"""
+        pulled = []
+
+        def source():
+            for i in range(1000):
+                pulled.append(i)
+                yield voltage(i, i)
+
+        stream = Stream(source()).map(lambda p: p[1].value).filter(lambda v: v % 2)
+        self.assertEqual(pulled, [])
+        self.assertEqual(list(stream.take(3).payloads()), [1, 3, 5])
+        self.assertEqual(len(pulled), 6)
+
+    def test_fusion(self):
+        """Test that adjacent map and filter stages run in a single generator"""
+        stream = (
+            Stream([voltage(1.0, 0.0)])
+            .filter(quantity=Measurement.VOLTAGE)
+            .normalize()
+            .map(lambda p: p[1])
+            .filter(lambda v: v > 0)
+        )
+        iterator = iter(stream)
+        self.assertEqual(iterator.gi_code.co_name, "_run_step")
+        self.assertNotIn("gi_code", dir(iterator.gi_frame.f_locals["events"]))
+        self.assertEqual([e.payload for e in iterator], [1.0])
+
+    def test_errors_as_values(self):
+        """Test that failing stages produce error events and continue"""
+        events = list(
+            Stream(
+                [
+                    voltage(1.0, 0.0),
+                    Event(
+                        EventType.MEASUREMENT,
+                        (Measurement.RESISTANCE, ResistanceMeasurement(None)),
+                        1.0,
+                    ),
+                    voltage(2.0, 2.0),
+                ]
+            )
+            .normalize()
+            .map(lambda p: 1.0 / p[1])
+        )
+        self.assertEqual(
+            [e.event_type for e in events],
+            [EventType.MEASUREMENT, EventType.ERROR, EventType.MEASUREMENT],
+        )
+        self.assertIsInstance(events[1].payload, TypeError)
+        self.assertEqual(events[1].timestamp, 1.0)
+
+        stream = Stream(mixed_events(10)).raise_errors()
+        self.assertRaises(RuntimeError, list, stream)
+
+
+class TestLiveStream(unittest.TestCase):
+    """Testcase for streams subscribed to a source"""
+
+    def setUp(self):
+        self.publisher = Publisher()
+
+    def tearDown(self):
+        self.publisher.close()
+
+    def _publish(self, count, delay=0.0):
+        def run():
+            for i in range(count):
+                time.sleep(delay)
+                self.publisher.publish(*_event_args(voltage(i, i)))
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def test_subscribe(self):
+        """Test iterating a live source and unsubscribing when done"""
+        stream = Stream.subscribe(self.publisher, max_queue=1000)
+        self.assertFalse(self.publisher.has_subscriptions(), msg="Subscribe lazily")
+
+        iterator = iter(stream.map(lambda p: p[1].value).take(5).payloads())
+        thread = self._publish(10, delay=0.02)
+        self.assertEqual(next(iterator), 0)
+        self.assertTrue(self.publisher.has_subscriptions())
+
+        self.assertEqual(list(iterator), [1, 2, 3, 4])
+        thread.join()
+        self.assertFalse(self.publisher.has_subscriptions())
+
+    def test_subscribe_first_value(self):
+        """Test that the first value published after subscribing is received"""
+        iterator = iter(Stream.subscribe(self.publisher, max_queue=1000))
+        thread = self._publish(1, delay=0.1)
+        self.assertEqual(next(iterator).payload[1].value, 0)
+        iterator.close()
+        thread.join()
+
+    def test_backpressure(self):
+        """Test that a slow consumer never blocks the source"""
+        iterator = iter(Stream.subscribe(self.publisher, max_queue=4).payloads())
+        thread = self._publish(1, delay=0.1)
+        self.assertEqual(next(iterator)[1].value, 0)
+        thread.join()
+
+        start = time.perf_counter()
+        for i in range(1, 1001):
+            self.publisher.publish(*_event_args(voltage(i, i)))
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+        time.sleep(0.1)
+        values = [next(iterator)[1].value for _ in range(4)]
+        iterator.close()
+        self.assertEqual(values, [1, 2, 3, 1000], msg="Newest value is kept")
+        self.assertFalse(self.publisher.has_subscriptions())
+
+
+def _event_args(event):
+    return (event.event_type, event.payload, event.timestamp)
+
+
+class TestAsyncStream(unittest.TestCase):
+    """Testcase for asynchronous streams"""
+
+    def test_pipeline(self):
+        """Test the same operators as synchronous streams"""
+
+        async def collect():
+            stream = (
+                AsyncStream(mixed_events(40))
+                .filter(quantity=Measurement.VOLTAGE)
+                .normalize()
+                .window(1.0)
+                .batch(2)
+                .take(3)
+            )
+            return [e async for e in stream]
+
+        events = asyncio.run(collect())
+        sync_events = list(
+            Stream(mixed_events(40))
+            .filter(quantity=Measurement.VOLTAGE)
+            .normalize()
+            .window(1.0)
+            .batch(2)
+            .take(3)
+        )
+        self.assertEqual(
+            [(e.event_type, repr(e.payload)) for e in events],
+            [(e.event_type, repr(e.payload)) for e in sync_events],
+        )
+
+        async def collect_raising():
+            return [e async for e in AsyncStream(mixed_events(10)).raise_errors()]
+
+        self.assertRaises(RuntimeError, asyncio.run, collect_raising())
+
+    def test_subscribe(self):
+        """Test iterating a live source without blocking the event loop"""
+        publisher = Publisher()
+
+        async def collect():
+            stream = AsyncStream.subscribe(publisher).map(lambda p: p[1].value)
+            values = []
+            async for value in stream.take(3).payloads():
+                values.append(value)
+                if len(values) == 1:
+                    for i in range(1, 3):
+                        publisher.publish(*_event_args(voltage(i, i)))
+            return values
+
+        async def main():
+            task = asyncio.create_task(collect())
+            while not publisher.has_subscriptions():
+                await asyncio.sleep(0.001)
+            publisher.publish(*_event_args(voltage(0, 0)))
+            return await asyncio.wait_for(task, 2.0)
+
+        self.assertEqual(asyncio.run(main()), [0, 1, 2])
+        self.assertFalse(publisher.has_subscriptions())
+        publisher.close()
+
+
+class TestStreamBenchmark(unittest.TestCase):
+    """Benchmark of pipeline overhead per sample"""
+
+    SAMPLE_COUNT = 100000
+    RUNS = 3
+    MAX_TIME_PER_SAMPLE = 5e-6
+
+    def test_overhead(self):
+        """Test overhead of a typical pipeline per sample"""
+        events = mixed_events(self.SAMPLE_COUNT)
+
+        # The fastest run is the least disturbed by other processes
+        durations = []
+        for _ in range(self.RUNS):
+            start = time.perf_counter()
+            count = 0
+            for _ in (
+                Stream(events)
+                .filter(quantity=Measurement.VOLTAGE)
+                .normalize()
+                .window(1.0)
+                .batch(1000)
+            ):
+                count += 1
+            durations.append(time.perf_counter() - start)
+
+            self.assertGreater(count, 0)
+
+        time_per_sample = min(durations) / self.SAMPLE_COUNT
+        self.assertLess(
+            time_per_sample,
+            self.MAX_TIME_PER_SAMPLE,
+            msg=f"Pipeline takes {time_per_sample * 1e6:.2f}us per sample",
+        )
@@ -0,0 +1,258 @@
+"""Unit tests for subscription module"""
+
+import asyncio
+import concurrent.futures
+import threading
+import unittest
+
+from bm257s.package_reader import PackageReader
+from bm257s.subscription import EventType, Publisher
+
+from .helpers.manual_executor import ManualExecutor
+from .helpers.mock_data_reader import MockDataReader
+from .helpers.raw_package_helpers import (
+    EXAMPLE_RAW_PKG,
+    change_byte_index,
+    check_example_pkg,
+)
+
+
+class TestPublisher(unittest.TestCase):
+    """Testcase for event delivery to subscriptions"""
+
+    def setUp(self):
+        """Set up publisher with deterministic executor"""
+        super().setUp()
+
+        self._publisher = Publisher()
+        self._executor = ManualExecutor()
+        self._received = []
+
+    def tearDown(self):
+        """Close publisher"""
+        super().tearDown()
+
+        self._publisher.close()
+
+    def _subscribe(self, **kwargs):
+        return self._publisher.subscribe(
+            self._received.append, executor=self._executor, **kwargs
+        )
+
+    def test_delivery_order(self):
+        """Test that events are delivered in order on the executor"""
+        self._subscribe()
+        for i in range(3):
+            self._publisher.publish(EventType.PACKAGE, i)
+
+        self.assertListEqual(
+            self._received, [], msg="Publishing should not run callbacks"
+        )
+        self.assertEqual(
+            self._executor.pending(), 1, msg="Only one drain task gets scheduled"
+        )
+
+        self._executor.run_all()
+        self.assertListEqual(
+            [e.payload for e in self._received],
+            [0, 1, 2],
+            msg="Events should be delivered in order",
+        )
+
+    def test_coalescing(self):
+        """Test that a full queue keeps only the newest package"""
+        subscription = self._subscribe(max_queue=2)
+        self._publisher.publish(EventType.CONNECTION, True)
+        for i in range(5):
+            self._publisher.publish(EventType.PACKAGE, i)
+
+        self._executor.run_all()
+        self.assertListEqual(
+            [(e.event_type, e.payload) for e in self._received],
+            [(EventType.CONNECTION, True), (EventType.PACKAGE, 4)],
+            msg="Full queue should coalesce packages",
+        )
+        self.assertEqual(subscription.dropped, 4, msg="Dropped events are counted")
+
+    def test_overflow_drops_oldest(self):
+        """Test that a full queue drops the oldest event for non-coalescible ones"""
+        self._subscribe(max_queue=2)
+        for i in range(3):
+            self._publisher.publish(EventType.ERROR, i)
+
+        self._executor.run_all()
+        self.assertListEqual(
+            [e.payload for e in self._received],
+            [1, 2],
+            msg="Oldest error should get dropped",
+        )
+
+    def test_filtering(self):
+        """Test filtering by event type and predicate"""
+        self._subscribe(
+            events={EventType.PACKAGE}, event_filter=lambda e: e.payload % 2 == 0
+        )
+        self._publisher.publish(EventType.CONNECTION, True)
+        for i in range(4):
+            self._publisher.publish(EventType.PACKAGE, i)
+
+        self._executor.run_all()
+        self.assertListEqual(
+            [e.payload for e in self._received],
+            [0, 2],
+            msg="Only matching events should get delivered",
+        )
+
+    def test_unsubscribe(self):
+        """Test that unsubscribing discards queued events"""
+        subscription = self._subscribe()
+        self._publisher.publish(EventType.PACKAGE, 0)
+        self._publisher.unsubscribe(subscription)
+        self._publisher.publish(EventType.PACKAGE, 1)
+
+        self._executor.run_all()
+        self.assertListEqual(self._received, [], msg="No delivery after unsubscribe")
+        self.assertFalse(subscription.active, msg="Subscription should be inactive")
+        self.assertFalse(
+            self._publisher.has_subscriptions(), msg="Subscription should be removed"
+        )
+
+    def test_failing_callback(self):
+        """Test that a failing callback does not stop delivery"""
+
+        def callback(event):
+            if event.payload == 0:
+                raise RuntimeError("Broken subscriber")
+            self._received.append(event)
+
+        self._publisher.subscribe(callback, executor=self._executor)
+        self._publisher.publish(EventType.PACKAGE, 0)
+        self._publisher.publish(EventType.PACKAGE, 1)
+
+        with self.assertLogs("bm257s.subscription"):
+            self._executor.run_all()
+        self.assertListEqual([e.payload for e in self._received], [1])
+
+    def test_unschedulable(self):
+        """Test that a subscription whose executor got shut down is cancelled"""
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        executor.shutdown()
+        broken = self._publisher.subscribe(lambda _: None, executor=executor)
+        self._subscribe()
+
+        with self.assertLogs("bm257s.subscription"):
+            self._publisher.publish(EventType.PACKAGE, 0)
+        self.assertFalse(broken.active)
+
+        self._publisher.publish(EventType.PACKAGE, 1)
+        self._executor.run_all()
+        self.assertListEqual([e.payload for e in self._received], [0, 1])
+
+    def test_closed_loop(self):
+        """Test that publishing to a closed event loop does not raise"""
+        loop = asyncio.new_event_loop()
+        loop.close()
+        broken = self._publisher.subscribe(lambda _: None, loop=loop)
+
+        with self.assertLogs("bm257s.subscription"):
+            self._publisher.publish(EventType.PACKAGE, 0)
+        self.assertFalse(broken.active)
+
+    def test_slow_callback(self):
+        """Test that a blocked callback does not block publishing"""
+        release = threading.Event()
+        self._publisher.subscribe(lambda _: release.wait(1.0))
+        for i in range(100):
+            self._publisher.publish(EventType.PACKAGE, i)
+        release.set()
+
+    def test_event_loop(self):
+        """Test delivery on an asyncio event loop"""
+
+        async def collect():
+            received = asyncio.Queue()
+            self._publisher.subscribe(
+                received.put_nowait, loop=asyncio.get_running_loop()
+            )
+
+            thread = threading.Thread(
+                target=self._publisher.publish, args=(EventType.PACKAGE, 42)
+            )
+            thread.start()
+            thread.join()
+
+            return await asyncio.wait_for(received.get(), 1.0)
+
+        event = asyncio.run(collect())
+        self.assertEqual(event.payload, 42, msg="Event delivered on loop")
+
+
+class TestPackageReaderSubscription(unittest.TestCase):
+    """Testcase for subscriptions to package readers"""
+
+    TIMEOUT = 1.0
+
+    def setUp(self):
+        """Set up package reader with subscription"""
+        super().setUp()
+
+        self._mock_reader = MockDataReader(timeout=self.TIMEOUT)
+        self._pkg_reader = PackageReader(self._mock_reader)
+
+        self._events = []
+        self._event_cond = threading.Condition()
+        self._pkg_reader.subscribe(self._on_event)
+
+    def tearDown(self):
+        """Close package reader"""
+        super().tearDown()
+
+        self._pkg_reader.close()
+
+    def _on_event(self, event):
+        with self._event_cond:
+            self._events.append(event)
+            self._event_cond.notify_all()
+
+    def _wait_for_events(self, count):
+        with self._event_cond:
+            self.assertTrue(
+                self._event_cond.wait_for(
+                    lambda: len(self._events) >= count, self.TIMEOUT
+                ),
+                msg=f"Should receive {count} events",
+            )
+            return list(self._events)
+
+    def test_package_events(self):
+        """Test that packages and connection changes are published"""
+        self._pkg_reader.start()
+        self._mock_reader.set_next_data(EXAMPLE_RAW_PKG)
+
+        events = self._wait_for_events(2)
+        self.assertEqual(events[0].event_type, EventType.CONNECTION)
+        self.assertTrue(events[0].payload, msg="Reader start is published")
+        self.assertEqual(events[1].event_type, EventType.PACKAGE)
+        check_example_pkg(self, events[1].payload)
+
+        self._pkg_reader.stop()
+        events = self._wait_for_events(3)
+        self.assertEqual(events[2].event_type, EventType.CONNECTION)
+        self.assertFalse(events[2].payload, msg="Reader stop is published")
+
+    def test_error_events(self):
+        """Test that invalid packages are published as errors without stopping"""
+        self._pkg_reader.start()
+        self._mock_reader.set_next_data(
+            change_byte_index(EXAMPLE_RAW_PKG, 7, 12) + EXAMPLE_RAW_PKG
+        )
+
+        events = self._wait_for_events(3)
+        self.assertEqual(events[1].event_type, EventType.ERROR)
+        self.assertIsInstance(events[1].payload, RuntimeError)
+        self.assertEqual(
+            events[2].event_type,
+            EventType.PACKAGE,
+            msg="Reader should realign after invalid package",
+        )
+        check_example_pkg(self, events[2].payload)